@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Hospital, PatientProfile
+from .models import User, Hospital, PatientProfile, OutboundEmail, StoredBlob
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'user_type', 'is_staff')
@@ -15,6 +15,19 @@ class PatientProfileAdmin(admin.ModelAdmin):
     search_fields = ('patient_unique_id', 'user__email', 'user__first_name', 'user__last_name', 'phone_number')
     readonly_fields = ('created_at', 'updated_at')
 
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'last_error')
+    readonly_fields = ('created_at', 'sent_at')
+
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'last_seen_at', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('created_at',)
+
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Hospital)
-admin.site.register(PatientProfile, PatientProfileAdmin)
\ No newline at end of file
+admin.site.register(PatientProfile, PatientProfileAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
+admin.site.register(StoredBlob, StoredBlobAdmin)
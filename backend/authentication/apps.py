@@ -3,4 +3,16 @@ from django.apps import AppConfig
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'authentication'
\ No newline at end of file
+    name = 'authentication'
+
+    def ready(self):
+        from .images import connect_variant_signals
+        from .qr import connect_qr_signals
+        from .queues import connect_queue_signals
+        from .storage import connect_refcount_signals
+        from .triage import connect_triage_signals
+        connect_refcount_signals()
+        connect_variant_signals()
+        connect_qr_signals()
+        connect_queue_signals()
+        connect_triage_signals()
@@ -0,0 +1,380 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    process TEXT NOT NULL,
+    body BLOB NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_messages_process_idx ON channel_messages (process, id);
+CREATE INDEX IF NOT EXISTS channel_messages_channel_idx ON channel_messages (channel);
+CREATE TABLE IF NOT EXISTS channel_groups (
+    name TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (name, channel)
+);
+"""
+FETCH_BATCH = 200
+CLEANUP_INTERVAL = 10.0
+# Backoff after a failed fetch (locked or unreadable database), doubling up to the max
+FETCH_RETRY_BASE = 0.1
+FETCH_RETRY_MAX = 5.0
+
+
+class _Receiver:
+    """
+    Per event loop: owns one process prefix, pulls every message addressed to
+    it in one query and hands them to the receive() calls waiting per channel.
+    """
+
+    def __init__(self, layer, loop):
+        self.layer = layer
+        self.loop = loop
+        self.prefix = uuid.uuid4().hex[:12]
+        self.queues = {}
+        self.waiting = defaultdict(int)
+        self.event = asyncio.Event()
+        self.task = None
+        self.sock = None
+        self.last_cleanup = time.monotonic()
+
+    def start(self):
+        if self.task is not None and not self.task.done():
+            return
+        if self.task is not None:
+            # Only an unexpected error ends run(); don't leave receivers hanging
+            print(f"Channel layer reader stopped ({self.task.exception() if not self.task.cancelled() else 'cancelled'}), restarting")
+        if self.sock is None:
+            self._bind_wakeup_socket()
+        self.task = self.loop.create_task(self.run())
+
+    def _bind_wakeup_socket(self):
+        if not hasattr(socket, 'AF_UNIX'):
+            return
+        path = self.layer.socket_path(self.prefix)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(path)
+            self.loop.add_reader(sock.fileno(), self._on_wakeup)
+            self.sock = sock
+        except (OSError, NotImplementedError) as e:
+            # No wakeups (e.g. Windows event loop): delivery falls back to polling
+            print(f"Channel layer wakeup socket unavailable, polling instead: {e}")
+
+    def _on_wakeup(self):
+        try:
+            while self.sock.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        self.event.set()
+
+    async def run(self):
+        retry_delay = FETCH_RETRY_BASE
+        while True:
+            # Clear before fetching so a wakeup that lands mid-fetch isn't lost
+            self.event.clear()
+            try:
+                rows = await self.layer._run(self.layer._fetch_process, self.prefix)
+            except Exception as e:
+                # e.g. "database is locked" or a disk I/O error: keep the reader alive and retry
+                print(f"Channel layer fetch failed, retrying in {retry_delay:.1f}s: {e!r}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, FETCH_RETRY_MAX)
+                continue
+            retry_delay = FETCH_RETRY_BASE
+            for channel, body, expires in rows:
+                queue = self.queues.setdefault(channel, asyncio.Queue())
+                queue.put_nowait((expires, body))
+
+            if time.monotonic() - self.last_cleanup > CLEANUP_INTERVAL:
+                self.cleanup()
+            if len(rows) < FETCH_BATCH:
+                try:
+                    await asyncio.wait_for(self.event.wait(), self.layer.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def cleanup(self):
+        """Drop expired messages queued for channels nobody is receiving on"""
+        self.last_cleanup = time.monotonic()
+        now = time.time()
+        for channel, queue in list(self.queues.items()):
+            if self.waiting.get(channel):
+                continue
+            kept = []
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item[0] >= now:
+                    kept.append(item)
+            if kept:
+                for item in kept:
+                    queue.put_nowait(item)
+            else:
+                del self.queues[channel]
+        self.layer._executor.submit(self.layer._delete_expired)
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        if self.sock is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            try:
+                os.unlink(self.layer.socket_path(self.prefix))
+            except OSError:
+                pass
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Channel layer shared by every process on one host through a SQLite file
+    in WAL mode, so a signaling room works whichever daphne worker each
+    participant lands on.
+
+    Each event loop gets its own process prefix in the channel names it
+    creates (specific.<prefix>!<id>); one reader task per loop fetches all
+    of that prefix's messages per query. Senders wake that reader through a
+    Unix datagram socket so delivery doesn't wait for poll_interval, which
+    is only the fallback. All SQLite work runs on one thread per layer.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path=None, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.1, socket_dir=None):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.path = path or os.path.join(tempfile.gettempdir(), 'medisewa-channels.sqlite3')
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.socket_dir = socket_dir or os.path.join(tempfile.gettempdir(), 'medisewa-channels')
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-channel-layer')
+        self._conn = None
+        self._receivers = {}
+        self._wake_sock = None
+
+    # --- SQLite, only ever touched from the executor thread -----------------
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _insert(self, rows, strict):
+        """
+        rows is [(channel, process, body)]. Channels at capacity raise
+        ChannelFull when strict (send) and are skipped otherwise (group_send).
+        """
+        conn = self._connection()
+        now = time.time()
+        channels = list({channel for channel, _, _ in rows})
+        placeholders = ','.join('?' * len(channels))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(conn.execute(
+                f'SELECT channel, COUNT(*) FROM channel_messages '
+                f'WHERE channel IN ({placeholders}) AND expires > ? GROUP BY channel',
+                [*channels, now],
+            ))
+            accepted = []
+            for channel, process, body in rows:
+                if counts.get(channel, 0) >= self.get_capacity(channel):
+                    if strict:
+                        raise ChannelFull(channel)
+                    continue
+                counts[channel] = counts.get(channel, 0) + 1
+                accepted.append((channel, process, body, now + self.expiry))
+            conn.executemany(
+                'INSERT INTO channel_messages (channel, process, body, expires) VALUES (?, ?, ?, ?)',
+                accepted,
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return {process for _, process, _, _ in accepted}
+
+    def _fetch_process(self, process):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT id, channel, body, expires FROM channel_messages WHERE process = ? ORDER BY id LIMIT ?',
+                (process, FETCH_BATCH),
+            ).fetchall()
+            if rows:
+                conn.execute('DELETE FROM channel_messages WHERE process = ? AND id <= ?', (process, rows[-1][0]))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        now = time.time()
+        return [(channel, body, expires) for _, channel, body, expires in rows if expires >= now]
+
+    def _fetch_channel(self, channel):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT id, body FROM channel_messages WHERE channel = ? AND expires >= ? ORDER BY id LIMIT 1',
+                (channel, time.time()),
+            ).fetchone()
+            if row:
+                conn.execute('DELETE FROM channel_messages WHERE id = ?', (row[0],))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return row[1] if row else None
+
+    def _group_channels(self, group):
+        return [row[0] for row in self._connection().execute(
+            'SELECT channel FROM channel_groups WHERE name = ? AND expires > ?', (group, time.time())
+        )]
+
+    def _group_send(self, group, body):
+        channels = self._group_channels(group)
+        if not channels:
+            return set()
+        return self._insert([(channel, self._process_of(channel), body) for channel in channels], strict=False)
+
+    def _delete_expired(self):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('DELETE FROM channel_messages WHERE expires < ?', (now,))
+        conn.execute('DELETE FROM channel_groups WHERE expires < ?', (now,))
+
+    # --- Wakeups -------------------------------------------------------------
+
+    def socket_path(self, process):
+        return os.path.join(self.socket_dir, f'{process}.sock')
+
+    def _wake(self, processes):
+        if not hasattr(socket, 'AF_UNIX'):
+            return
+        if self._wake_sock is None:
+            self._wake_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._wake_sock.setblocking(False)
+        for process in processes:
+            if not process:
+                continue
+            try:
+                self._wake_sock.sendto(b'\0', self.socket_path(process))
+            except OSError:
+                # Reader gone or its buffer already full of wakeups; polling covers it
+                pass
+
+    @staticmethod
+    def _process_of(channel):
+        if '!' not in channel:
+            return ''
+        return channel.split('!', 1)[0].rsplit('.', 1)[-1]
+
+    def _receiver(self):
+        loop = asyncio.get_running_loop()
+        receiver = self._receivers.get(loop)
+        if receiver is None:
+            receiver = self._receivers[loop] = _Receiver(self, loop)
+        return receiver
+
+    # --- Channel layer API ---------------------------------------------------
+
+    def serialize(self, message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    def deserialize(self, body):
+        return msgpack.unpackb(body, raw=False)
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        processes = await self._run(self._insert, [(channel, self._process_of(channel), self.serialize(message))], True)
+        self._wake(processes)
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        if '!' not in channel:
+            # Shared channel (e.g. runworker): any process may consume it, so poll
+            while True:
+                body = await self._run(self._fetch_channel, channel)
+                if body is not None:
+                    return self.deserialize(body)
+                await asyncio.sleep(self.poll_interval)
+
+        receiver = self._receiver()
+        receiver.start()
+        queue = receiver.queues.setdefault(channel, asyncio.Queue())
+        receiver.waiting[channel] += 1
+        try:
+            while True:
+                expires, body = await queue.get()
+                if expires >= time.time():
+                    return self.deserialize(body)
+        finally:
+            receiver.waiting[channel] -= 1
+            if not receiver.waiting[channel]:
+                del receiver.waiting[channel]
+                if queue.empty():
+                    receiver.queues.pop(channel, None)
+
+    async def new_channel(self, prefix='specific'):
+        return f'{prefix}.{self._receiver().prefix}!{uuid.uuid4().hex[:12]}'
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._run(lambda: self._connection().execute(
+            'INSERT OR REPLACE INTO channel_groups (name, channel, expires) VALUES (?, ?, ?)',
+            (group, channel, time.time() + self.group_expiry),
+        ))
+
+    async def group_discard(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        await self._run(lambda: self._connection().execute(
+            'DELETE FROM channel_groups WHERE name = ? AND channel = ?', (group, channel)
+        ))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.valid_group_name(group), 'Group name not valid'
+        processes = await self._run(self._group_send, group, self.serialize(message))
+        self._wake(processes)
+
+    async def flush(self):
+        await self._run(lambda: self._connection().executescript(
+            'DELETE FROM channel_messages; DELETE FROM channel_groups;'
+        ))
+
+    async def close(self):
+        for receiver in self._receivers.values():
+            receiver.close()
+        self._receivers.clear()
+        if self._wake_sock is not None:
+            self._wake_sock.close()
+            self._wake_sock = None
@@ -1,43 +1,310 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from django.utils import timezone
+from .notifications import notification_group_name
+from .queues import (
+    QueueView, doctor_queue_group, hospital_queue_group, in_queue, queue_scope, todays_queue,
+)
+from .signaling import (
+    CANDIDATE_FRAME_PREFIX, MAX_BATCH_FRAMES, MAX_FRAME_LENGTH, MAX_PENDING_FRAMES, PEER_ROLE, RoomFull,
+    batch_frame, join_room, leave_room, room_group_name, signaling_role,
+)
+from .triage import (
+    assigned_cases, doctor_heartbeat, doctor_offline, doctor_online, triage_entry, triage_key, waiting_cases,
+)
 
 class SignalingConsumer(AsyncWebsocketConsumer):
+    """
+    WebRTC signaling for one appointment. The doctor and the patient each hold
+    a seat and their frames go straight to the other seat's channel, relayed
+    as the raw text; hospital staff may join as observers and only receive
+    presence. Frames sent before the peer is connected are held until it joins.
+
+    With SIGNALING_ICE_COALESCE_MS set, trickled ICE candidates arriving within
+    that window travel to the peer as one channel-layer message. The peer's
+    socket still gets one {"type": "candidate"} frame each, unless it connected
+    with ?batch=1, in which case it gets a single {"type": "batch", "frames": [...]}.
+    """
+
+    role = None
+    peer_channel = None
+    flush_task = None
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        self.appointment_id = int(self.scope['url_route']['kwargs']['appointment_id'])
+        self.room_group_name = room_group_name(self.appointment_id)
+        role = await database_sync_to_async(signaling_role)(user, self.appointment_id)
+        if role is None:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        try:
+            replaced, others = await database_sync_to_async(join_room)(
+                self.appointment_id, user, role, self.channel_name
+            )
+        except RoomFull:
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await self.close()
+            return
+
+        self.role = role
+        self.user_id = user.id
+        self.pending = []
+        self.ice_batch = []
+        self.coalesce_seconds = settings.SIGNALING_ICE_COALESCE_MS / 1000
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.batch_frames = query.get('batch', ['0'])[0] == '1'
+        await self.accept()
+
+        if replaced:
+            await self.channel_layer.send(replaced, {'type': 'signaling.replaced'})
+        for other_role, other_user_id, other_channel in others:
+            if other_role == PEER_ROLE.get(role):
+                self.peer_channel = other_channel
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'event': 'snapshot',
+            'role': role,
+            'peers': [{'role': r, 'user_id': u} for r, u, _ in others],
+        }))
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'signaling.presence',
+            'event': 'join',
+            'role': role,
+            'user_id': user.id,
+            'channel': self.channel_name,
+        })
+
+    async def disconnect(self, close_code):
+        if self.role is None:
+            return
+        await self.flush_ice()
+        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        # A seat taken over by a newer socket was never vacated, so no leave event
+        if await database_sync_to_async(leave_room)(self.channel_name):
+            await self.channel_layer.group_send(self.room_group_name, {
+                'type': 'signaling.presence',
+                'event': 'leave',
+                'role': self.role,
+                'user_id': self.user_id,
+                'channel': self.channel_name,
+            })
+
+    # Receive message from WebSocket: forwarded untouched to the peer's channel
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.role not in PEER_ROLE or not text_data or len(text_data) > MAX_FRAME_LENGTH:
+            return
+        if self.coalesce_seconds and text_data.startswith(CANDIDATE_FRAME_PREFIX):
+            self.ice_batch.append(text_data)
+            if len(self.ice_batch) >= MAX_BATCH_FRAMES:
+                await self.flush_ice()
+            elif self.flush_task is None:
+                self.flush_task = asyncio.ensure_future(self.flush_ice_later())
+            return
+        # Anything else (offer, answer) must not overtake candidates sent before it
+        await self.flush_ice()
+        await self.relay([text_data])
+
+    async def relay(self, texts):
+        if self.peer_channel is None:
+            self.pending.extend(texts[:MAX_PENDING_FRAMES - len(self.pending)])
+        elif len(texts) == 1:
+            await self.channel_layer.send(self.peer_channel, {'type': 'signaling.relay', 'text': texts[0]})
+        else:
+            await self.channel_layer.send(self.peer_channel, {'type': 'signaling.relay', 'texts': texts})
+
+    async def flush_ice_later(self):
+        await asyncio.sleep(self.coalesce_seconds)
+        self.flush_task = None
+        await self.flush_ice()
+
+    async def flush_ice(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        batch, self.ice_batch = self.ice_batch, []
+        if batch:
+            await self.relay(batch)
+
+    # Frame(s) from the peer
+    async def signaling_relay(self, event):
+        if 'text' in event:
+            await self.send(text_data=event['text'])
+        elif self.batch_frames:
+            await self.send(text_data=batch_frame(event['texts']))
+        else:
+            for text in event['texts']:
+                await self.send(text_data=text)
+
+    # Join/leave in the room, sent to the room group
+    async def signaling_presence(self, event):
+        if event['channel'] == self.channel_name:
+            return
+        if event['role'] == PEER_ROLE.get(self.role):
+            if event['event'] == 'join':
+                self.peer_channel = event['channel']
+                pending, self.pending = self.pending, []
+                if pending:
+                    await self.relay(pending)
+            elif self.peer_channel == event['channel']:
+                self.peer_channel = None
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'event': event['event'],
+            'role': event['role'],
+            'user_id': event['user_id'],
+        }))
+
+    # Our seat was taken over by a newer socket of the same user
+    async def signaling_replaced(self, event):
+        self.peer_channel = None
+        self.ice_batch = []
+        await self.close()
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """Per-user stream of new notifications, replaces polling notifications/"""
+
     async def connect(self):
-        self.room_name = self.scope['url_route']['kwargs']['appointment_id']
-        self.room_group_name = f'signaling_{self.room_name}'
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
 
-        # Join room group
+        self.group_name = notification_group_name(user.id)
         await self.channel_layer.group_add(
-            self.room_group_name,
+            self.group_name,
             self.channel_name
         )
 
         await self.accept()
 
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
 
-    # Receive message from WebSocket
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        message_type = data.get('type')
-        
-        # Relay the message to the other person in the room
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'signaling_message',
-                'message': data,
-                'sender_channel_name': self.channel_name
-            }
-        )
+    # Receive notification pushed by authentication.notifications
+    async def notification_message(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event['notification']
+        }))
+
+
+class QueueConsumer(AsyncWebsocketConsumer):
+    """
+    Live waiting room: a hospital sees today's queue across its doctors, a
+    doctor sees their own. The ordered queue is sent once, then every booking,
+    approval, completion or emergency insert arrives as a positioned delta.
+
+    The same socket carries emergency triage: the hospital gets its waiting
+    cases by severity, a doctor the cases assigned to them. A doctor with this
+    socket open counts as on shift for triage assignment.
+    """
+    heartbeat_task = None
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        scope = await database_sync_to_async(queue_scope)(user)
+        if scope is None:
+            await self.close()
+            return
+        self.kind, self.owner_id = scope
+        if self.kind == 'hospital':
+            self.group_name = hospital_queue_group(self.owner_id)
+            self.filters = {'hospital_id': self.owner_id}
+        else:
+            self.group_name = doctor_queue_group(self.owner_id)
+            self.filters = {'doctor_id': self.owner_id}
+
+        # Join before reading so no change falls between the snapshot and the first delta
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        if self.kind == 'doctor':
+            await database_sync_to_async(doctor_online)(self.owner_id, self.channel_name)
+            self.heartbeat_task = asyncio.ensure_future(self.keep_presence())
+        await self.accept()
+        await self.send_snapshot()
+        await self.send_triage_snapshot()
+
+    async def send_snapshot(self):
+        self.today = timezone.localtime().date().isoformat()
+        entries = await database_sync_to_async(todays_queue)(**self.filters)
+        self.queue = QueueView(entries)
+        await self.send(text_data=json.dumps({
+            'type': 'queue',
+            'event': 'snapshot',
+            'date': self.today,
+            'entries': entries,
+        }))
+
+    async def send_triage_snapshot(self):
+        if self.kind == 'hospital':
+            cases = waiting_cases(self.owner_id)
+        else:
+            cases = assigned_cases(self.owner_id)
+        entries = await database_sync_to_async(lambda: [triage_entry(c) for c in cases])()
+        self.triage = QueueView(entries, key=triage_key)
+        await self.send(text_data=json.dumps({
+            'type': 'triage',
+            'event': 'snapshot',
+            'entries': entries,
+        }))
+
+    async def keep_presence(self):
+        """Refresh last_seen so triage keeps counting this doctor as connected"""
+        while True:
+            await asyncio.sleep(settings.TRIAGE_HEARTBEAT_SECONDS)
+            try:
+                await database_sync_to_async(doctor_heartbeat)(self.channel_name)
+            except Exception as e:
+                print(f"Triage heartbeat error: {e}")
+
+    async def disconnect(self, close_code):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            if self.kind == 'doctor':
+                await database_sync_to_async(doctor_offline)(self.channel_name)
+
+    # Appointment saved or deleted, pushed by authentication.queues
+    async def queue_change(self, event):
+        if timezone.localtime().date().isoformat() != self.today:
+            # New day: start over from a fresh list
+            await self.send_snapshot()
+            return
+
+        entry = event['entry']
+        delta = self.queue.apply(entry, in_queue(entry, self.today))
+        if delta:
+            await self.send(text_data=json.dumps({'type': 'queue', **delta}))
 
-    # Receive message from room group
-    async def signaling_message(self, event):
-        # Send message to WebSocket (if not the sender)
-        if self.channel_name != event['sender_channel_name']:
-            await self.send(text_data=json.dumps(event['message']))
+    # Emergency case changed, pushed by authentication.triage
+    async def triage_change(self, event):
+        entry = event['entry']
+        if self.kind == 'hospital':
+            keep = entry['status'] == 'waiting'
+        else:
+            keep = entry['status'] == 'assigned' and entry['assigned_doctor'] == self.owner_id
+        delta = self.triage.apply(entry, keep)
+        if delta:
+            await self.send(text_data=json.dumps({'type': 'triage', **delta}))
@@ -0,0 +1,144 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .models import DoctorProfile, Hospital, PatientProfile
+
+# kind -> (model, image field, publicly visible)
+PROFILE_IMAGE_FIELDS = {
+    'doctor': (DoctorProfile, 'profile_picture', True),
+    'hospital': (Hospital, 'logo', True),
+    'patient': (PatientProfile, 'profile_image', False),
+}
+
+# Longest side in pixels; thumb for directory listings, medium for profile pages
+VARIANT_SIZES = {
+    'thumb': 128,
+    'medium': 512,
+}
+# WebP for browsers that take it, JPEG as the fallback
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_ROOT = 'variants'
+
+
+def variant_dir(name):
+    return f"{VARIANT_ROOT}/{os.path.splitext(name)[0]}"
+
+
+def variant_name(name, variant, ext):
+    return f"{variant_dir(name)}/{variant}.{ext}"
+
+
+def _render(image, size, ext):
+    img = image.copy()
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    pil_format, options = VARIANT_FORMATS[ext]
+    if pil_format == 'JPEG' and img.mode != 'RGB':
+        # JPEG has no alpha: flatten transparent logos onto white
+        rgba = img.convert('RGBA')
+        img = Image.new('RGB', rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.getchannel('A'))
+    buffer = io.BytesIO()
+    img.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def _open_source(field_file):
+    with field_file.storage.open(field_file.name, 'rb') as f:
+        image = Image.open(f)
+        image.draft('RGB', (max(VARIANT_SIZES.values()) * 2,) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        image.load()
+    return image
+
+
+def ensure_variant(field_file, variant, ext):
+    """Return the storage name of one variant, rendering it from the original the first time"""
+    storage = field_file.storage
+    name = variant_name(field_file.name, variant, ext)
+    if not storage.exists(name):
+        data = _render(_open_source(field_file), VARIANT_SIZES[variant], ext)
+        _write(storage, name, data)
+    return name
+
+
+def generate_variants(field_file):
+    """Render every missing variant, decoding the original once"""
+    storage = field_file.storage
+    missing = [
+        (variant, ext) for variant in VARIANT_SIZES for ext in VARIANT_FORMATS
+        if not storage.exists(variant_name(field_file.name, variant, ext))
+    ]
+    if not missing:
+        return
+    source = _open_source(field_file)
+    for variant, ext in missing:
+        _write(storage, variant_name(field_file.name, variant, ext), _render(source, VARIANT_SIZES[variant], ext))
+
+
+def _write(storage, name, data):
+    # Variants are derived files at a fixed name, so bypass the storage's naming (and dedup)
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    if storage.file_permissions_mode is not None:
+        os.chmod(tmp_path, storage.file_permissions_mode)
+    os.replace(tmp_path, path)
+
+
+def delete_variants(storage, name):
+    shutil.rmtree(storage.path(variant_dir(name)), ignore_errors=True)
+
+
+def variant_urls(kind, obj, field):
+    """{'thumb': {'webp': url, 'jpeg': url}, 'medium': {...}} or None when there is no image"""
+    if not getattr(obj, field):
+        return None
+    return {
+        variant: {
+            ext: reverse('serve_profile_image_variant', args=[kind, obj.pk, variant, ext])
+            for ext in VARIANT_FORMATS
+        }
+        for variant in VARIANT_SIZES
+    }
+
+
+def generate_variants_for(model, pk, field):
+    """Background entry point: reload the row and pre-render its variants"""
+    obj = model.objects.filter(pk=pk).only('pk', field).first()
+    field_file = getattr(obj, field, None) if obj else None
+    if field_file:
+        try:
+            generate_variants(field_file)
+        except Exception as e:
+            print(f"Error generating image variants for {model.__name__} {pk}: {e}")
+
+
+def connect_variant_signals():
+    """Pre-render variants after a save whenever the image has none yet"""
+    from django.db.models.signals import post_save
+    from .notifications import run_in_background
+
+    for model, field, _ in PROFILE_IMAGE_FIELDS.values():
+        def pregenerate(sender, instance, field=field, **kwargs):
+            value = instance.__dict__.get(field)
+            name = getattr(value, 'name', value)
+            if not name:
+                return
+            storage = sender._meta.get_field(field).storage
+            if not storage.exists(variant_name(name, 'thumb', 'webp')):
+                run_in_background(generate_variants_for, sender, instance.pk, field)
+
+        post_save.connect(pregenerate, sender=model, weak=False,
+                          dispatch_uid=f'image_variants_{model._meta.label_lower}_{field}')
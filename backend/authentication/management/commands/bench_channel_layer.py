@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'memory': 'channels.layers.InMemoryChannelLayer',
+    'sqlite': 'authentication.channel_layers.SQLiteChannelLayer',
+    'redis': 'channels_redis.core.RedisChannelLayer',
+}
+GROUP = 'bench'
+
+
+def build_layer(backend, config):
+    return import_string(BACKENDS[backend])(**config)
+
+
+async def _echo(layer, ready):
+    """Answer every ping on a fresh channel (also a member of GROUP) until told to stop"""
+    channel = await layer.new_channel()
+    await layer.group_add(GROUP, channel)
+    ready.put(channel)
+    while True:
+        message = await layer.receive(channel)
+        if message['type'] == 'bench.stop':
+            break
+        await layer.send(message['reply_to'], {'type': 'bench.pong', 'sent': message['sent']})
+    await layer.group_discard(GROUP, channel)
+
+
+def echo_process(backend, config, ready):
+    """Entry point of a spawned worker process, with its own layer instance like a daphne worker"""
+    async def main():
+        layer = build_layer(backend, config)
+        await _echo(layer, ready)
+        if hasattr(layer, 'close'):
+            await layer.close()
+        elif hasattr(layer, 'close_pools'):
+            await layer.close_pools()
+    asyncio.run(main())
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure channel layer latency and throughput between separate worker processes: "
+        "ping-pong round trips, a windowed throughput run and a group fan-out."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=list(BACKENDS), default='sqlite')
+        parser.add_argument('--workers', type=int, default=2, help='Echo worker processes')
+        parser.add_argument('--messages', type=int, default=1000)
+        parser.add_argument('--window', type=int, default=32, help='Pings in flight during the throughput run')
+        parser.add_argument('--payload', type=int, default=512, help='Bytes of padding per message (an SDP offer is ~2-5 KB)')
+        parser.add_argument('--redis-url', default='redis://127.0.0.1:6379/0')
+        parser.add_argument('--redis-standin', action='store_true',
+                            help='Serve Redis from an in-process fakeredis TCP server instead of --redis-url')
+
+    def handle(self, *args, **options):
+        backend = options['backend']
+        cleanup = []
+        config = {}
+
+        if backend == 'sqlite':
+            tmp = tempfile.mkdtemp(prefix='bench-channels-')
+            cleanup.append(lambda: shutil.rmtree(tmp, ignore_errors=True))
+            config = {'path': os.path.join(tmp, 'layer.sqlite3'), 'socket_dir': os.path.join(tmp, 'sockets')}
+        elif backend == 'redis':
+            url = options['redis_url']
+            if options['redis_standin']:
+                url = self.start_redis_standin(cleanup)
+            config = {'hosts': [url]}
+
+        try:
+            asyncio.run(self.run(backend, config, options))
+        finally:
+            for func in cleanup:
+                func()
+
+    def start_redis_standin(self, cleanup):
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise CommandError('--redis-standin needs fakeredis with Lua support: pip install "fakeredis[lua]"')
+        port = free_port()
+        server = TcpFakeServer(('127.0.0.1', port), server_type='redis')
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cleanup.append(server.shutdown)
+        self.stdout.write(f"Redis stand-in (fakeredis) on 127.0.0.1:{port}")
+        return f'redis://127.0.0.1:{port}/0'
+
+    async def start_workers(self, backend, config, count):
+        if backend == 'memory':
+            # In-process only: the baseline the other backends pay IPC on top of
+            layer = build_layer(backend, config)
+            ready = queue.Queue()
+            tasks = [asyncio.create_task(_echo(layer, ready)) for _ in range(count)]
+            while ready.qsize() < count:
+                await asyncio.sleep(0.01)
+            return layer, [ready.get() for _ in range(count)], tasks
+
+        ctx = multiprocessing.get_context('spawn')
+        ready = ctx.Queue()
+        processes = [ctx.Process(target=echo_process, args=(backend, config, ready), daemon=True) for _ in range(count)]
+        for process in processes:
+            process.start()
+        loop = asyncio.get_running_loop()
+        channels = [await loop.run_in_executor(None, ready.get, True, 60) for _ in range(count)]
+        return build_layer(backend, config), channels, processes
+
+    async def run(self, backend, config, options):
+        count, total, window = options['workers'], options['messages'], options['window']
+        pad = 'x' * options['payload']
+        layer, workers, handles = await self.start_workers(backend, config, count)
+        reply = await layer.new_channel()
+
+        def ping(i):
+            return layer.send(workers[i % count], {
+                'type': 'bench.ping', 'sent': time.perf_counter(), 'reply_to': reply, 'pad': pad,
+            })
+
+        # Warm up connections and readers on every worker
+        for i in range(count * 5):
+            await ping(i)
+            await layer.receive(reply)
+
+        # 1. Sequential round trips: one message in flight
+        rtts = []
+        for i in range(total):
+            await ping(i)
+            pong = await layer.receive(reply)
+            rtts.append(time.perf_counter() - pong['sent'])
+
+        # 2. Throughput: keep `window` pings in flight across the workers
+        started = time.perf_counter()
+        sent = done = 0
+        while done < total:
+            while sent - done < window and sent < total:
+                await ping(sent)
+                sent += 1
+            await layer.receive(reply)
+            done += 1
+        throughput = total / (time.perf_counter() - started)
+
+        # 3. Group fan-out, as used for signaling rooms: time until every member answered
+        fanouts = []
+        for _ in range(max(1, total // 10)):
+            t0 = time.perf_counter()
+            await layer.group_send(GROUP, {'type': 'bench.ping', 'sent': t0, 'reply_to': reply, 'pad': pad})
+            for _ in range(count):
+                await layer.receive(reply)
+            fanouts.append(time.perf_counter() - t0)
+
+        for channel in workers:
+            await layer.send(channel, {'type': 'bench.stop'})
+        if backend == 'memory':
+            await asyncio.gather(*handles)
+        else:
+            for process in handles:
+                process.join(timeout=10)
+        if hasattr(layer, 'close'):
+            await layer.close()
+        elif hasattr(layer, 'close_pools'):
+            await layer.close_pools()
+
+        ms = lambda seconds: f"{seconds * 1000:.2f}"
+        self.stdout.write(f"backend={backend} workers={count} messages={total} payload={options['payload']}B")
+        self.stdout.write(f"  round trip   p50 {ms(percentile(rtts, 50))} ms   p99 {ms(percentile(rtts, 99))} ms")
+        self.stdout.write(f"  throughput   {throughput:.0f} round trips/s (window {window})")
+        self.stdout.write(f"  group fanout p50 {ms(percentile(fanouts, 50))} ms   p99 {ms(percentile(fanouts, 99))} ms")
@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import resource
+import time
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.management.commands.bench_channel_layer import percentile
+from authentication.models import Appointment, DoctorProfile, Hospital, PatientProfile, User
+
+BENCH_PREFIX = 'bench-signaling-'
+
+# Roughly what Chrome produces for one audio and one video m-line
+SDP = 'v=0\r\no=- 4611731400430051336 2 IN IP4 127.0.0.1\r\ns=-\r\nt=0 0\r\n' + (
+    'a=rtpmap:111 opus/48000/2\r\na=rtcp-fb:111 transport-cc\r\na=fmtp:111 minptime=10;useinbandfec=1\r\n' * 30
+)
+CANDIDATE = (
+    'candidate:842163049 1 udp 1677729535 203.0.113.{n} {port} typ srflx raddr 10.0.0.4 rport {port} '
+    'generation 0 ufrag 8hhY network-cost 999'
+)
+
+
+def frame(data):
+    # Serialised the way the browser's JSON.stringify does it (no spaces)
+    return json.dumps(data, separators=(',', ':'))
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def count_layer_messages(layer, counter):
+    """Count every send/group_send the consumers make through the shared layer instance"""
+    send, group_send = layer.send, layer.group_send
+    # Some layers implement group_send with send; those inner sends aren't the consumer's
+    in_group_send = contextvars.ContextVar('in_group_send', default=False)
+
+    async def counted_send(channel, message):
+        if not in_group_send.get():
+            counter['send'] += 1
+        return await send(channel, message)
+
+    async def counted_group_send(group, message):
+        counter['group_send'] += 1
+        token = in_group_send.set(True)
+        try:
+            return await group_send(group, message)
+        finally:
+            in_group_send.reset(token)
+
+    layer.send, layer.group_send = counted_send, counted_group_send
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test ws/signaling/ in-process against the ASGI application and the configured "
+        "channel layer: open doctor/patient pairs, replay an offer/answer/trickle-ICE exchange "
+        "and report connection setup time, relay latency and memory per connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=500, help='Doctor/patient pairs (two sockets each)')
+        parser.add_argument('--concurrency', type=int, default=100, help='Connects or calls in flight at once')
+        parser.add_argument('--candidates', type=int, default=12, help='ICE candidates each side trickles per call')
+        parser.add_argument('--candidate-interval-ms', type=float, default=5.0,
+                            help='Gap between trickled candidates')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds to wait for any one frame')
+        parser.add_argument('--coalesce-ms', type=int, default=None,
+                            help='Override SIGNALING_ICE_COALESCE_MS for this run (0 = off)')
+        parser.add_argument('--batch-frames', action='store_true',
+                            help='Connect with ?batch=1 so coalesced candidates arrive as one frame')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the generated users and appointments')
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        if options['coalesce_ms'] is not None:
+            settings.SIGNALING_ICE_COALESCE_MS = options['coalesce_ms']
+        self.stdout.write(f"Creating {calls} bench appointments...")
+        appointments = self.create_fixtures(calls)
+        try:
+            asyncio.run(self.run(appointments, options))
+        finally:
+            if not options['keep_data']:
+                User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+    def create_fixtures(self, calls):
+        """[(appointment id, doctor token, patient token)] for fresh bench users"""
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+        def users(kind, count):
+            return User.objects.bulk_create([
+                User(username=f'{BENCH_PREFIX}{kind}-{i}', user_type=kind, password='!', mobile='')
+                for i in range(count)
+            ])
+
+        hospital = Hospital.objects.create(user=users('hospital', 1)[0], hospital_name='Signaling bench', address='')
+        doctor_users, patient_users = users('doctor', calls), users('patient', calls)
+        doctors = DoctorProfile.objects.bulk_create([DoctorProfile(user=u, hospital=hospital) for u in doctor_users])
+        patients = PatientProfile.objects.bulk_create([PatientProfile(user=u) for u in patient_users])
+        today = datetime.date.today()
+        appointments = Appointment.objects.bulk_create([
+            Appointment(patient=p, doctor=d, hospital=hospital, date=today, time_slot='09:00 - 09:10')
+            for d, p in zip(doctors, patients)
+        ])
+        return [
+            (a.pk, str(AccessToken.for_user(du)), str(AccessToken.for_user(pu)))
+            for a, du, pu in zip(appointments, doctor_users, patient_users)
+        ]
+
+    async def run(self, appointments, options):
+        from healthcare_platform.asgi import application
+
+        counter = {'send': 0, 'group_send': 0}
+        count_layer_messages(get_channel_layer(), counter)
+        timeout = options['timeout']
+        gate = asyncio.Semaphore(options['concurrency'])
+        setup_times, errors = [], []
+        query = '&batch=1' if options['batch_frames'] else ''
+
+        async def connect(appointment_id, token):
+            async with gate:
+                socket = WebsocketCommunicator(application, f'/ws/signaling/{appointment_id}/?token={token}{query}')
+                started = time.perf_counter()
+                connected, _ = await socket.connect(timeout=timeout)
+                if not connected:
+                    raise RuntimeError(f'appointment {appointment_id}: connection refused')
+                await socket.receive_json_from(timeout=timeout)  # presence snapshot
+                setup_times.append(time.perf_counter() - started)
+                return socket
+
+        # 1. Open every socket: doctors first, then patients, as when a clinic session starts
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        doctors = await asyncio.gather(*[connect(a, dt) for a, dt, _ in appointments])
+        patients = await asyncio.gather(*[connect(a, pt) for a, _, pt in appointments])
+        ramp = time.perf_counter() - started
+        connections = len(doctors) + len(patients)
+        rss_per_connection = (rss_bytes() - rss_before) / connections
+        setup_messages = sum(counter.values())
+
+        # 2. Replay the exchange on every call
+        latencies = []
+        frames_received = 0
+        candidates = options['candidates']
+        interval = options['candidate_interval_ms'] / 1000
+
+        async def trickle(socket, port):
+            for n in range(candidates):
+                await socket.send_to(text_data=frame({
+                    'type': 'candidate',
+                    'candidate': {
+                        'candidate': CANDIDATE.format(n=n, port=port + n),
+                        'sdpMid': str(n % 2), 'sdpMLineIndex': n % 2, 'usernameFragment': '8hhY',
+                    },
+                    'sent': time.perf_counter(),
+                }))
+                if interval:
+                    await asyncio.sleep(interval)
+
+        async def expect(socket, kind, count):
+            """Read frames until one `kind` frame and `count` candidates arrived, skipping presence"""
+            nonlocal frames_received
+            seen_kind, seen_candidates = False, 0
+            while not seen_kind or seen_candidates < count:
+                data = json.loads(await socket.receive_from(timeout=timeout))
+                received = time.perf_counter()
+                frames_received += 1
+                for message in data['frames'] if data.get('type') == 'batch' else [data]:
+                    if message.get('type') == kind:
+                        seen_kind = True
+                        latencies.append(received - message['sent'])
+                    elif message.get('type') == 'candidate':
+                        latencies.append(received - message['sent'])
+                        seen_candidates += 1
+            return socket
+
+        async def call(doctor, patient):
+            async with gate:
+                try:
+                    patient_reads = asyncio.ensure_future(expect(patient, 'offer', candidates))
+                    await doctor.send_to(text_data=frame({
+                        'type': 'offer', 'offer': {'type': 'offer', 'sdp': SDP}, 'sent': time.perf_counter(),
+                    }))
+                    doctor_reads = asyncio.ensure_future(expect(doctor, 'answer', candidates))
+                    await asyncio.sleep(0.001)
+                    await patient.send_to(text_data=frame({
+                        'type': 'answer', 'answer': {'type': 'answer', 'sdp': SDP}, 'sent': time.perf_counter(),
+                    }))
+                    await asyncio.gather(trickle(doctor, 40000), trickle(patient, 50000), patient_reads, doctor_reads)
+                except Exception as e:
+                    errors.append(repr(e))
+
+        counter.update(send=0, group_send=0)
+        started = time.perf_counter()
+        await asyncio.gather(*[call(d, p) for d, p in zip(doctors, patients)])
+        exchange = time.perf_counter() - started
+        exchange_messages = sum(counter.values())
+
+        # 3. Hang up
+        for socket in doctors + patients:
+            await socket.disconnect()
+
+        calls = len(appointments)
+        ms = lambda seconds: f"{seconds * 1000:.2f}"
+        layer = settings.CHANNEL_LAYERS['default']['BACKEND'].rsplit('.', 1)[-1]
+        coalesce = settings.SIGNALING_ICE_COALESCE_MS
+        self.stdout.write(
+            f"layer={layer} calls={calls} connections={connections} candidates/side={candidates} "
+            f"coalesce={f'{coalesce}ms' if coalesce else 'off'}{' batch-frames' if options['batch_frames'] else ''}"
+        )
+        self.stdout.write(
+            f"  setup        p50 {ms(percentile(setup_times, 50))} ms   p99 {ms(percentile(setup_times, 99))} ms"
+            f"   ({connections / ramp:.0f} connects/s)"
+        )
+        if latencies:
+            self.stdout.write(
+                f"  relay        p50 {ms(percentile(latencies, 50))} ms   p99 {ms(percentile(latencies, 99))} ms"
+                f"   ({len(latencies) / exchange:.0f} messages/s)"
+            )
+        self.stdout.write(
+            f"  layer msgs   {setup_messages / calls:.1f} per call to join, "
+            f"{exchange_messages / calls:.1f} per call to exchange"
+        )
+        self.stdout.write(f"  ws frames    {frames_received / calls:.1f} delivered per call")
+        self.stdout.write(f"  memory       {rss_per_connection / 1024:.1f} KiB RSS per connection (server and client side)")
+        if errors:
+            self.stdout.write(self.style.ERROR(f"  {len(errors)} calls failed, first: {errors[0]}"))
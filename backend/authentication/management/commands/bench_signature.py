@@ -0,0 +1,75 @@
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFilter
+
+from authentication.views import process_signature
+
+
+def legacy_process_signature(image_file):
+    """The original per-pixel implementation, kept here only for comparison"""
+    img = Image.open(image_file).convert("RGBA")
+    newData = []
+    for item in img.getdata():
+        if item[0] > 200 and item[1] > 200 and item[2] > 200:
+            newData.append((255, 255, 255, 0))
+        else:
+            newData.append((item[0], item[1], item[2], 255))
+    img.putdata(newData)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def synthetic_signature(megapixels, fmt):
+    """A phone-photo-like page: off-white paper with a lighting gradient and a pen scribble"""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    gradient = Image.linear_gradient('L').resize((width, height)).point(lambda v: 235 - v // 6)
+    img = Image.merge('RGB', (gradient, gradient, gradient))
+
+    draw = ImageDraw.Draw(img)
+    rng = random.Random(42)
+    x, y = width // 5, height // 2
+    points = []
+    for _ in range(60):
+        x += rng.randint(width // 200, width // 60)
+        y = max(0, min(height - 1, y + rng.randint(-height // 20, height // 20)))
+        points.append((x, y))
+    draw.line(points, fill=(20, 25, 60), width=max(2, width // 300))
+    img = img.filter(ImageFilter.GaussianBlur(1))
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Time process_signature against the old per-pixel loop, reported per megapixel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, nargs='+', default=[1, 4, 12])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--format', default='JPEG', choices=['JPEG', 'PNG'])
+        parser.add_argument('--skip-legacy', action='store_true', help='Only time the new pipeline')
+
+    def time_it(self, func, data, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(io.BytesIO(data))
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'MP':>6} {'legacy s/MP':>12} {'new s/MP':>10} {'speedup':>8}")
+        for mp in options['megapixels']:
+            data = synthetic_signature(mp, options['format'])
+            new = self.time_it(process_signature, data, options['repeat']) / mp
+            if options['skip_legacy']:
+                self.stdout.write(f"{mp:>6g} {'-':>12} {new:>10.4f} {'-':>8}")
+                continue
+            legacy = self.time_it(legacy_process_signature, data, options['repeat']) / mp
+            self.stdout.write(f"{mp:>6g} {legacy:>12.4f} {new:>10.4f} {legacy / new:>7.0f}x")
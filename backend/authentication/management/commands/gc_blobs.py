@@ -0,0 +1,149 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from authentication.images import delete_variants
+from authentication.models import StoredBlob, UploadSession
+from authentication.storage import BLOB_PREFIX, content_storage, is_blob_name, tracked_fields
+
+
+class Command(BaseCommand):
+    help = (
+        "Garbage-collect content-addressed media blobs that no row references. "
+        "--adopt-legacy first moves files saved before deduplication into the blob store, "
+        "--reconcile recounts references from the rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Keep unreferenced blobs touched more recently than this')
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help='Hash files stored under upload_to paths and repoint rows at their blobs')
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Recount references from the rows before collecting')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['adopt_legacy']:
+            self.adopt_legacy(dry_run)
+        if options['reconcile'] or options['adopt_legacy']:
+            self.reconcile(dry_run)
+        self.collect(options['grace_hours'], dry_run)
+
+    def adopt_legacy(self, dry_run):
+        adopted = {}  # legacy name -> blob name, so a file shared by several rows is hashed once
+        bytes_before = 0
+        for model, fields in tracked_fields().items():
+            for field in fields:
+                legacy = (
+                    model.objects.exclude(**{field.attname: ''})
+                    .exclude(**{f'{field.attname}__startswith': BLOB_PREFIX + '/'})
+                    .values_list('pk', field.attname)
+                )
+                for pk, name in legacy.iterator():
+                    if name not in adopted:
+                        if not content_storage.exists(name):
+                            self.stdout.write(self.style.WARNING(f"  missing: {name}"))
+                            continue
+                        bytes_before += content_storage.size(name)
+                        if dry_run:
+                            adopted[name] = None
+                            continue
+                        with content_storage.open(name, 'rb') as f:
+                            adopted[name] = content_storage.save(name, File(f))
+                    if not dry_run:
+                        model.objects.filter(pk=pk).update(**{field.attname: adopted[name]})
+
+        if not dry_run:
+            for name in adopted:
+                os.remove(content_storage.path(name))
+                delete_variants(content_storage, name)
+
+        blob_bytes = sum(StoredBlob.objects.filter(name__in=set(adopted.values())).values_list('size', flat=True))
+        self.stdout.write(
+            f"Adopted {len(adopted)} legacy file(s), {bytes_before} bytes"
+            + ('' if dry_run else f" now stored as {blob_bytes} bytes")
+        )
+
+    def reconcile(self, dry_run):
+        counts = Counter()
+        for model, fields in tracked_fields().items():
+            for field in fields:
+                rows = (
+                    model.objects.filter(**{f'{field.attname}__startswith': BLOB_PREFIX + '/'})
+                    .values(field.attname)
+                    .annotate(n=Count('pk'))
+                )
+                for row in rows:
+                    counts[row[field.attname]] += row['n']
+
+        # Blobs written to disk without a row (e.g. the refcount row was lost)
+        known = set(StoredBlob.objects.values_list('name', flat=True))
+        root = content_storage.path(BLOB_PREFIX)
+        missing = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d != 'tmp']
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), content_storage.location).replace(os.sep, '/')
+                if name not in known:
+                    missing.append(StoredBlob(name=name, size=os.path.getsize(os.path.join(dirpath, filename))))
+
+        changed = []
+        for blob in StoredBlob.objects.only('pk', 'name', 'ref_count').iterator():
+            if blob.ref_count != counts[blob.name]:
+                blob.ref_count = counts[blob.name]
+                changed.append(blob)
+        for blob in missing:
+            blob.ref_count = counts[blob.name]
+
+        if not dry_run:
+            StoredBlob.objects.bulk_create(missing, batch_size=500)
+            StoredBlob.objects.bulk_update(changed, ['ref_count'], batch_size=500)
+        self.stdout.write(f"Reconciled {len(changed)} refcount(s), registered {len(missing)} untracked blob(s)")
+
+    def collect(self, grace_hours, dry_run):
+        cutoff = timezone.now() - timedelta(hours=grace_hours)
+        # Finalized resumable uploads are waiting to be attached, keep their blobs
+        pending = UploadSession.objects.filter(status='complete').values('file_name')
+        orphans = (
+            StoredBlob.objects.filter(ref_count__lte=0, last_seen_at__lt=cutoff)
+            .exclude(name__in=pending)
+        )
+
+        removed = freed = 0
+        # Materialized: rows are deleted while walking the list
+        for blob in list(orphans.only('pk', 'name', 'size')):
+            if dry_run or self.remove_orphan(blob, cutoff, pending):
+                removed += 1
+                freed += blob.size
+
+        verb = 'would be removed' if dry_run else 'removed'
+        self.stdout.write(self.style.SUCCESS(f"{removed} orphaned blob(s) {verb}, {freed} bytes"))
+
+    def remove_orphan(self, blob, cutoff, pending):
+        """
+        Delete a blob selected by collect() unless it was reused since. The
+        DELETE re-checks the selection, so a blob that an upload re-registered
+        or a row started referencing is kept. The file is unlinked before the
+        delete commits: a concurrent register_blob either refreshed the row
+        first or waits for the commit and then writes the file again.
+        """
+        with transaction.atomic():
+            deleted, _ = (
+                StoredBlob.objects.filter(pk=blob.pk, ref_count__lte=0, last_seen_at__lt=cutoff)
+                .exclude(name__in=pending)
+                .delete()
+            )
+            if not deleted:
+                return False
+            if is_blob_name(blob.name) and os.path.exists(content_storage.path(blob.name)):
+                os.remove(content_storage.path(blob.name))
+            delete_variants(content_storage, blob.name)
+        return True
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.qr import QR_BATCH_SIZE, QR_TARGETS, generate_qr_codes, stale_qr_rows
+
+
+class Command(BaseCommand):
+    help = "Generate check-in QR codes for patients and hospitals in bulk, skipping ones that are already current"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['all', *QR_TARGETS], default='all')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=QR_BATCH_SIZE)
+        parser.add_argument('--force', action='store_true', help='Regenerate even codes that are current')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be generated')
+
+    def handle(self, *args, **options):
+        kinds = list(QR_TARGETS) if options['kind'] == 'all' else [options['kind']]
+        for kind in kinds:
+            if options['dry_run']:
+                self.stdout.write(f"{stale_qr_rows(kind, options['force']).count()} {kind} QR code(s) would be generated")
+                continue
+
+            started = time.monotonic()
+            written = generate_qr_codes(
+                kind,
+                force=options['force'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                progress=lambda n, kind=kind: self.stdout.write(f"  {kind}: {n} generated"),
+            )
+            elapsed = time.monotonic() - started
+            rate = written / elapsed if elapsed else float(written)
+            self.stdout.write(self.style.SUCCESS(
+                f"Generated {written} {kind} QR code(s) in {elapsed:.1f}s ({rate:.0f}/s)"
+            ))
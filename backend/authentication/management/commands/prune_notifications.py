@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from authentication.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete (optionally archiving first) read notifications older than the retention age. "
+        "Works in small primary-key batches, each in its own short transaction, so the table "
+        "is never locked for the whole run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Retention age in days (default: NOTIFICATION_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches to give other writers room')
+        parser.add_argument('--archive-dir',
+                            help='Write removed rows as gzipped JSON lines into this directory before deleting')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be removed')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        batch_size = options['batch_size']
+        if days < 1 or batch_size < 1:
+            raise CommandError('--days and --batch-size must be positive')
+
+        cutoff = timezone.now() - timedelta(days=days)
+        candidates = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+        if options['dry_run']:
+            total = candidates.count()
+            self.stdout.write(f"{total} read notification(s) older than {days} days would be removed")
+            return
+
+        archive = None
+        if options['archive_dir']:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+            path = os.path.join(
+                options['archive_dir'],
+                f"notifications-{timezone.now():%Y%m%d%H%M%S}.jsonl.gz"
+            )
+            archive = open(path, 'ab')
+            self.stdout.write(f"Archiving to {path}")
+
+        processed = 0
+        last_pk = 0
+        started = time.monotonic()
+        try:
+            while True:
+                # Keyset walk over the primary key: every batch is a cheap range scan
+                batch = list(
+                    candidates.filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .values('pk', 'user_id', 'message', 'notification_type', 'created_at')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                if archive:
+                    self.archive_batch(archive, batch)
+
+                ids = [row['pk'] for row in batch]
+                deleted, _ = Notification.objects.filter(pk__in=ids).delete()
+                processed += deleted
+                last_pk = ids[-1]
+
+                elapsed = time.monotonic() - started
+                rate = processed / elapsed if elapsed else float(processed)
+                self.stdout.write(f"  {processed} removed ({rate:.0f} rows/s)")
+
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        finally:
+            if archive:
+                archive.close()
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else float(processed)
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {processed} read notification(s) older than {days} days "
+            f"in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        ))
+
+    def archive_batch(self, archive, batch):
+        """
+        Append the batch as a complete gzip member and fsync it, so every row is
+        on disk before it is deleted. gzip readers (zcat, gzip.open) read the
+        concatenated members as one stream.
+        """
+        lines = []
+        for row in batch:
+            row['created_at'] = row['created_at'].isoformat()
+            lines.append(json.dumps(row) + '\n')
+        with gzip.GzipFile(fileobj=archive, mode='wb') as member:
+            member.write(''.join(lines).encode('utf-8'))
+        archive.flush()
+        os.fsync(archive.fileno())
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from authentication.models import OTP
+
+
+class Command(BaseCommand):
+    help = "Delete expired, used and legacy (no expiry) OTP rows in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be removed')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Keep anything still inside the send rate-limit window, SendOTPView counts those rows
+        window_start = now - timedelta(seconds=settings.OTP_SEND_WINDOW_SECONDS)
+        stale = OTP.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__lte=now) | Q(is_used=True),
+            created_at__lt=window_start,
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale.count()} OTP row(s) would be removed")
+            return
+
+        removed = 0
+        while True:
+            ids = list(stale.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted, _ = OTP.objects.filter(pk__in=ids).delete()
+            removed += deleted
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} OTP row(s)"))
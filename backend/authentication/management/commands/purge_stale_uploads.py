@@ -0,0 +1,35 @@
+import glob
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from authentication.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = "Remove resumable uploads that were abandoned or finalized but never attached"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=24)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        stale = UploadSession.objects.filter(status__in=['active', 'complete'], updated_at__lt=cutoff)
+
+        removed = 0
+        for upload in stale.iterator():
+            if not options['dry_run']:
+                # A finalized but unclaimed blob may be shared; gc_blobs removes it once unreferenced
+                if upload.status == 'active':
+                    # The part file and any chunks staged by requests that died mid-body
+                    for path in [upload.temp_path, *glob.glob(f'{glob.escape(upload.temp_path)}.*')]:
+                        if os.path.exists(path):
+                            os.remove(path)
+                upload.delete()
+            removed += 1
+
+        verb = 'would be removed' if options['dry_run'] else 'removed'
+        self.stdout.write(self.style.SUCCESS(f"{removed} stale upload(s) {verb}"))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from authentication.models import DoctorProfile, Review
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating aggregates on DoctorProfile from the Review table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        # One grouped query over reviews instead of one aggregate per doctor
+        totals = {
+            row['doctor']: row
+            for row in Review.objects.values('doctor').annotate(
+                total=Sum('rating'),
+                count=Count('id'),
+                **{f'stars_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+            )
+        }
+
+        fields = ['rating_sum', 'rating_count', 'rating_avg'] + [f'rating_{star}_count' for star in range(1, 6)]
+        drifted = []
+        for doctor in DoctorProfile.objects.only('id', *fields).iterator():
+            row = totals.get(doctor.id, {})
+            expected = {
+                'rating_sum': row.get('total') or 0,
+                'rating_count': row.get('count') or 0,
+            }
+            expected['rating_avg'] = (
+                expected['rating_sum'] / expected['rating_count'] if expected['rating_count'] else 0.0
+            )
+            for star in range(1, 6):
+                expected[f'rating_{star}_count'] = row.get(f'stars_{star}') or 0
+
+            if any(getattr(doctor, name) != value for name, value in expected.items()):
+                for name, value in expected.items():
+                    setattr(doctor, name, value)
+                drifted.append(doctor)
+
+        if drifted and not dry_run:
+            with transaction.atomic():
+                DoctorProfile.objects.bulk_update(drifted, fields, batch_size=500)
+
+        verb = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} doctor rating aggregate(s) {verb}"))
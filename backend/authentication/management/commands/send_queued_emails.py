@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver queued OutboundEmail rows, reusing one SMTP connection per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, retried, failed = deliver_batch(options['batch_size'], options['max_attempts'])
+            if sent or retried or failed:
+                self.stdout.write(f"sent={sent} retried={retried} failed={failed}")
+                # Drain the queue before sleeping
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
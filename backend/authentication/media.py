@@ -0,0 +1,147 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from rest_framework.renderers import BaseRenderer
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class PassthroughRenderer(BaseRenderer):
+    """Lets file views pass DRF content negotiation for any Accept header (e.g. application/pdf)"""
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+def _iter_file(f, start, length):
+    """Yield length bytes from start in CHUNK_SIZE pieces, never the whole file"""
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single "bytes=start-end" range. Returns (start, end) inclusive,
+    None to fall back to a full response (absent or multi-range headers),
+    or raises ValueError when the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('range not satisfiable')
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    # RFC 9110 13.1.5: strong comparison only, a weak validator never matches
+    if if_range.startswith('W/'):
+        return False
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _offload(response, field_file):
+    """Let nginx (X-Accel-Redirect) or Apache/lighttpd (X-Sendfile) send the bytes"""
+    backend = settings.MEDIA_OFFLOAD
+    if backend == 'nginx':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + field_file.name
+        return True
+    if backend == 'sendfile':
+        response['X-Sendfile'] = field_file.path
+        return True
+    return False
+
+
+def serve_field_file(request, field_file, private=True, as_attachment=False, filename=None):
+    """
+    Stream a FileField/ImageField value with HTTP Range, ETag and
+    Last-Modified support. Handles conditional requests before the file is
+    opened, and hands the transfer to the front server when MEDIA_OFFLOAD is set.
+    Pass filename when the stored name (e.g. a content hash) isn't meaningful.
+    """
+    storage = field_file.storage
+    name = field_file.name
+    if not name or not storage.exists(name):
+        return HttpResponse(status=404)
+
+    size = storage.size(name)
+    modified = storage.get_modified_time(name)
+    last_modified = int(modified.timestamp())
+    etag = f'"{last_modified:x}-{size:x}"'
+
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, no-cache' if private else 'public, max-age=3600',
+        'Content-Disposition': content_disposition_header(as_attachment, filename),
+    }
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        for key in ('ETag', 'Last-Modified', 'Cache-Control'):
+            conditional[key] = headers[key]
+        return conditional
+
+    offloaded = HttpResponse(content_type=content_type, headers=headers)
+    if _offload(offloaded, field_file):
+        return offloaded
+
+    byte_range = None
+    if _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = end - start + 1 if size else 0
+
+    response = StreamingHttpResponse(
+        _iter_file(storage.open(name, 'rb'), start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+        headers=headers,
+    )
+    response['Content-Length'] = str(length)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
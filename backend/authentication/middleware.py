@@ -0,0 +1,33 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    """Resolve a SimpleJWT access token to a user, same rules as the REST API"""
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections with the same JWT access token the
+    frontend already sends to the REST API. Browsers can't set headers on a
+    WebSocket handshake, so the token is read from ?token=<access>.
+    Connections without a token keep whatever user the session stack resolved.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        token = query.get('token', [None])[0]
+        if token:
+            scope = dict(scope, user=await get_user_for_token(token))
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    DoctorProfile = apps.get_model('authentication', 'DoctorProfile')
+    Review = apps.get_model('authentication', 'Review')
+    for doctor in DoctorProfile.objects.filter(reviews__isnull=False).distinct():
+        ratings = list(Review.objects.filter(doctor=doctor).values_list('rating', flat=True))
+        doctor.rating_sum = sum(ratings)
+        doctor.rating_count = len(ratings)
+        doctor.rating_avg = doctor.rating_sum / doctor.rating_count
+        for star in range(1, 6):
+            setattr(doctor, f'rating_{star}_count', ratings.count(star))
+        doctor.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0018_alter_medicalreport_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_avg',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(fields=['-rating_avg', '-rating_count'], name='doctor_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_unread_counts(apps, schema_editor):
+    User = apps.get_model('authentication', 'User')
+    Notification = apps.get_model('authentication', 'Notification')
+    unread = Notification.objects.filter(is_read=False).values('user').annotate(total=Count('id'))
+    for row in unread:
+        User.objects.filter(pk=row['user']).update(unread_notification_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0019_doctorprofile_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notification_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0021_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otp',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='is_used',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='verify_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['phone_or_email', '-created_at'], name='otp_recipient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:20
+
+import authentication.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0023_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='payment_screenshot',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='appointment_payments/'),
+        ),
+        migrations.AlterField(
+            model_name='doctorprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='doctor_profiles/'),
+        ),
+        migrations.AlterField(
+            model_name='doctorprofile',
+            name='signature_image',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='doctor_signatures/'),
+        ),
+        migrations.AlterField(
+            model_name='hospital',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='hospital_logos/'),
+        ),
+        migrations.AlterField(
+            model_name='hospital',
+            name='qr_code',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='hospital_qrs/'),
+        ),
+        migrations.AlterField(
+            model_name='medicalreport',
+            name='report_file',
+            field=models.FileField(storage=authentication.storage.ContentAddressedStorage(), upload_to='medical_reports/'),
+        ),
+        migrations.AlterField(
+            model_name='patientprofile',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='patient_profiles/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('last_seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_seen_at'], name='blob_gc_idx')],
+            },
+        ),
+    ]
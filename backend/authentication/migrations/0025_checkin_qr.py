@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:05
+
+import authentication.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0024_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='checkin_qr',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='hospital_checkin_qrs/'),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='checkin_qr_payload',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='patientprofile',
+            name='checkin_qr',
+            field=models.ImageField(blank=True, null=True, storage=authentication.storage.ContentAddressedStorage(), upload_to='patient_qrs/'),
+        ),
+        migrations.AddField(
+            model_name='patientprofile',
+            name='checkin_qr_payload',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0025_checkin_qr'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignalingPresence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('doctor', 'Doctor'), ('patient', 'Patient'), ('observer', 'Observer')], max_length=10)),
+                ('channel_name', models.CharField(max_length=255, unique=True)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signaling_presence', to='authentication.appointment')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signaling_presence', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('role__in', ['doctor', 'patient'])), fields=('appointment', 'role'), name='signaling_one_seat_per_role')],
+            },
+        ),
+    ]
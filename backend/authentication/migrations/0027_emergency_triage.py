@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0026_signaling_presence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorPresence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel_name', models.CharField(max_length=255, unique=True)),
+                ('connected_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presence', to='authentication.doctorprofile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmergencyCase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('severity', models.PositiveSmallIntegerField(choices=[(1, 'Resuscitation'), (2, 'Emergent'), (3, 'Urgent'), (4, 'Less Urgent'), (5, 'Non-Urgent')], default=3)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('assigned', 'Assigned'), ('closed', 'Closed')], default='waiting', max_length=10)),
+                ('arrived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('assigned_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='emergency_case', to='authentication.appointment')),
+                ('assigned_doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emergency_cases', to='authentication.doctorprofile')),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emergency_cases', to='authentication.hospital')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['hospital', 'severity', 'arrived_at'], name='triage_waiting_idx'), models.Index(fields=['assigned_doctor', 'status'], name='triage_doctor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0027_emergency_triage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorpresence',
+            name='last_seen',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
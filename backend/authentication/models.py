@@ -1,5 +1,13 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+from django.db.models.functions import Cast
+
+from .storage import content_storage
 
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
@@ -11,6 +19,8 @@ class User(AbstractUser):
     user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES)
     mobile = models.CharField(max_length=15)
     unique_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    # Maintained by authentication.notifications so the badge never counts rows
+    unread_notification_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     def __str__(self):
@@ -57,8 +67,11 @@ class PatientProfile(models.Model):
     postal_code = models.CharField(max_length=10, blank=True)
     
     # Other
-    profile_image = models.ImageField(upload_to='patient_profiles/', null=True, blank=True)
+    profile_image = models.ImageField(upload_to='patient_profiles/', storage=content_storage, null=True, blank=True)
     patient_unique_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    # Generated check-in QR encoding patient_unique_id; checkin_qr_payload is what it encodes
+    checkin_qr = models.ImageField(upload_to='patient_qrs/', storage=content_storage, null=True, blank=True)
+    checkin_qr_payload = models.CharField(max_length=100, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -85,13 +98,16 @@ class Hospital(models.Model):
     registration_number = models.CharField(max_length=50, blank=True)
     contact_number = models.CharField(max_length=15, blank=True)
     website = models.URLField(blank=True)
-    logo = models.ImageField(upload_to='hospital_logos/', null=True, blank=True)
+    logo = models.ImageField(upload_to='hospital_logos/', storage=content_storage, null=True, blank=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     description = models.TextField(blank=True)
     beds = models.IntegerField(default=0)
     opening_hours = models.CharField(max_length=100, default='24/7')
-    qr_code = models.ImageField(upload_to='hospital_qrs/', null=True, blank=True)
+    qr_code = models.ImageField(upload_to='hospital_qrs/', storage=content_storage, null=True, blank=True)
+    # qr_code above is the hospital's uploaded payment QR; this one is generated for check-in
+    checkin_qr = models.ImageField(upload_to='hospital_checkin_qrs/', storage=content_storage, null=True, blank=True)
+    checkin_qr_payload = models.CharField(max_length=100, blank=True)
     
     def __str__(self):
         return self.hospital_name
@@ -136,6 +152,11 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+            # The unfiltered list (user, newest first) can't use the index above without is_read
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.message[:20]}"
@@ -144,7 +165,7 @@ class DoctorProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='doctor_profile')
     hospital = models.ForeignKey(Hospital, on_delete=models.SET_NULL, null=True, blank=True, related_name='doctors')
     department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, related_name='doctors')
-    profile_picture = models.ImageField(upload_to='doctor_profiles/', null=True, blank=True)
+    profile_picture = models.ImageField(upload_to='doctor_profiles/', storage=content_storage, null=True, blank=True)
     qualification = models.CharField(max_length=100, blank=True)
     specialization = models.CharField(max_length=100, blank=True)
     experience_years = models.IntegerField(default=0)
@@ -159,20 +180,77 @@ class DoctorProfile(models.Model):
     doctor_unique_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
     is_verified = models.BooleanField(default=False)
     consent_accepted = models.BooleanField(default=False)
-    signature_image = models.ImageField(upload_to='doctor_signatures/', null=True, blank=True)
-    
+    signature_image = models.ImageField(upload_to='doctor_signatures/', storage=content_storage, null=True, blank=True)
+
+    # Denormalized review aggregates, kept in sync by record_rating()
+    # and repaired by the reconcile_doctor_ratings command
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(default=0.0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_avg', '-rating_count'], name='doctor_rating_idx'),
+        ]
+
     def __str__(self):
         return f"Dr. {self.user.first_name} {self.user.last_name}"
 
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+    def record_rating(self, rating, delta=1):
+        """
+        Atomically add (delta=1) or remove (delta=-1) a single star rating
+        from the aggregates without re-reading the reviews table.
+        """
+        rating = int(rating)
+        new_sum = models.F('rating_sum') + rating * delta
+        new_count = models.F('rating_count') + delta
+        DoctorProfile.objects.filter(pk=self.pk).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_avg=models.Case(
+                models.When(rating_count__lte=-delta, then=models.Value(0.0)),
+                default=Cast(new_sum, models.FloatField()) / Cast(new_count, models.FloatField()),
+                output_field=models.FloatField(),
+            ),
+            **{f'rating_{rating}_count': models.F(f'rating_{rating}_count') + delta}
+        )
+        self.refresh_from_db(fields=[
+            'rating_sum', 'rating_count', 'rating_avg',
+            'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        ])
+
 class OTP(models.Model):
     phone_or_email = models.CharField(max_length=255)
     otp_code = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Rows without an expiry predate OTP_TTL_SECONDS and are treated as expired
+    expires_at = models.DateTimeField(null=True, blank=True)
+    verify_attempts = models.PositiveSmallIntegerField(default=0)
+    is_used = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone_or_email', '-created_at'], name='otp_recipient_created_idx'),
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
 
     @staticmethod
     def generate_otp():
-        import random
-        return str(random.randint(100000, 999999))
+        import secrets
+        return str(100000 + secrets.randbelow(900000))
+
+    @property
+    def is_expired(self):
+        return self.expires_at is None or self.expires_at <= timezone.now()
 
     def __str__(self):
         return f"{self.phone_or_email} - {self.otp_code}"
@@ -234,7 +312,7 @@ class Appointment(models.Model):
     time_slot = models.CharField(max_length=50) # e.g., "09:00 - 09:10"
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     consultation_type = models.CharField(max_length=10, choices=CONSULTATION_TYPES, default='online')
-    payment_screenshot = models.ImageField(upload_to='appointment_payments/', null=True, blank=True)
+    payment_screenshot = models.ImageField(upload_to='appointment_payments/', storage=content_storage, null=True, blank=True)
     symptoms = models.TextField(blank=True)
     meeting_link = models.URLField(max_length=500, blank=True, null=True)
     booking_reference = models.CharField(max_length=20, unique=True, null=True, blank=True)
@@ -263,7 +341,7 @@ class MedicalReport(models.Model):
     report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES, default='consultation')
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    report_file = models.FileField(upload_to='medical_reports/')
+    report_file = models.FileField(upload_to='medical_reports/', storage=content_storage)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -287,3 +365,171 @@ class Review(models.Model):
 
     def __str__(self):
         return f"Review by {self.patient} for {self.doctor} - {self.rating} stars"
+
+
+class OutboundEmail(models.Model):
+    """
+    Transactional email outbox. Views enqueue rows in their own transaction,
+    the send_queued_emails worker delivers them over a pooled SMTP connection.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    # [{"name": "<storage name>", "mimetype": "application/pdf"}], read from default storage at send time
+    attachments = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """
+    Resumable upload: init, then sequential chunks written straight to a
+    .part file on disk, then finalize verifies the SHA-256 and moves the file
+    into content-addressed storage so it can be attached without a copy.
+    """
+    PURPOSE_CHOICES = (
+        ('medical_report', 'Medical Report'),
+        ('payment_screenshot', 'Payment Screenshot'),
+    )
+    STATUS_CHOICES = (
+        ('active', 'Receiving Chunks'),
+        ('complete', 'Complete'),
+        ('consumed', 'Attached'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)  # hex SHA-256 of the whole file
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    file_name = models.CharField(max_length=255, blank=True)  # storage name once finalized
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial', f'{self.id}.part')
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.total_size}, {self.status})"
+
+
+class StoredBlob(models.Model):
+    """A file in content-addressed storage and how many model rows point at it"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    last_seen_at = models.DateTimeField(default=timezone.now)  # last time an upload hashed to this blob
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'last_seen_at'], name='blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class SignalingPresence(models.Model):
+    """
+    A socket currently joined to an appointment's signaling room. Kept in the
+    database so every daphne worker sees the same membership: the doctor and
+    the patient hold one seat each, anyone else allowed in is an observer.
+    """
+    ROLE_CHOICES = (
+        ('doctor', 'Doctor'),
+        ('patient', 'Patient'),
+        ('observer', 'Observer'),
+    )
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='signaling_presence')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='signaling_presence')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    channel_name = models.CharField(max_length=255, unique=True)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['appointment', 'role'],
+                condition=models.Q(role__in=['doctor', 'patient']),
+                name='signaling_one_seat_per_role',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in appointment {self.appointment_id} as {self.role}"
+
+
+class EmergencyCase(models.Model):
+    """
+    Triage record for an emergency booking. Waiting cases form a per-hospital
+    priority queue: most severe level first, then earliest arrival, read
+    straight off triage_waiting_idx so taking the next case is one index probe.
+    """
+    SEVERITY_CHOICES = (
+        (1, 'Resuscitation'),
+        (2, 'Emergent'),
+        (3, 'Urgent'),
+        (4, 'Less Urgent'),
+        (5, 'Non-Urgent'),
+    )
+    STATUS_CHOICES = (
+        ('waiting', 'Waiting'),
+        ('assigned', 'Assigned'),
+        ('closed', 'Closed'),
+    )
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, related_name='emergency_case')
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='emergency_cases')
+    severity = models.PositiveSmallIntegerField(choices=SEVERITY_CHOICES, default=3)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    arrived_at = models.DateTimeField(default=timezone.now)
+    assigned_doctor = models.ForeignKey(DoctorProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='emergency_cases')
+    assigned_at = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['hospital', 'severity', 'arrived_at'],
+                condition=models.Q(status='waiting'),
+                name='triage_waiting_idx',
+            ),
+            models.Index(fields=['assigned_doctor', 'status'], name='triage_doctor_idx'),
+        ]
+
+    def __str__(self):
+        return f"Emergency {self.appointment_id} (level {self.severity}, {self.status})"
+
+
+class DoctorPresence(models.Model):
+    """An open waiting-room socket of a doctor; a doctor with one is on shift for triage"""
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='presence')
+    channel_name = models.CharField(max_length=255, unique=True)
+    connected_at = models.DateTimeField(auto_now_add=True)
+    # Refreshed by the socket's heartbeat; rows left by a crashed worker go stale
+    last_seen = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.doctor} online since {self.connected_at}"
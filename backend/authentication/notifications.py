@@ -0,0 +1,118 @@
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .models import Notification, User
+from .outbox import enqueue_bulk
+from .serializers import NotificationSerializer
+
+
+def notification_group_name(user_id):
+    return f'notifications_{user_id}'
+
+
+def run_in_background(func, *args):
+    """Run func on a daemon thread once the current transaction has committed"""
+    def target():
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Background task error: {e}")
+        finally:
+            close_old_connections()
+
+    transaction.on_commit(lambda: threading.Thread(target=target, daemon=True).start())
+
+
+def push_notification(notification):
+    """
+    Fan a saved Notification out to the recipient's open notification sockets.
+    The push is deferred until the surrounding transaction commits so clients
+    never see a notification that was rolled back.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    event = {
+        'type': 'notification_message',
+        'notification': dict(NotificationSerializer(notification).data),
+    }
+    group = notification_group_name(notification.user_id)
+
+    def send():
+        try:
+            async_to_sync(channel_layer.group_send)(group, event)
+        except Exception as e:
+            print(f"Notification push error: {e}")
+
+    transaction.on_commit(send)
+
+
+def notify(user, message, notification_type='info'):
+    """Create an in-app notification, bump the unread counter and push it to connected clients"""
+    with transaction.atomic():
+        notification = Notification.objects.create(
+            user=user,
+            message=message,
+            notification_type=notification_type
+        )
+        User.objects.filter(pk=user.pk).update(
+            unread_notification_count=F('unread_notification_count') + 1
+        )
+        push_notification(notification)
+    return notification
+
+
+def mark_all_read(user):
+    """Mark every unread notification as read and reset the counter"""
+    with transaction.atomic():
+        # Lock the user row so a concurrent notify() increments after the reset
+        User.objects.select_for_update().filter(pk=user.pk).values_list('pk').first()
+        updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        User.objects.filter(pk=user.pk).update(unread_notification_count=0)
+    return updated
+
+
+BROADCAST_BATCH_SIZE = 500
+
+
+def _push_many(notifications):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    send = async_to_sync(channel_layer.group_send)
+    for notification in notifications:
+        send(notification_group_name(notification.user_id), {
+            'type': 'notification_message',
+            'notification': dict(NotificationSerializer(notification).data),
+        })
+
+
+def notify_many(user_ids, message, notification_type='info', email_subject=None):
+    """
+    Create one notification per recipient with chunked bulk_create and bump
+    their unread counters per chunk. Socket push goes to a background thread
+    and optional email to the outbox, so the request only pays for the inserts.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    created = []
+    with transaction.atomic():
+        for start in range(0, len(user_ids), BROADCAST_BATCH_SIZE):
+            chunk = user_ids[start:start + BROADCAST_BATCH_SIZE]
+            created.extend(Notification.objects.bulk_create([
+                Notification(user_id=user_id, message=message, notification_type=notification_type)
+                for user_id in chunk
+            ]))
+            User.objects.filter(pk__in=chunk).update(
+                unread_notification_count=F('unread_notification_count') + 1
+            )
+
+        run_in_background(_push_many, created)
+        if email_subject:
+            recipients = User.objects.filter(pk__in=user_ids).exclude(email='').values_list('email', flat=True)
+            enqueue_bulk(email_subject, message, recipients)
+    return created
@@ -0,0 +1,125 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+# Worker leases claimed rows for this long so a second worker skips them
+LEASE_SECONDS = 300
+RETRY_BASE_SECONDS = 30
+
+
+def enqueue_email(subject, body, recipients, from_email=None, attachments=None):
+    """
+    Queue an email for the send_queued_emails worker. Runs inside the caller's
+    transaction, so the email is only sent if the surrounding write commits.
+
+    attachments is a list of (storage_name, mimetype) for files already saved
+    to default storage; they are read at send time, not now.
+    """
+    recipients = [r for r in recipients if r]
+    if not recipients:
+        return None
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=recipients,
+        attachments=[{'name': name, 'mimetype': mimetype} for name, mimetype in (attachments or [])],
+    )
+
+
+def enqueue_bulk(subject, body, recipients, from_email=None, batch_size=500):
+    """Queue one email per recipient with chunked bulk_create"""
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    return OutboundEmail.objects.bulk_create(
+        [OutboundEmail(subject=subject, body=body, from_email=from_email, to=[r]) for r in recipients if r],
+        batch_size=batch_size,
+    )
+
+
+def claim_due(batch_size):
+    """Lease up to batch_size due emails; returns the claimed rows"""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(id__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by('created_at'))
+
+
+def build_message(outbound, connection):
+    message = EmailMessage(
+        outbound.subject,
+        outbound.body,
+        outbound.from_email or settings.DEFAULT_FROM_EMAIL,
+        outbound.to,
+        connection=connection,
+    )
+    for attachment in outbound.attachments:
+        with default_storage.open(attachment['name'], 'rb') as f:
+            message.attach(os.path.basename(attachment['name']), f.read(), attachment.get('mimetype'))
+    return message
+
+
+def _record_failure(outbound, error, max_attempts):
+    outbound.last_error = str(error)
+    if outbound.attempts >= max_attempts:
+        outbound.status = 'failed'
+        return False
+    # Exponential backoff: 30s, 60s, 120s, ...
+    delay = RETRY_BASE_SECONDS * (2 ** (outbound.attempts - 1))
+    outbound.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    return True
+
+
+def deliver_batch(batch_size=50, max_attempts=5):
+    """
+    Send one batch of due emails over a single SMTP connection.
+    Returns (sent, retried, failed) counts.
+    """
+    batch = claim_due(batch_size)
+    if not batch:
+        return 0, 0, 0
+
+    sent = retried = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        open_error = None
+    except Exception as e:
+        open_error = e
+
+    try:
+        for outbound in batch:
+            outbound.attempts += 1
+            try:
+                if open_error:
+                    raise open_error
+                connection.send_messages([build_message(outbound, connection)])
+            except Exception as e:
+                if _record_failure(outbound, e, max_attempts):
+                    retried += 1
+                else:
+                    failed += 1
+            else:
+                outbound.status = 'sent'
+                outbound.sent_at = timezone.now()
+                outbound.last_error = ''
+                sent += 1
+            outbound.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at'])
+    finally:
+        if not open_error:
+            connection.close()
+    return sent, retried, failed
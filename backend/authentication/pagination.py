@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NotificationCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (user, created_at), or (user, is_read, created_at)
+    for ?unread=true, each backed by its own index, so deep pages cost the
+    same as the first one, unlike OFFSET on an ever-growing table.
+    """
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,150 @@
+import io
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import qrcode
+from PIL import Image
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat
+
+# kind -> (model name, unique id field, payload prefix)
+# Models are looked up lazily: render_qr runs in pool workers that may be
+# spawned without Django set up.
+QR_TARGETS = {
+    'patient': ('PatientProfile', 'patient_unique_id', 'MEDISEWA:P:'),
+    'hospital': ('Hospital', 'hospital_unique_id', 'MEDISEWA:H:'),
+}
+QR_BATCH_SIZE = 200
+
+
+def _model(kind):
+    return apps.get_model('authentication', QR_TARGETS[kind][0])
+
+
+def qr_payload(kind, unique_id):
+    return QR_TARGETS[kind][2] + unique_id
+
+
+def parse_qr_payload(code):
+    """(kind, unique_id) for a scanned code; a bare id is taken as a patient id"""
+    code = (code or '').strip()
+    for kind, (_, _, prefix) in QR_TARGETS.items():
+        if code.startswith(prefix):
+            return kind, code[len(prefix):]
+    return 'patient', code
+
+
+def render_qr(payload, box_size=10, border=4):
+    """PNG bytes for payload. Pure function so it can run in a process pool."""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=border)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    # One pixel per module, scaled up once, instead of drawing each module as a rectangle
+    matrix = qr.get_matrix()
+    size = len(matrix)
+    img = Image.new('1', (size, size))
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    img = img.resize((size * box_size, size * box_size), Image.Resampling.NEAREST)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def stale_qr_rows(kind, force=False):
+    """Rows with a unique id whose check-in QR is missing or encodes something else"""
+    _, id_field, prefix = QR_TARGETS[kind]
+    rows = _model(kind).objects.exclude(**{f'{id_field}__isnull': True}).exclude(**{id_field: ''})
+    if force:
+        return rows
+    return rows.annotate(expected_qr_payload=Concat(Value(prefix), id_field)).filter(
+        Q(checkin_qr='') | Q(checkin_qr__isnull=True) | ~Q(checkin_qr_payload=F('expected_qr_payload'))
+    )
+
+
+def save_qr_batch(kind, rendered):
+    """
+    Store rendered codes and repoint rows at them in one bulk_update.
+    rendered is [(pk, payload, png bytes)]. bulk_update skips the blob
+    refcount signals, so the counts are adjusted here in one statement.
+    """
+    from .storage import adjust_refcounts, content_storage
+
+    model = _model(kind)
+    with transaction.atomic():
+        rows = model.objects.only('pk', 'checkin_qr', 'checkin_qr_payload').in_bulk([pk for pk, _, _ in rendered])
+        rendered = [item for item in rendered if item[0] in rows]
+        names = content_storage.save_many([(f'{kind}-qr.png', png) for _, _, png in rendered])
+
+        deltas = Counter()
+        updated = []
+        for (pk, payload, _), name in zip(rendered, names):
+            row = rows[pk]
+            deltas[name] += 1
+            deltas[row.checkin_qr.name or ''] -= 1
+            row.checkin_qr = name
+            row.checkin_qr_payload = payload
+            updated.append(row)
+        adjust_refcounts(deltas)
+        model.objects.bulk_update(updated, ['checkin_qr', 'checkin_qr_payload'])
+    return len(updated)
+
+
+def generate_qr_codes(kind, force=False, workers=None, batch_size=QR_BATCH_SIZE, progress=None):
+    """
+    Render every stale check-in QR for kind on a process pool, batch_size
+    rows at a time (keyset over the primary key). Returns the number written.
+    """
+    id_field = QR_TARGETS[kind][1]
+    rows = stale_qr_rows(kind, force)
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    last_pk = None
+
+    # spawn rather than fork: portable, and children don't inherit DB connections or server threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        while True:
+            batch = rows.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch.values_list('pk', id_field)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            payloads = [qr_payload(kind, unique_id) for _, unique_id in batch]
+            chunksize = max(1, len(payloads) // (workers * 4))
+            pngs = pool.map(render_qr, payloads, chunksize=chunksize)
+            written += save_qr_batch(kind, [
+                (pk, payload, png) for (pk, _), payload, png in zip(batch, payloads, pngs)
+            ])
+            if progress:
+                progress(written)
+    return written
+
+
+def generate_qr_for(kind, pk):
+    """Background path for a single new or renamed row, rendered in-process"""
+    id_field = QR_TARGETS[kind][1]
+    row = stale_qr_rows(kind).filter(pk=pk).values_list('pk', id_field).first()
+    if row:
+        payload = qr_payload(kind, row[1])
+        save_qr_batch(kind, [(row[0], payload, render_qr(payload))])
+
+
+def connect_qr_signals():
+    """Render a check-in QR after a save that leaves the row without a current one"""
+    from django.db.models.signals import post_save
+    from .notifications import run_in_background
+
+    for kind, (model_name, id_field, prefix) in QR_TARGETS.items():
+        def queue_qr(sender, instance, kind=kind, id_field=id_field, prefix=prefix, **kwargs):
+            unique_id = instance.__dict__.get(id_field)
+            payload = instance.__dict__.get('checkin_qr_payload')
+            if unique_id and payload is not None and payload != prefix + unique_id:
+                run_in_background(generate_qr_for, kind, instance.pk)
+
+        post_save.connect(queue_qr, sender=_model(kind), weak=False, dispatch_uid=f'checkin_qr_{kind}')
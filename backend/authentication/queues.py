@@ -0,0 +1,155 @@
+import re
+from bisect import bisect_left
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+# Appointments still waiting to be seen
+QUEUE_STATUSES = ('pending', 'approved')
+SLOT_START = re.compile(r'(\d{1,2}):(\d{2})')
+
+
+def hospital_queue_group(hospital_id):
+    return f'queue_hospital_{hospital_id}'
+
+
+def doctor_queue_group(doctor_id):
+    return f'queue_doctor_{doctor_id}'
+
+
+def queue_scope(user):
+    """('hospital' or 'doctor', its id) for the queue the user watches, or None"""
+    if user.user_type == 'hospital':
+        return 'hospital', user.id
+    if user.user_type == 'doctor':
+        DoctorProfile = apps.get_model('authentication', 'DoctorProfile')
+        doctor_id = DoctorProfile.objects.filter(user=user).values_list('id', flat=True).first()
+        if doctor_id is not None:
+            return 'doctor', doctor_id
+    return None
+
+
+def queue_key(entry):
+    """Emergencies first, then by slot start, then by booking time"""
+    match = SLOT_START.search(entry['time_slot'] or '')
+    start = f'{int(match.group(1)):02d}:{match.group(2)}' if match else '99:99'
+    return (0 if entry['is_emergency'] else 1, start, entry['created_at'], entry['id'])
+
+
+def queue_entry(appointment):
+    """What a waiting-room screen shows for one appointment; needs patient__user and doctor__user loaded"""
+    return {
+        'id': appointment.id,
+        'date': appointment.date.isoformat(),
+        'time_slot': appointment.time_slot,
+        'status': appointment.status,
+        'consultation_type': appointment.consultation_type,
+        'is_emergency': appointment.is_emergency,
+        'patient_name': appointment.patient.user.get_full_name(),
+        'doctor': appointment.doctor_id,
+        'doctor_name': appointment.doctor.user.get_full_name(),
+        'created_at': appointment.created_at.isoformat(),
+    }
+
+
+def _appointments():
+    return apps.get_model('authentication', 'Appointment').objects.select_related('patient__user', 'doctor__user')
+
+
+def todays_queue(**filters):
+    """Today's waiting appointments matching filters, in queue order"""
+    rows = _appointments().filter(date=timezone.localtime().date(), status__in=QUEUE_STATUSES, **filters)
+    return sorted((queue_entry(a) for a in rows), key=queue_key)
+
+
+def in_queue(entry, today):
+    return entry['status'] in QUEUE_STATUSES and entry['date'] == today
+
+
+class QueueView:
+    """
+    One socket's copy of a queue: sorted keys plus id -> key, so each change
+    is placed with a binary search and reported as a position the client can
+    splice in, instead of the client re-sorting or re-fetching the list.
+    """
+
+    def __init__(self, entries, key=queue_key):
+        self.key = key
+        self.keys = [key(e) for e in entries]
+        self.by_id = {e['id']: k for e, k in zip(entries, self.keys)}
+
+    def apply(self, entry, keep):
+        """
+        Remove entry's old position and, if keep, insert it at its new one.
+        Returns the delta to send, or None if the entry was never in the queue.
+        """
+        removed = inserted = None
+        old = self.by_id.pop(entry['id'], None)
+        if old is not None:
+            removed = bisect_left(self.keys, old)
+            del self.keys[removed]
+        if keep:
+            key = self.key(entry)
+            inserted = bisect_left(self.keys, key)
+            self.keys.insert(inserted, key)
+            self.by_id[entry['id']] = key
+
+        if removed is None and inserted is None:
+            return None
+        if removed is None:
+            return {'event': 'insert', 'position': inserted, 'entry': entry}
+        if inserted is None:
+            return {'event': 'remove', 'position': removed, 'entry': entry}
+        return {'event': 'update', 'from': removed, 'to': inserted, 'entry': entry}
+
+
+def push_queue_change(appointment_id, removed=None):
+    """
+    After commit, send the appointment's current state to its hospital and
+    doctor queues. removed is the last known (hospital_id, doctor_id, entry)
+    of a deleted appointment.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    def send():
+        if removed:
+            hospital_id, doctor_id, entry = removed
+        else:
+            appointment = _appointments().filter(pk=appointment_id).first()
+            if appointment is None:
+                return
+            hospital_id, doctor_id, entry = appointment.hospital_id, appointment.doctor_id, queue_entry(appointment)
+        event = {'type': 'queue.change', 'entry': entry}
+        try:
+            group_send = async_to_sync(channel_layer.group_send)
+            group_send(hospital_queue_group(hospital_id), event)
+            group_send(doctor_queue_group(doctor_id), event)
+        except Exception as e:
+            print(f"Queue push error: {e}")
+
+    transaction.on_commit(send)
+
+
+def connect_queue_signals():
+    """Every saved or deleted appointment is pushed to the waiting-room sockets watching it"""
+    from django.db.models.signals import post_delete, post_save
+
+    Appointment = apps.get_model('authentication', 'Appointment')
+
+    def changed(sender, instance, **kwargs):
+        push_queue_change(instance.pk)
+
+    def deleted(sender, instance, **kwargs):
+        entry = {
+            'id': instance.pk, 'date': '', 'time_slot': instance.time_slot, 'status': 'deleted',
+            'is_emergency': instance.is_emergency, 'created_at': '',
+        }
+        push_queue_change(instance.pk, removed=(instance.hospital_id, instance.doctor_id, entry))
+
+    post_save.connect(changed, sender=Appointment, weak=False, dispatch_uid='waiting_room_queue')
+    post_delete.connect(deleted, sender=Appointment, weak=False, dispatch_uid='waiting_room_queue')
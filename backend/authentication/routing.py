@@ -2,5 +2,7 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
-    re_path(r'ws/signaling/(?P<appointment_id>\w+)/$', consumers.SignalingConsumer.as_asgi()),
+    re_path(r'ws/signaling/(?P<appointment_id>\d+)/$', consumers.SignalingConsumer.as_asgi()),
+    re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
+    re_path(r'ws/queue/$', consumers.QueueConsumer.as_asgi()),
 ]
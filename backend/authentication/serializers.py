@@ -1,11 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.urls import reverse
 from django.db import transaction
 from .models import (
     User, Hospital, DoctorProfile, PaymentMethod, Notification, 
     PatientProfile, Department, DoctorHospitalConnection, DoctorSchedule,
     Appointment, MedicalReport, Review
 )
+from .images import variant_urls
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -297,13 +299,18 @@ class UserSerializer(serializers.ModelSerializer):
 
 class PatientProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    profile_image_variants = serializers.SerializerMethodField()
     class Meta:
         model = PatientProfile
         fields = ['id', 'user', 'date_of_birth', 'gender', 'age', 'phone_number', 'alternate_phone',
                   'emergency_contact', 'emergency_contact_name', 'blood_group', 'nid_number',
                   'health_condition', 'medications', 'allergies', 'province', 'district',
                   'city', 'address', 'postal_code', 'profile_image', 'patient_unique_id',
-                  'created_at', 'updated_at']
+                  'created_at', 'updated_at', 'profile_image_variants', 'checkin_qr']
+        read_only_fields = ['checkin_qr']
+
+    def get_profile_image_variants(self, obj):
+        return variant_urls('patient', obj, 'profile_image')
 
 class DepartmentSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(required=False)
@@ -314,13 +321,19 @@ class DepartmentSerializer(serializers.ModelSerializer):
 class HospitalSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     departments = DepartmentSerializer(many=True, required=False)
+    logo_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Hospital
         fields = ['user', 'hospital_name', 'hospital_type', 'hospital_unique_id', 'address', 
                   'province', 'district', 'city', 'ward', 'tole',
                   'pan_number', 'registration_number', 'contact_number', 'website', 
-                  'logo', 'qr_code', 'latitude', 'longitude', 'description', 'beds', 'opening_hours', 'departments']
+                  'logo', 'qr_code', 'latitude', 'longitude', 'description', 'beds', 'opening_hours', 'departments',
+                  'logo_variants', 'checkin_qr']
+        read_only_fields = ['checkin_qr']
+
+    def get_logo_variants(self, obj):
+        return variant_urls('hospital', obj, 'logo')
 
     def update(self, instance, validated_data):
         departments_data = validated_data.pop('departments', None)
@@ -372,13 +385,20 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 class DoctorProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    profile_picture_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = DoctorProfile
         fields = ['id', 'user', 'profile_picture', 'qualification', 'specialization', 
                   'experience_years', 'about', 'is_verified', 'consent_accepted',
                   'nmc_number', 'doctor_unique_id', 'contact_number', 'address', 'gender', 'date_of_birth', 
-                  'consultation_fee', 'signature_image']
+                  'consultation_fee', 'signature_image',
+                  'rating_avg', 'rating_count', 'rating_histogram', 'profile_picture_variants']
+        read_only_fields = ['rating_avg', 'rating_count']
+
+    def get_profile_picture_variants(self, obj):
+        return variant_urls('doctor', obj, 'profile_picture')
 
 class DoctorScheduleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -411,15 +431,26 @@ class MedicalReportSerializer(serializers.ModelSerializer):
     hospital_name = serializers.CharField(source='hospital.hospital_name', read_only=True)
     uploaded_by_name = serializers.CharField(source='uploaded_by.get_full_name', read_only=True)
     patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+    download_url = serializers.SerializerMethodField()
     
     class Meta:
         model = MedicalReport
         fields = [
             'id', 'patient', 'doctor', 'hospital', 'appointment', 
             'report_type', 'title', 'description', 'report_file', 'created_at', 
-            'doctor_name', 'hospital_name', 'uploaded_by_name', 'patient_name'
+            'doctor_name', 'hospital_name', 'uploaded_by_name', 'patient_name', 'download_url'
         ]
         read_only_fields = ['created_at']
+        extra_kwargs = {'report_file': {'required': False}}
+
+    def validate(self, attrs):
+        # The file may instead arrive through a finalized resumable upload (upload_id)
+        if not attrs.get('report_file') and not self.instance and not self.context.get('has_upload'):
+            raise serializers.ValidationError({'report_file': ['No file was submitted.']})
+        return attrs
+
+    def get_download_url(self, obj):
+        return reverse('download_medical_report', args=[obj.pk]) if obj.pk else None
 
 class ReviewSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
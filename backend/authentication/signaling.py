@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import transaction
+
+from .models import Appointment, SignalingPresence
+
+PARTICIPANT_ROLES = ('doctor', 'patient')
+PEER_ROLE = {'doctor': 'patient', 'patient': 'doctor'}
+# An SDP offer is a few KB; anything far larger is not signaling
+MAX_FRAME_LENGTH = 64 * 1024
+# Frames held for a peer that has not joined yet (the offer and early ICE candidates)
+MAX_PENDING_FRAMES = 64
+# Candidate frames as JSON.stringify({type: 'candidate', candidate}) writes them. Frames
+# with another key order are still relayed, just not coalesced.
+CANDIDATE_FRAME_PREFIX = '{"type":"candidate"'
+MAX_BATCH_FRAMES = 32
+
+
+class RoomFull(Exception):
+    pass
+
+
+def room_group_name(appointment_id):
+    return f'signaling_{appointment_id}'
+
+
+def signaling_role(user, appointment_id):
+    """Seat the user takes in the appointment's room, or None if they may not join"""
+    appointment = (
+        Appointment.objects
+        .filter(pk=appointment_id)
+        .select_related('patient', 'doctor')
+        .only('patient__user_id', 'doctor__user_id', 'hospital_id')
+        .first()
+    )
+    if appointment is None:
+        return None
+    if appointment.doctor.user_id == user.id:
+        return 'doctor'
+    if appointment.patient.user_id == user.id:
+        return 'patient'
+    if user.is_staff or appointment.hospital_id == user.id:
+        return 'observer'
+    return None
+
+
+def join_room(appointment_id, user, role, channel_name):
+    """
+    Record channel_name in the room. A participant seat already held by
+    another socket (a reload, or a socket on a worker that died) is taken
+    over; the old channel is returned so it can be told to close.
+    Returns (replaced channel or None, [(role, user_id, channel_name)] of the others).
+    """
+    with transaction.atomic():
+        # Lock the appointment row so concurrent joins to one room are serialised
+        Appointment.objects.select_for_update().filter(pk=appointment_id).values_list('pk').first()
+        rows = SignalingPresence.objects.filter(appointment_id=appointment_id)
+        replaced = None
+        if role in PARTICIPANT_ROLES:
+            previous = rows.filter(role=role).first()
+            if previous:
+                replaced = previous.channel_name
+                previous.delete()
+        elif rows.filter(role='observer').count() >= settings.SIGNALING_MAX_OBSERVERS:
+            raise RoomFull()
+        SignalingPresence.objects.create(
+            appointment_id=appointment_id, user=user, role=role, channel_name=channel_name
+        )
+        others = list(rows.exclude(channel_name=channel_name).values_list('role', 'user_id', 'channel_name'))
+    return replaced, others
+
+
+def batch_frame(texts):
+    """One {"type": "batch", "frames": [...]} frame, spliced from the raw JSON texts without parsing them"""
+    return '{"type":"batch","frames":[' + ','.join(texts) + ']}'
+
+
+def leave_room(channel_name):
+    """Drop the channel's seat; False if it was already taken over"""
+    deleted, _ = SignalingPresence.objects.filter(channel_name=channel_name).delete()
+    return bool(deleted)
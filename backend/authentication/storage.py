@@ -0,0 +1,212 @@
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, FileField, Value, When
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+BLOB_PREFIX = 'cas'
+
+
+def blob_name(sha256, ext=''):
+    # Two levels of fan-out keep directory listings small
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()[:10]}'
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_PREFIX + '/')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Media storage that names every file by the SHA-256 of its bytes. The
+    upload is hashed while it is streamed to a temp file; if a blob with the
+    same hash already exists the temp file is dropped and the existing name
+    is returned, so identical uploads share one file on disk. Blobs are
+    reference-counted by StoredBlob and only removed by gc_blobs.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        tmp_dir = self.path(os.path.join(BLOB_PREFIX, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            return self.adopt(tmp_path, digest.hexdigest(), os.path.splitext(name)[1], size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, path, sha256, ext='', size=None):
+        """Move a local file whose hash is already known into the store (a rename, never a copy)"""
+        name = blob_name(sha256, ext)
+        final_path = self.path(name)
+        if size is None:
+            size = os.path.getsize(path)
+
+        # Registered before the file is checked, so gc_blobs can't remove it in between
+        register_blob(name, size)
+        if os.path.exists(final_path):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+            os.replace(path, final_path)
+        return name
+
+    def save_many(self, items):
+        """
+        Store several in-memory files at once: [(filename, bytes)] -> names.
+        Blob rows are registered in one bulk insert instead of per file.
+        """
+        named = [
+            (blob_name(hashlib.sha256(data).hexdigest(), os.path.splitext(filename)[1]), data)
+            for filename, data in items
+        ]
+        # As in adopt(), rows first so gc_blobs can't remove a file being reused
+        register_blobs({name: len(data) for name, data in named})
+
+        names, written = [], set()
+        for name, data in named:
+            path = self.path(name)
+            if name not in written and not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, path)
+            names.append(name)
+            written.add(name)
+        return names
+
+    def delete(self, name):
+        # Other rows may share this blob; unreferenced blobs are removed by gc_blobs
+        if not is_blob_name(name):
+            super().delete(name)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def register_blob(name, size, attempts=3):
+    StoredBlob = apps.get_model('authentication', 'StoredBlob')
+    for attempt in range(attempts):
+        # Refresh so a blob that just lost its last reference isn't collected mid-reuse
+        if StoredBlob.objects.filter(name=name).update(last_seen_at=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(name=name, size=size)
+            return
+        except IntegrityError:
+            # Another upload of the same bytes registered it first; refresh that row
+            if attempt == attempts - 1:
+                raise
+
+
+def register_blobs(sizes):
+    """Bulk form of register_blob for {name: size}"""
+    if not sizes:
+        return
+    StoredBlob = apps.get_model('authentication', 'StoredBlob')
+    StoredBlob.objects.bulk_create(
+        [StoredBlob(name=name, size=size) for name, size in sizes.items()], ignore_conflicts=True
+    )
+    StoredBlob.objects.filter(name__in=list(sizes)).update(last_seen_at=timezone.now())
+
+
+def adjust_refcounts(deltas):
+    """Apply {name: delta} in a single UPDATE"""
+    deltas = {name: delta for name, delta in deltas.items() if delta and is_blob_name(name)}
+    if deltas:
+        StoredBlob = apps.get_model('authentication', 'StoredBlob')
+        StoredBlob.objects.filter(name__in=list(deltas)).update(ref_count=F('ref_count') + Case(
+            *[When(name=name, then=Value(delta)) for name, delta in deltas.items()],
+            default=Value(0),
+        ))
+
+
+def adjust_refcount(name, delta):
+    if is_blob_name(name):
+        StoredBlob = apps.get_model('authentication', 'StoredBlob')
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + delta)
+
+
+# --- Reference counting -------------------------------------------------------
+# Every FileField/ImageField backed by ContentAddressedStorage is tracked.
+# Names are snapshotted on post_init so post_save can diff without a query.
+# queryset.update() bypasses signals; gc_blobs --reconcile recounts from the rows.
+
+def tracked_fields():
+    """{model: [field, ...]} for every field stored in content-addressed storage"""
+    tracked = {}
+    for model in apps.get_app_config('authentication').get_models():
+        fields = [
+            f for f in model._meta.concrete_fields
+            if isinstance(f, FileField) and isinstance(f.storage, ContentAddressedStorage)
+        ]
+        if fields:
+            tracked[model] = fields
+    return tracked
+
+
+def _file_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+def _loaded_names(instance, fields):
+    # Read __dict__ directly so deferred fields are skipped instead of fetched
+    return {
+        f.attname: _file_name(instance.__dict__[f.attname])
+        for f in fields if f.attname in instance.__dict__
+    }
+
+
+def connect_refcount_signals():
+    from django.db.models.signals import post_delete, post_init, post_save
+
+    for model, fields in tracked_fields().items():
+        def remember(sender, instance, fields=fields, **kwargs):
+            instance._blob_names = _loaded_names(instance, fields)
+
+        def count_saved(sender, instance, created, update_fields=None, fields=fields, **kwargs):
+            before = {} if created else getattr(instance, '_blob_names', {})
+            after = _loaded_names(instance, fields)
+            for attname, new in after.items():
+                if update_fields is not None and attname not in update_fields:
+                    continue
+                old = before.get(attname, '')
+                if old != new:
+                    adjust_refcount(new, 1)
+                    adjust_refcount(old, -1)
+            instance._blob_names = after
+
+        def count_deleted(sender, instance, fields=fields, **kwargs):
+            for name in getattr(instance, '_blob_names', {}).values():
+                adjust_refcount(name, -1)
+
+        uid = f'blob_refcount_{model._meta.label_lower}'
+        post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+        post_save.connect(count_saved, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(count_deleted, sender=model, weak=False, dispatch_uid=uid)
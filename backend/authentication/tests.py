@@ -0,0 +1,1136 @@
+import asyncio
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.core import mail, signing
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from django.utils import timezone
+from PIL import Image
+
+from . import images, outbox, qr, storage, views
+from .channel_layers import SQLiteChannelLayer
+from .consumers import QueueConsumer
+from .management.commands.gc_blobs import Command as GCBlobsCommand
+from .middleware import JWTAuthMiddleware
+from .models import (
+    OTP, Appointment, DoctorPresence, DoctorProfile, Hospital, MedicalReport, Notification, OutboundEmail,
+    PatientProfile, StoredBlob, UploadSession, User,
+)
+from .notifications import notify
+from .routing import websocket_urlpatterns
+from .outbox import LEASE_SECONDS, RETRY_BASE_SECONDS, claim_due, deliver_batch, enqueue_email
+from .storage import content_storage
+from .triage import NoDoctorAvailable, assign_next, available_doctors, doctor_heartbeat, doctor_online, open_case
+from .uploads import UploadError, commit_chunk, stage_chunk
+
+LOCMEM_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM_BACKEND, DEFAULT_FROM_EMAIL='noreply@medisewa.test')
+class OutboxTests(TestCase):
+
+    def make_due(self, **fields):
+        """Mark every queued row due now, as if its retry or lease had run out"""
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1), **fields)
+
+    def test_rolled_back_write_queues_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                enqueue_email('Appointment booked', 'See you at 10:00', ['patient@example.com'])
+                raise RuntimeError('booking failed')
+
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertEqual(deliver_batch(), (0, 0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_committed_write_is_queued_not_sent(self):
+        with transaction.atomic():
+            queued = enqueue_email('Appointment booked', 'See you at 10:00', ['patient@example.com', ''])
+
+        self.assertEqual(queued.to, ['patient@example.com'])
+        self.assertEqual(queued.status, 'pending')
+        # Nothing leaves until the worker runs
+        self.assertEqual(mail.outbox, [])
+
+    def test_deliver_batch_uses_one_connection_and_marks_rows_sent(self):
+        for i in range(3):
+            enqueue_email(f'Report {i}', 'Your report is ready', [f'patient{i}@example.com'])
+
+        with mock.patch.object(outbox, 'get_connection', wraps=outbox.get_connection) as get_connection:
+            self.assertEqual(deliver_batch(), (3, 0, 0))
+
+        get_connection.assert_called_once()
+        self.assertEqual(sorted(m.subject for m in mail.outbox), ['Report 0', 'Report 1', 'Report 2'])
+        for row in OutboundEmail.objects.all():
+            self.assertEqual(row.status, 'sent')
+            self.assertEqual(row.attempts, 1)
+            self.assertIsNotNone(row.sent_at)
+
+    def test_failed_send_retries_with_exponential_backoff(self):
+        enqueue_email('Report', 'Your report is ready', ['patient@example.com'])
+
+        with mock.patch(f'{LOCMEM_BACKEND}.send_messages', side_effect=OSError('connection reset')):
+            for attempt in (1, 2, 3):
+                before = timezone.now()
+                self.assertEqual(deliver_batch(max_attempts=5), (0, 1, 0))
+                row = OutboundEmail.objects.get()
+                self.assertEqual(row.status, 'pending')
+                self.assertEqual(row.attempts, attempt)
+                self.assertEqual(row.last_error, 'connection reset')
+                delay = RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+                self.assertGreaterEqual(row.next_attempt_at, before + timedelta(seconds=delay))
+                self.assertLess(row.next_attempt_at, before + timedelta(seconds=delay + 5))
+                # Not due again until the backoff has passed
+                self.assertEqual(deliver_batch(), (0, 0, 0))
+                self.make_due()
+
+        self.assertEqual(mail.outbox, [])
+
+    def test_row_fails_after_last_attempt(self):
+        enqueue_email('Report', 'Your report is ready', ['patient@example.com'])
+
+        with mock.patch(f'{LOCMEM_BACKEND}.send_messages', side_effect=OSError('mailbox unavailable')):
+            self.assertEqual(deliver_batch(max_attempts=2), (0, 1, 0))
+            self.make_due()
+            self.assertEqual(deliver_batch(max_attempts=2), (0, 0, 1))
+
+        row = OutboundEmail.objects.get()
+        self.assertEqual(row.status, 'failed')
+        self.assertEqual(row.attempts, 2)
+        self.assertEqual(row.last_error, 'mailbox unavailable')
+        # Failed rows are never picked up again
+        self.make_due(status='failed')
+        self.assertEqual(deliver_batch(), (0, 0, 0))
+
+    def test_expired_lease_is_claimed_again(self):
+        queued = enqueue_email('Report', 'Your report is ready', ['patient@example.com'])
+
+        self.assertEqual([row.pk for row in claim_due(10)], [queued.pk])
+        # A second worker skips the leased row...
+        self.assertEqual(claim_due(10), [])
+
+        # ...until the first worker dies and the lease runs out
+        later = timezone.now() + timedelta(seconds=LEASE_SECONDS + 1)
+        with mock.patch.object(outbox.timezone, 'now', return_value=later):
+            self.assertEqual([row.pk for row in claim_due(10)], [queued.pk])
+
+    def test_send_queued_emails_command_drains_queue(self):
+        for i in range(3):
+            enqueue_email(f'Report {i}', 'Your report is ready', [f'patient{i}@example.com'])
+
+        out = StringIO()
+        call_command('send_queued_emails', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+        self.assertIn('sent=2', out.getvalue())
+        self.assertIn('sent=1', out.getvalue())
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.layer = SQLiteChannelLayer(path=f'{tmp.name}/channels.sqlite3', socket_dir=f'{tmp.name}/sockets')
+
+    async def test_reader_survives_failed_fetches(self):
+        fetch = self.layer._fetch_process
+        failures = [sqlite3.OperationalError('database is locked'), sqlite3.OperationalError('disk I/O error')]
+
+        def flaky_fetch(prefix):
+            if failures:
+                raise failures.pop(0)
+            return fetch(prefix)
+
+        try:
+            with mock.patch.object(self.layer, '_fetch_process', side_effect=flaky_fetch):
+                channel = await self.layer.new_channel()
+                await self.layer.send(channel, {'type': 'test.message', 'n': 1})
+                message = await asyncio.wait_for(self.layer.receive(channel), 5)
+            self.assertEqual(message, {'type': 'test.message', 'n': 1})
+            self.assertEqual(failures, [])
+        finally:
+            await self.layer.close()
+
+    async def test_receive_restarts_a_dead_reader(self):
+        try:
+            channel = await self.layer.new_channel()
+            receiver = self.layer._receiver()
+
+            async def crash():
+                raise RuntimeError('reader crashed')
+
+            receiver.task = asyncio.ensure_future(crash())
+            await asyncio.sleep(0)
+            self.assertTrue(receiver.task.done())
+
+            await self.layer.send(channel, {'type': 'test.message'})
+            message = await asyncio.wait_for(self.layer.receive(channel), 5)
+            self.assertEqual(message, {'type': 'test.message'})
+            self.assertFalse(receiver.task.done())
+        finally:
+            await self.layer.close()
+
+
+@override_settings(OTP_MAX_VERIFY_ATTEMPTS=3)
+class VerifyOTPTests(TestCase):
+    url = '/api/auth/verify-otp/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.otp = OTP.objects.create(
+            phone_or_email='patient@example.com', otp_code='123456',
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+
+    def verify(self, code):
+        return self.client.post(self.url, {'phone_or_email': 'patient@example.com', 'otp_code': code}, format='json')
+
+    def test_correct_code_is_consumed_once(self):
+        self.assertEqual(self.verify('123456').status_code, 200)
+        self.assertEqual(self.verify('123456').status_code, 400)
+        self.otp.refresh_from_db()
+        self.assertTrue(self.otp.is_used)
+
+    def test_attempts_are_capped(self):
+        for _ in range(3):
+            self.assertEqual(self.verify('000000').status_code, 400)
+        self.assertEqual(self.verify('123456').status_code, 429)
+        self.otp.refresh_from_db()
+        self.assertEqual(self.otp.verify_attempts, 3)
+        self.assertFalse(self.otp.is_used)
+
+    def stale_lookup(self):
+        """Make the view read the row as it was now, as a request racing later updates would"""
+        stale = OTP.objects.get(pk=self.otp.pk)
+        filter_ = OTP.objects.filter
+
+        def lookup(*args, **kwargs):
+            if 'phone_or_email' in kwargs:
+                return mock.Mock(**{'order_by.return_value.first.return_value': stale})
+            return filter_(*args, **kwargs)
+
+        return mock.patch.object(OTP.objects, 'filter', side_effect=lookup)
+
+    def test_racing_attempt_cannot_pass_the_cap(self):
+        with self.stale_lookup():
+            OTP.objects.filter(pk=self.otp.pk).update(verify_attempts=3)
+            self.assertEqual(self.verify('123456').status_code, 429)
+        self.otp.refresh_from_db()
+        self.assertEqual(self.otp.verify_attempts, 3)
+        self.assertFalse(self.otp.is_used)
+
+    def test_racing_correct_submission_cannot_reuse_the_code(self):
+        with self.stale_lookup():
+            self.assertEqual(self.verify('123456').status_code, 200)
+            self.assertEqual(self.verify('123456').status_code, 400)
+
+    def test_non_ascii_code_is_invalid_not_an_error(self):
+        self.assertEqual(self.verify('１２３４５６').status_code, 400)
+        self.otp.refresh_from_db()
+        self.assertEqual(self.otp.verify_attempts, 1)
+
+
+
+class HospitalBroadcastTests(TestCase):
+
+    def test_patient_with_several_appointments_is_notified_once(self):
+        hospital_user = User.objects.create_user(username='hospital', password='x', user_type='hospital')
+        hospital = Hospital.objects.create(user=hospital_user, hospital_name='City Hospital', address='')
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor', password='x', user_type='doctor'), hospital=hospital
+        )
+        patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+        for day, slot in ((1, '09:00 - 09:10'), (2, '10:00 - 10:10'), (3, '11:00 - 11:10')):
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, hospital=hospital,
+                date=timezone.localdate() + timedelta(days=day), time_slot=slot,
+            )
+
+        client = APIClient()
+        client.force_authenticate(hospital_user)
+        with mock.patch('authentication.views.notify_many', wraps=views.notify_many) as notify_many:
+            response = client.post('/api/auth/hospital/broadcast/', {'message': 'Closed on Saturday', 'audience': 'patients'},
+                                   format='json')
+
+        # Deduplicated by the query itself, not one row per appointment
+        self.assertEqual(list(notify_many.call_args[0][0]), [patient.user_id])
+
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(response.data['recipients'], 1)
+        self.assertEqual(Notification.objects.filter(user=patient.user).count(), 1)
+
+
+@override_settings(TRIAGE_PRESENCE_TTL_SECONDS=90)
+class TriagePresenceTests(TestCase):
+
+    def setUp(self):
+        hospital_user = User.objects.create_user(username='hospital', password='x', user_type='hospital')
+        self.hospital = Hospital.objects.create(user=hospital_user, hospital_name='City Hospital', address='')
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor', password='x', user_type='doctor'), hospital=self.hospital
+        )
+        patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=self.doctor, hospital=self.hospital,
+            date=timezone.localdate(), time_slot='09:00 - 09:10', is_emergency=True,
+        )
+        open_case(appointment, 1)
+
+    def go_stale(self):
+        DoctorPresence.objects.update(last_seen=timezone.now() - timedelta(seconds=91))
+
+    def test_stale_presence_gets_no_emergencies(self):
+        doctor_online(self.doctor.pk, 'specific.crashed!worker')
+        self.go_stale()
+
+        self.assertFalse(available_doctors(self.hospital.pk).exists())
+        with self.assertRaises(NoDoctorAvailable):
+            assign_next(self.hospital.pk)
+
+    def test_heartbeat_keeps_doctor_available(self):
+        doctor_online(self.doctor.pk, 'specific.live!socket')
+        self.go_stale()
+        doctor_heartbeat('specific.live!socket')
+
+        case = assign_next(self.hospital.pk)
+        self.assertEqual(case.assigned_doctor_id, self.doctor.pk)
+
+    def test_stale_rows_are_swept_when_a_doctor_connects(self):
+        doctor_online(self.doctor.pk, 'specific.crashed!worker')
+        self.go_stale()
+        doctor_online(self.doctor.pk, 'specific.new!socket')
+
+        self.assertEqual(list(DoctorPresence.objects.values_list('channel_name', flat=True)), ['specific.new!socket'])
+
+
+class UploadTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        hospital_user = User.objects.create_user(username='hospital', password='x', user_type='hospital')
+        hospital = Hospital.objects.create(user=hospital_user, hospital_name='City Hospital', address='')
+        self.doctor_user = User.objects.create_user(username='doctor', password='x', user_type='doctor')
+        doctor = DoctorProfile.objects.create(user=self.doctor_user, hospital=hospital)
+        patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+        self.appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, hospital=hospital, date=timezone.localdate(), time_slot='09:00 - 09:10',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor_user)
+
+    def start(self, data):
+        response = self.client.post('/api/auth/uploads/', {
+            'filename': 'report.pdf', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest(),
+            'purpose': 'medical_report',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['upload_id']
+
+    def put(self, upload_id, offset, data):
+        return self.client.generic('PUT', f'/api/auth/uploads/{upload_id}/', data,
+                                   content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunks_are_appended_and_finalized(self):
+        data = b'%PDF-1.4 ' + os.urandom(1000)
+        upload_id = self.start(data)
+
+        self.assertEqual(self.put(upload_id, 0, data[:600]).data['received_bytes'], 600)
+        # A retried chunk for an offset already written is refused, not appended twice
+        self.assertEqual(self.put(upload_id, 0, data[:600]).status_code, 409)
+        self.assertEqual(self.put(upload_id, 600, data[600:]).data['received_bytes'], len(data))
+
+        response = self.client.post(f'/api/auth/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 200, response.data)
+        upload = UploadSession.objects.get(id=upload_id)
+        with content_storage.open(upload.file_name) as f:
+            self.assertEqual(f.read(), data)
+        # No staged chunk is left behind
+        self.assertEqual(os.listdir(os.path.dirname(upload.temp_path)), [])
+
+    def test_racing_chunk_for_the_same_offset_is_refused_at_commit(self):
+        data = b'%PDF-1.4 ' + os.urandom(100)
+        upload_id = self.start(data)
+
+        # Both requests pass the unlocked check; this one loses the race to the lock
+        stale = UploadSession.objects.get(id=upload_id)
+        staged_path = stage_chunk(stale, 0, BytesIO(data[:50]), 50)
+        self.assertEqual(self.put(upload_id, 0, data[:50]).status_code, 200)
+
+        with transaction.atomic():
+            upload = UploadSession.objects.select_for_update().get(id=upload_id)
+            with self.assertRaises(UploadError):
+                commit_chunk(upload, 0, staged_path)
+
+        self.assertFalse(os.path.exists(staged_path))
+        self.assertEqual(UploadSession.objects.get(id=upload_id).received_bytes, 50)
+
+    def test_upload_stays_claimable_when_the_report_is_not_saved(self):
+        data = b'%PDF-1.4 ' + os.urandom(100)
+        upload_id = self.start(data)
+        self.put(upload_id, 0, data)
+        self.client.post(f'/api/auth/uploads/{upload_id}/complete/')
+
+        with mock.patch.object(Appointment, 'save', side_effect=RuntimeError('database went away')):
+            response = self.client.post('/api/auth/reports/upload/', {
+                'appointment': self.appointment.pk, 'upload_id': upload_id,
+            }, format='json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(MedicalReport.objects.exists())
+        self.assertEqual(UploadSession.objects.get(id=upload_id).status, 'complete')
+
+
+class StoredBlobTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+
+    def report(self, data):
+        return MedicalReport.objects.create(
+            patient=self.patient, title='Blood test', report_file=ContentFile(data, name='blood.pdf'),
+        )
+
+    def refs(self, name):
+        return StoredBlob.objects.get(name=name).ref_count
+
+    def go_stale(self):
+        StoredBlob.objects.update(last_seen_at=timezone.now() - timedelta(days=2))
+
+    def test_refcount_follows_saves_and_deletes(self):
+        first = self.report(b'same bytes')
+        second = self.report(b'same bytes')
+        name = first.report_file.name
+        self.assertEqual(second.report_file.name, name)
+        self.assertEqual(self.refs(name), 2)
+
+        first.delete()
+        self.assertEqual(self.refs(name), 1)
+
+        second.report_file = ContentFile(b'corrected bytes', name='blood.pdf')
+        second.save()
+        self.assertEqual(self.refs(name), 0)
+        self.assertEqual(self.refs(second.report_file.name), 1)
+
+    def test_collect_removes_only_unreferenced_blobs(self):
+        kept = self.report(b'kept').report_file.name
+        orphan = self.report(b'orphan')
+        orphan_name = orphan.report_file.name
+        orphan.delete()
+        self.go_stale()
+
+        call_command('gc_blobs', stdout=StringIO())
+
+        self.assertTrue(content_storage.exists(kept))
+        self.assertFalse(content_storage.exists(orphan_name))
+        self.assertEqual(list(StoredBlob.objects.values_list('name', flat=True)), [kept])
+
+    def test_blob_reused_after_selection_is_not_collected(self):
+        orphan = self.report(b'scan')
+        name = orphan.report_file.name
+        orphan.delete()
+        self.go_stale()
+        cutoff = timezone.now() - timedelta(hours=24)
+        selected = StoredBlob.objects.get(name=name)
+
+        # The same bytes are uploaded again between gc_blobs' select and its delete
+        reused = self.report(b'scan')
+
+        self.assertFalse(GCBlobsCommand().remove_orphan(selected, cutoff, UploadSession.objects.none()))
+        with content_storage.open(reused.report_file.name) as f:
+            self.assertEqual(f.read(), b'scan')
+        self.assertEqual(self.refs(name), 1)
+
+    def test_concurrent_registration_refreshes_the_winner(self):
+        StoredBlob.objects.create(name='cas/ab/cd/abcd.pdf', size=4, last_seen_at=timezone.now() - timedelta(days=2))
+        filter_ = StoredBlob.objects.filter
+        calls = []
+
+        def filter_late(*args, **kwargs):
+            # The first refresh runs before the other upload's insert is visible
+            calls.append(kwargs)
+            if len(calls) == 1:
+                return mock.Mock(**{'update.return_value': 0})
+            return filter_(*args, **kwargs)
+
+        with mock.patch.object(StoredBlob.objects, 'filter', side_effect=filter_late):
+            storage.register_blob('cas/ab/cd/abcd.pdf', 4)
+
+        blob = StoredBlob.objects.get()
+        self.assertGreater(blob.last_seen_at, timezone.now() - timedelta(minutes=1))
+
+    def test_registration_gives_up_after_repeated_conflicts(self):
+        with mock.patch.object(StoredBlob.objects, 'filter', return_value=mock.Mock(**{'update.return_value': 0})), \
+                mock.patch.object(StoredBlob.objects, 'create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                storage.register_blob('cas/ab/cd/abcd.pdf', 4)
+
+
+class ProfileImageTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root, MEDIA_OFFLOAD='')
+        media.enable()
+        self.addCleanup(media.disable)
+
+        png = BytesIO()
+        Image.new('RGB', (4, 4), 'red').save(png, 'PNG')
+        self.image = png.getvalue()
+        self.patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient'),
+            profile_image=ContentFile(self.image, name='me.png'),
+        )
+        hospital_user = User.objects.create_user(username='hospital', password='x', user_type='hospital')
+        self.hospital = Hospital.objects.create(user=hospital_user, hospital_name='City Hospital', address='')
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor', password='x', user_type='doctor'), hospital=self.hospital
+        )
+        self.url = f'/api/auth/files/patient/{self.patient.pk}/image/'
+        self.client = APIClient()
+
+    def get(self, user, **headers):
+        self.client.force_authenticate(user)
+        return self.client.get(self.url, **headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_private_image_is_limited_to_the_patient_and_their_care_providers(self):
+        other = User.objects.create_user(username='other', password='x', user_type='patient')
+        self.assertEqual(self.get(self.patient.user).status_code, 200)
+        self.assertEqual(self.get(other).status_code, 403)
+        self.assertEqual(self.get(self.doctor.user).status_code, 403)
+        self.assertEqual(self.get(self.hospital.user).status_code, 403)
+
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, hospital=self.hospital,
+            date=timezone.localdate(), time_slot='09:00 - 09:10',
+        )
+        self.assertEqual(self.get(self.doctor.user).status_code, 200)
+        self.assertEqual(self.get(self.hospital.user).status_code, 200)
+
+    def test_range_request_returns_partial_content(self):
+        response = self.get(self.patient.user, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-3/{len(self.image)}')
+        self.assertEqual(self.body(response), self.image[:4])
+
+        response = self.get(self.patient.user, HTTP_RANGE=f'bytes={len(self.image)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.image)}')
+
+    def test_if_range_needs_a_strong_matching_validator(self):
+        etag = self.get(self.patient.user)['ETag']
+
+        response = self.get(self.patient.user, HTTP_RANGE='bytes=4-', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.image[4:])
+
+        for validator in (f'W/{etag}', '"stale-etag"'):
+            response = self.get(self.patient.user, HTTP_RANGE='bytes=4-', HTTP_IF_RANGE=validator)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.body(response), self.image)
+
+
+@override_settings(PUBLIC_BASE_URL='https://medisewa.test', REPORT_LINK_MAX_AGE_SECONDS=3600)
+class SharedReportLinkTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root, MEDIA_OFFLOAD='')
+        media.enable()
+        self.addCleanup(media.disable)
+
+        patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+        self.report = MedicalReport.objects.create(
+            patient=patient, title='Blood Test', report_file=ContentFile(b'%PDF-1.4 report', name='report.pdf'),
+        )
+        self.client = APIClient()
+
+    def link(self):
+        link = views.report_share_link(None, self.report)
+        self.assertTrue(link.startswith('https://medisewa.test/api/auth/reports/shared/'))
+        return link.removeprefix('https://medisewa.test')
+
+    def test_link_downloads_the_report_without_logging_in(self):
+        response = self.client.get(self.link())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 report')
+        self.assertIn('blood-test.pdf', response['Content-Disposition'])
+
+    def test_link_only_names_the_report(self):
+        token = self.link().rstrip('/').rsplit('/', 1)[1]
+        payload = signing.loads(token, salt=views.REPORT_LINK_SALT)
+        self.assertEqual(payload, {'r': self.report.pk})
+
+    def test_expired_link_is_gone(self):
+        link = self.link()
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 3601):
+            response = self.client.get(link)
+        self.assertEqual(response.status_code, 410)
+
+    def test_tampered_link_is_rejected(self):
+        link = self.link()
+        head, token = link.rstrip('/').rsplit('/', 1)
+        value, signature = token.rsplit(':', 1)
+        forged = signing.dumps({'r': self.report.pk}, salt='another-salt', compress=True)
+        for token in (f'{value}:{signature[::-1]}', f'{value}x:{signature}', forged):
+            self.assertEqual(self.client.get(f'{head}/{token}/').status_code, 404, token)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class QueueConsumerTests(TransactionTestCase):
+
+    def setUp(self):
+        hospital_user = User.objects.create_user(username='hospital', password='x', user_type='hospital')
+        self.hospital = Hospital.objects.create(user=hospital_user, hospital_name='City Hospital', address='')
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor', password='x', user_type='doctor'), hospital=self.hospital
+        )
+        self.other_doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='other', password='x', user_type='doctor'), hospital=self.hospital
+        )
+        self.patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+        self.book('10:00 - 10:10')
+        self.book('09:00 - 09:10', doctor=self.other_doctor)
+
+    def book(self, slot, doctor=None, **fields):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=doctor or self.doctor, hospital=self.hospital,
+            date=timezone.localdate(), time_slot=slot, **fields
+        )
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(QueueConsumer.as_asgi(), '/ws/queue/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_hospital_gets_ordered_snapshot_then_positioned_deltas(self):
+        communicator, connected = await self.connect(self.hospital.user)
+        self.assertTrue(connected)
+        try:
+            snapshot = await communicator.receive_json_from()
+            self.assertEqual((snapshot['type'], snapshot['event']), ('queue', 'snapshot'))
+            self.assertEqual([e['time_slot'] for e in snapshot['entries']], ['09:00 - 09:10', '10:00 - 10:10'])
+            self.assertEqual((await communicator.receive_json_from())['type'], 'triage')
+
+            emergency = await database_sync_to_async(self.book)('11:00 - 11:10', is_emergency=True)
+            insert = await communicator.receive_json_from()
+            self.assertEqual((insert['event'], insert['position'], insert['entry']['id']), ('insert', 0, emergency.id))
+
+            emergency.status = 'completed'
+            await database_sync_to_async(emergency.save)()
+            remove = await communicator.receive_json_from()
+            self.assertEqual((remove['event'], remove['position']), ('remove', 0))
+        finally:
+            await communicator.disconnect()
+
+    async def test_doctor_sees_only_their_own_queue(self):
+        communicator, connected = await self.connect(self.doctor.user)
+        self.assertTrue(connected)
+        try:
+            snapshot = await communicator.receive_json_from()
+            self.assertEqual([e['doctor'] for e in snapshot['entries']], [self.doctor.pk])
+            await communicator.receive_json_from()  # triage snapshot
+
+            await database_sync_to_async(self.book)('12:00 - 12:10', doctor=self.other_doctor)
+            self.assertTrue(await communicator.receive_nothing())
+        finally:
+            await communicator.disconnect()
+        # Closing the waiting room takes the doctor off shift
+        self.assertFalse(await database_sync_to_async(DoctorPresence.objects.exists)())
+
+    async def test_patient_is_refused(self):
+        communicator, connected = await self.connect(self.patient.user)
+        self.assertFalse(connected)
+
+
+def candidate(n):
+    # Serialized the way the browser's JSON.stringify({type, candidate}) does
+    return '{"type":"candidate","candidate":{"candidate":"candidate:%d 1 udp 2122260223 10.0.0.1 5000%d typ host"}}' % (n, n)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class SignalingConsumerTests(TransactionTestCase):
+
+    def setUp(self):
+        hospital_user = User.objects.create_user(username='hospital', password='x', user_type='hospital')
+        hospital = Hospital.objects.create(user=hospital_user, hospital_name='City Hospital', address='')
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor', password='x', user_type='doctor'), hospital=hospital
+        )
+        patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+        self.appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, hospital=hospital, date=timezone.localdate(), time_slot='09:00 - 09:10',
+        )
+        self.doctor_user, self.patient_user = doctor.user, patient.user
+        self.sockets = []
+
+    async def join(self, user, query=''):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/signaling/{self.appointment.pk}/{query}'
+        )
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.sockets.append(communicator)
+        return communicator
+
+    async def leave(self):
+        for communicator in self.sockets:
+            await communicator.disconnect()
+
+    async def test_presence_snapshot_join_and_leave(self):
+        try:
+            doctor = await self.join(self.doctor_user)
+            self.assertEqual(await doctor.receive_json_from(), {
+                'type': 'presence', 'event': 'snapshot', 'role': 'doctor', 'peers': [],
+            })
+
+            patient = await self.join(self.patient_user)
+            self.assertEqual(await patient.receive_json_from(), {
+                'type': 'presence', 'event': 'snapshot', 'role': 'patient',
+                'peers': [{'role': 'doctor', 'user_id': self.doctor_user.id}],
+            })
+            self.assertEqual(await doctor.receive_json_from(), {
+                'type': 'presence', 'event': 'join', 'role': 'patient', 'user_id': self.patient_user.id,
+            })
+
+            await patient.disconnect()
+            self.assertEqual(await doctor.receive_json_from(), {
+                'type': 'presence', 'event': 'leave', 'role': 'patient', 'user_id': self.patient_user.id,
+            })
+        finally:
+            await self.leave()
+
+    async def test_offer_sent_before_the_peer_joins_is_delivered_on_join(self):
+        try:
+            doctor = await self.join(self.doctor_user)
+            await doctor.receive_json_from()
+            await doctor.send_to(text_data='{"type":"offer","offer":{"sdp":"v=0"}}')
+
+            patient = await self.join(self.patient_user)
+            self.assertEqual((await patient.receive_json_from())['event'], 'snapshot')
+            self.assertEqual(await patient.receive_json_from(), {'type': 'offer', 'offer': {'sdp': 'v=0'}})
+        finally:
+            await self.leave()
+
+    @override_settings(SIGNALING_ICE_COALESCE_MS=50)
+    async def test_trickled_candidates_are_coalesced(self):
+        try:
+            doctor = await self.join(self.doctor_user)
+            batched = await self.join(self.patient_user, '?batch=1')
+            await doctor.receive_json_from()  # batched patient's join
+            await batched.receive_json_from()  # snapshot
+
+            for n in range(3):
+                await doctor.send_to(text_data=candidate(n))
+            # Not relayed until the coalescing window closes, then as one frame
+            self.assertTrue(await batched.receive_nothing(timeout=0.01))
+            frame = await batched.receive_json_from(timeout=1)
+            self.assertEqual(frame['type'], 'batch')
+            self.assertEqual([f['candidate']['candidate'][:12] for f in frame['frames']],
+                             ['candidate:0 ', 'candidate:1 ', 'candidate:2 '])
+        finally:
+            await self.leave()
+
+    @override_settings(SIGNALING_ICE_COALESCE_MS=5000)
+    async def test_offer_flushes_pending_candidates_first(self):
+        try:
+            doctor = await self.join(self.doctor_user)
+            patient = await self.join(self.patient_user)
+            await doctor.receive_json_from()
+            await patient.receive_json_from()
+
+            await doctor.send_to(text_data=candidate(0))
+            await doctor.send_to(text_data=candidate(1))
+            await doctor.send_to(text_data='{"type":"offer","offer":{"sdp":"v=0"}}')
+
+            # Without ?batch=1 the coalesced candidates still arrive as separate frames, in order
+            self.assertEqual((await patient.receive_json_from())['candidate']['candidate'][:12], 'candidate:0 ')
+            self.assertEqual((await patient.receive_json_from())['candidate']['candidate'][:12], 'candidate:1 ')
+            self.assertEqual((await patient.receive_json_from())['type'], 'offer')
+        finally:
+            await self.leave()
+
+
+class NotificationPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='x', user_type='patient')
+        start = timezone.now() - timedelta(hours=1)
+        Notification.objects.bulk_create([
+            Notification(user=self.user, message=f'Update {i}', is_read=i % 2 == 0) for i in range(25)
+        ])
+        # Distinct, increasing timestamps: auto_now_add gives bulk rows the same one
+        for i, pk in enumerate(Notification.objects.order_by('pk').values_list('pk', flat=True)):
+            Notification.objects.filter(pk=pk).update(created_at=start + timedelta(minutes=i))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        messages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            messages.append([n['message'] for n in response.data['results']])
+            url = response.data['next']
+        return messages
+
+    def test_pages_follow_next_newest_first_without_gaps(self):
+        pages = self.walk('/api/auth/notifications/')
+
+        self.assertEqual([len(page) for page in pages], [20, 5])
+        self.assertEqual(sum(pages, []), [f'Update {i}' for i in range(24, -1, -1)])
+
+    def test_unread_filter_pages_only_unread(self):
+        pages = self.walk('/api/auth/notifications/?unread=true&page_size=5')
+
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertEqual(sum(pages, []), [f'Update {i}' for i in range(23, 0, -2)])
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output is backend specific')
+    def test_unfiltered_list_is_served_by_an_index(self):
+        plan = Notification.objects.filter(user=self.user).order_by('-created_at')[:21].explain()
+
+        self.assertIn('notif_user_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class PruneNotificationsTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='patient', password='x', user_type='patient')
+        Notification.objects.bulk_create([
+            Notification(user=user, message=f'Old {i}', is_read=True) for i in range(5)
+        ] + [Notification(user=user, message='Unread', is_read=False)])
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=400))
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+
+    def archived(self):
+        path, = glob.glob(os.path.join(self.archive_dir, '*.jsonl.gz'))
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line)['message'] for line in f]
+
+    def test_rows_are_on_disk_before_they_are_deleted(self):
+        delete = QuerySet.delete
+        archived_at_delete = []
+
+        def check_archive(queryset):
+            # A crash right here must not lose rows: the archive already decodes in full
+            archived_at_delete.append(len(self.archived()))
+            return delete(queryset)
+
+        with mock.patch.object(QuerySet, 'delete', autospec=True, side_effect=check_archive):
+            call_command('prune_notifications', days=30, batch_size=2, archive_dir=self.archive_dir, stdout=StringIO())
+
+        self.assertEqual(archived_at_delete, [2, 4, 5])
+        self.assertEqual(self.archived(), [f'Old {i}' for i in range(5)])
+        self.assertEqual(list(Notification.objects.values_list('message', flat=True)), ['Unread'])
+
+
+class EmergencyCaseTests(TestCase):
+
+    def setUp(self):
+        self.hospital_user = User.objects.create_user(username='hospital', password='x', user_type='hospital')
+        hospital = Hospital.objects.create(user=self.hospital_user, hospital_name='City Hospital', address='')
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor', password='x', user_type='doctor'), hospital=hospital
+        )
+        patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='patient', password='x', user_type='patient')
+        )
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, hospital=hospital,
+            date=timezone.localdate(), time_slot='09:00 - 09:10', is_emergency=True,
+        )
+        self.case = open_case(appointment)
+        self.client = APIClient()
+        self.client.force_authenticate(self.hospital_user)
+
+    def patch(self, data):
+        return self.client.patch(f'/api/auth/emergency/{self.case.pk}/', data, format='json')
+
+    def test_omitted_severity_defaults_at_creation(self):
+        self.assertEqual(self.case.severity, 3)
+
+    def test_retriage_sets_a_valid_severity(self):
+        response = self.patch({'severity': '1'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.severity, 1)
+
+    def test_invalid_severity_is_rejected_and_changes_nothing(self):
+        for severity in ('urgent', 0, 9, 2.5, True, None):
+            response = self.patch({'severity': severity, 'status': 'closed'})
+            self.assertEqual(response.status_code, 400, severity)
+
+        self.case.refresh_from_db()
+        self.assertEqual((self.case.severity, self.case.status), (3, 'waiting'))
+
+
+class DoctorRatingTests(TestCase):
+
+    def setUp(self):
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor', password='x', user_type='doctor')
+        )
+        self.client = APIClient()
+
+    def review(self, n, rating):
+        patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username=f'patient{n}', password='x', user_type='patient')
+        )
+        self.client.force_authenticate(patient.user)
+        return self.client.post(f'/api/auth/reviews/{self.doctor.pk}/', {'rating': rating, 'comment': 'ok'})
+
+    def test_reviews_update_the_aggregates(self):
+        for n, rating in enumerate((5, 4, 4)):
+            self.assertEqual(self.review(n, rating).status_code, 201)
+
+        self.doctor.refresh_from_db()
+        self.assertEqual((self.doctor.rating_sum, self.doctor.rating_count), (13, 3))
+        self.assertAlmostEqual(self.doctor.rating_avg, 13 / 3)
+        self.assertEqual(self.doctor.rating_histogram, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+
+    def test_invalid_review_leaves_the_aggregates_alone(self):
+        self.assertEqual(self.review(0, 6).status_code, 400)
+        self.doctor.refresh_from_db()
+        self.assertEqual((self.doctor.rating_sum, self.doctor.rating_count), (0, 0))
+
+    def test_removing_the_last_rating_resets_the_average(self):
+        self.doctor.record_rating(4)
+        self.doctor.record_rating(4, delta=-1)
+        self.assertEqual((self.doctor.rating_sum, self.doctor.rating_count, self.doctor.rating_avg), (0, 0, 0.0))
+        self.assertEqual(self.doctor.rating_4_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.review(0, 5)
+        self.review(1, 2)
+        DoctorProfile.objects.filter(pk=self.doctor.pk).update(rating_sum=99, rating_count=1, rating_avg=99.0)
+
+        out = StringIO()
+        call_command('reconcile_doctor_ratings', '--dry-run', stdout=out)
+        self.assertIn('1 doctor rating aggregate(s) would be repaired', out.getvalue())
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.rating_sum, 99)
+
+        call_command('reconcile_doctor_ratings', stdout=StringIO())
+        self.doctor.refresh_from_db()
+        self.assertEqual((self.doctor.rating_sum, self.doctor.rating_count, self.doctor.rating_avg), (7, 2, 3.5))
+        self.assertEqual(self.doctor.rating_histogram, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+
+        out = StringIO()
+        call_command('reconcile_doctor_ratings', stdout=out)
+        self.assertIn('0 doctor rating aggregate(s) repaired', out.getvalue())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationConsumerTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='patient', password='x', user_type='patient')
+        self.other = User.objects.create_user(username='other', password='x', user_type='patient')
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    async def connect(self, token):
+        communicator = WebsocketCommunicator(self.application, f'/ws/notifications/?token={token}')
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_notification_is_pushed_to_its_user_only(self):
+        communicator, connected = await self.connect(AccessToken.for_user(self.user))
+        self.assertTrue(connected)
+        try:
+            await database_sync_to_async(notify)(self.other, 'Not for you')
+            self.assertTrue(await communicator.receive_nothing())
+
+            notification = await database_sync_to_async(notify)(self.user, 'Appointment approved', 'success')
+            message = await communicator.receive_json_from()
+            self.assertEqual(message['type'], 'notification')
+            self.assertEqual(message['notification']['id'], notification.pk)
+            self.assertEqual(message['notification']['message'], 'Appointment approved')
+            self.assertEqual(message['notification']['notification_type'], 'success')
+        finally:
+            await communicator.disconnect()
+
+        await database_sync_to_async(self.user.refresh_from_db)()
+        self.assertEqual(self.user.unread_notification_count, 1)
+
+    async def test_invalid_token_is_refused(self):
+        communicator, connected = await self.connect('not-a-jwt')
+        self.assertFalse(connected)
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root, MEDIA_OFFLOAD='')
+        media.enable()
+        self.addCleanup(media.disable)
+
+        png = BytesIO()
+        Image.new('RGBA', (1000, 600), (255, 0, 0, 0)).save(png, 'PNG')
+        self.hospital = Hospital.objects.create(
+            user=User.objects.create_user(username='hospital', password='x', user_type='hospital'),
+            hospital_name='City Hospital', address='', logo=ContentFile(png.getvalue(), name='logo.png'),
+        )
+        self.client = APIClient()
+
+    def get(self, variant):
+        return self.client.get(f'/api/auth/files/hospital/{self.hospital.pk}/image/{variant}')
+
+    def open(self, response):
+        return Image.open(BytesIO(b''.join(response.streaming_content)))
+
+    def test_variant_is_rendered_once_then_served_from_storage(self):
+        with mock.patch.object(images, '_render', wraps=images._render) as render:
+            first = self.get('thumb.webp')
+            second = self.get('thumb.webp')
+
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(render.call_count, 1)
+        image = self.open(second)
+        self.assertEqual((image.format, image.size), ('WEBP', (128, 77)))
+
+    def test_jpeg_variant_flattens_transparency(self):
+        image = self.open(self.get('medium.jpeg'))
+        self.assertEqual((image.format, image.mode, image.size), ('JPEG', 'RGB', (512, 307)))
+        self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+    def test_unknown_variant_is_not_found(self):
+        self.assertEqual(self.get('huge.webp').status_code, 404)
+        self.assertEqual(self.get('thumb.gif').status_code, 404)
+
+    def test_unreadable_original_is_unprocessable(self):
+        Hospital.objects.filter(pk=self.hospital.pk).update(
+            logo=content_storage.save('logo.png', ContentFile(b'not an image'))
+        )
+        self.assertEqual(self.get('thumb.webp').status_code, 422)
+
+    def test_generate_and_delete_all_variants(self):
+        logo = self.hospital.logo
+        images.generate_variants(logo)
+        names = [images.variant_name(logo.name, v, ext) for v in images.VARIANT_SIZES for ext in images.VARIANT_FORMATS]
+        self.assertTrue(all(logo.storage.exists(name) for name in names))
+
+        urls = images.variant_urls('hospital', self.hospital, 'logo')
+        self.assertEqual(urls['thumb']['webp'], f'/api/auth/files/hospital/{self.hospital.pk}/image/thumb.webp')
+
+        images.delete_variants(logo.storage, logo.name)
+        self.assertFalse(any(logo.storage.exists(name) for name in names))
+
+
+class CheckinQRTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root, MEDIA_OFFLOAD='')
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.patients = [
+            PatientProfile.objects.create(
+                user=User.objects.create_user(username=f'patient{n}', password='x', user_type='patient'),
+                patient_unique_id=f'PAT-{n}',
+            )
+            for n in range(3)
+        ]
+        self.hospital = Hospital.objects.create(
+            user=User.objects.create_user(username='hospital', password='x', user_type='hospital'),
+            hospital_name='City Hospital', address='Kathmandu', hospital_unique_id='HOS-1',
+        )
+        self.client = APIClient()
+
+    def test_bulk_generation_writes_only_stale_codes(self):
+        self.assertEqual(qr.generate_qr_codes('patient', workers=1, batch_size=2), 3)
+        self.assertEqual(qr.generate_qr_codes('patient', workers=1), 0)
+
+        patient = PatientProfile.objects.get(pk=self.patients[0].pk)
+        self.assertEqual(patient.checkin_qr_payload, 'MEDISEWA:P:PAT-0')
+        with patient.checkin_qr.open('rb') as f:
+            self.assertEqual(Image.open(f).format, 'PNG')
+        first_code = patient.checkin_qr.name
+        self.assertEqual(StoredBlob.objects.get(name=first_code).ref_count, 1)
+
+        PatientProfile.objects.filter(pk=patient.pk).update(patient_unique_id='PAT-0B')
+        self.assertEqual(qr.generate_qr_codes('patient', workers=1), 1)
+        patient.refresh_from_db()
+        self.assertEqual(patient.checkin_qr_payload, 'MEDISEWA:P:PAT-0B')
+        self.assertEqual(StoredBlob.objects.get(name=first_code).ref_count, 0)
+        self.assertEqual(StoredBlob.objects.get(name=patient.checkin_qr.name).ref_count, 1)
+
+    def test_payload_round_trips(self):
+        self.assertEqual(qr.parse_qr_payload(qr.qr_payload('hospital', 'HOS-1')), ('hospital', 'HOS-1'))
+        self.assertEqual(qr.parse_qr_payload(' PAT-2 '), ('patient', 'PAT-2'))
+
+    def scan(self, user, code):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/auth/qr/scan/', {'code': code})
+
+    def test_scan_resolves_hospitals_and_patients(self):
+        response = self.scan(self.patients[0].user, 'MEDISEWA:H:HOS-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['kind'], response.data['id']), ('hospital', self.hospital.pk))
+
+        response = self.scan(self.hospital.user, 'MEDISEWA:P:PAT-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['kind'], response.data['id']), ('patient', self.patients[1].pk))
+
+    def test_scan_rejects_other_patients_and_unknown_codes(self):
+        self.assertEqual(self.scan(self.patients[0].user, 'MEDISEWA:P:PAT-1').status_code, 403)
+        self.assertEqual(self.scan(self.patients[0].user, 'PAT-0').status_code, 200)
+        self.assertEqual(self.scan(self.hospital.user, 'MEDISEWA:P:NOPE').status_code, 404)
+        self.assertEqual(self.scan(self.hospital.user, '').status_code, 400)
@@ -0,0 +1,207 @@
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .queues import doctor_queue_group, hospital_queue_group
+
+DEFAULT_SEVERITY = 3
+
+
+class NoWaitingCase(Exception):
+    pass
+
+
+class NoDoctorAvailable(Exception):
+    pass
+
+
+def _model(name):
+    return apps.get_model('authentication', name)
+
+
+def _cases():
+    return _model('EmergencyCase').objects.select_related('appointment__patient__user', 'assigned_doctor__user')
+
+
+def parse_severity(value):
+    """A triage level from request data; raises ValueError unless it is a whole number 1..5"""
+    if isinstance(value, bool):
+        raise ValueError('severity must be a whole number from 1 (most severe) to 5')
+    try:
+        severity = int(str(value).strip())
+    except (TypeError, ValueError):
+        raise ValueError('severity must be a whole number from 1 (most severe) to 5')
+    if not 1 <= severity <= 5:
+        raise ValueError('severity must be a whole number from 1 (most severe) to 5')
+    return severity
+
+
+def triage_entry(case):
+    """A case as the emergency desk and the assigned doctor see it"""
+    appointment = case.appointment
+    return {
+        'id': case.id,
+        'appointment': appointment.id,
+        'patient_name': appointment.patient.user.get_full_name(),
+        'symptoms': appointment.symptoms,
+        'severity': case.severity,
+        'status': case.status,
+        'arrived_at': case.arrived_at.isoformat(),
+        'assigned_doctor': case.assigned_doctor_id,
+        'assigned_doctor_name': case.assigned_doctor.user.get_full_name() if case.assigned_doctor else None,
+        'assigned_at': case.assigned_at.isoformat() if case.assigned_at else None,
+    }
+
+
+def triage_key(entry):
+    """Lower level is more severe; ties go to whoever arrived first"""
+    return (entry['severity'], entry['arrived_at'], entry['id'])
+
+
+def waiting_cases(hospital_id):
+    """The hospital's priority queue, in the order of triage_waiting_idx"""
+    return _cases().filter(hospital_id=hospital_id, status='waiting').order_by('severity', 'arrived_at', 'pk')
+
+
+def assigned_cases(doctor_id):
+    return _cases().filter(assigned_doctor_id=doctor_id, status='assigned').order_by('severity', 'arrived_at', 'pk')
+
+
+def open_case(appointment, severity=None):
+    return _model('EmergencyCase').objects.create(
+        appointment=appointment,
+        hospital_id=appointment.hospital_id,
+        # Omitted at booking: a middling level until the hospital re-triages
+        severity=DEFAULT_SEVERITY if severity in (None, '') else parse_severity(severity),
+    )
+
+
+def available_doctors(hospital_id):
+    """
+    Doctors of the hospital with an open waiting-room socket and no case in
+    hand, the one who has gone longest without an emergency first.
+    """
+    DoctorProfile = _model('DoctorProfile')
+    EmergencyCase = _model('EmergencyCase')
+    staff = DoctorProfile.objects.filter(
+        Q(hospital_id=hospital_id) |
+        Q(pk__in=_model('DoctorHospitalConnection').objects.filter(
+            hospital_id=hospital_id, status='active'
+        ).values('doctor_id'))
+    )
+    last_assigned = EmergencyCase.objects.filter(
+        assigned_doctor=OuterRef('pk')
+    ).order_by('-assigned_at').values('assigned_at')[:1]
+    return staff.filter(
+        Exists(live_presence().filter(doctor=OuterRef('pk')))
+    ).exclude(
+        Exists(EmergencyCase.objects.filter(assigned_doctor=OuterRef('pk'), status='assigned'))
+    ).annotate(
+        last_assigned_at=Subquery(last_assigned)
+    ).order_by(F('last_assigned_at').asc(nulls_first=True), 'pk')
+
+
+def assign_next(hospital_id, doctor_id=None):
+    """
+    Take the most urgent waiting case and hand it to doctor_id, or to the
+    next available connected doctor. Locked rows are skipped so two desks
+    pressing "next" at once get different cases and different doctors.
+    """
+    with transaction.atomic():
+        case = waiting_cases(hospital_id).select_for_update(skip_locked=True, of=('self',)).first()
+        if case is None:
+            raise NoWaitingCase()
+        doctors = available_doctors(hospital_id)
+        if doctor_id is not None:
+            doctors = doctors.filter(pk=doctor_id)
+        doctor = doctors.select_for_update(skip_locked=True, of=('self',)).first()
+        if doctor is None:
+            raise NoDoctorAvailable()
+        case.status = 'assigned'
+        case.assigned_doctor = doctor
+        case.assigned_at = timezone.now()
+        case.save(update_fields=['status', 'assigned_doctor', 'assigned_at'])
+    return case
+
+
+def close_case(case):
+    case.status = 'closed'
+    case.closed_at = timezone.now()
+    case.save(update_fields=['status', 'closed_at'])
+
+
+def presence_cutoff():
+    return timezone.now() - timedelta(seconds=settings.TRIAGE_PRESENCE_TTL_SECONDS)
+
+
+def live_presence():
+    """Presence rows whose socket has sent a heartbeat recently"""
+    return _model('DoctorPresence').objects.filter(last_seen__gte=presence_cutoff())
+
+
+def doctor_online(doctor_id, channel_name):
+    DoctorPresence = _model('DoctorPresence')
+    # Sweep rows a crashed worker never removed
+    DoctorPresence.objects.filter(last_seen__lt=presence_cutoff()).delete()
+    DoctorPresence.objects.create(doctor_id=doctor_id, channel_name=channel_name)
+
+
+def doctor_heartbeat(channel_name):
+    _model('DoctorPresence').objects.filter(channel_name=channel_name).update(last_seen=timezone.now())
+
+
+def doctor_offline(channel_name):
+    _model('DoctorPresence').objects.filter(channel_name=channel_name).delete()
+
+
+def push_triage_change(case_id, doctor_ids):
+    """After commit, send the case's current state to its hospital desk and to doctor_ids"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    def send():
+        case = _cases().filter(pk=case_id).first()
+        if case is None:
+            return
+        event = {'type': 'triage.change', 'entry': triage_entry(case)}
+        try:
+            group_send = async_to_sync(channel_layer.group_send)
+            group_send(hospital_queue_group(case.hospital_id), event)
+            for doctor_id in doctor_ids:
+                group_send(doctor_queue_group(doctor_id), event)
+        except Exception as e:
+            print(f"Triage push error: {e}")
+
+    transaction.on_commit(send)
+
+
+def connect_triage_signals():
+    """Push every case change; close the case when its appointment is finished"""
+    from django.db.models.signals import post_init, post_save
+
+    EmergencyCase = _model('EmergencyCase')
+
+    def remember(sender, instance, **kwargs):
+        instance._pushed_doctor_id = instance.__dict__.get('assigned_doctor_id')
+
+    def changed(sender, instance, **kwargs):
+        # The previous doctor hears about a reassignment too
+        doctor_ids = {instance.assigned_doctor_id, instance._pushed_doctor_id} - {None}
+        push_triage_change(instance.pk, doctor_ids)
+        instance._pushed_doctor_id = instance.assigned_doctor_id
+
+    def appointment_finished(sender, instance, **kwargs):
+        if instance.is_emergency and instance.status in ('completed', 'cancelled', 'rejected'):
+            for case in EmergencyCase.objects.filter(appointment=instance).exclude(status='closed'):
+                close_case(case)
+
+    post_init.connect(remember, sender=EmergencyCase, weak=False, dispatch_uid='triage_push')
+    post_save.connect(changed, sender=EmergencyCase, weak=False, dispatch_uid='triage_push')
+    post_save.connect(appointment_finished, sender=_model('Appointment'), weak=False, dispatch_uid='triage_close')
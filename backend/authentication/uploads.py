@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from PIL import Image
+
+from .models import UploadSession
+from .storage import content_storage
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+def start_upload(upload):
+    os.makedirs(os.path.dirname(upload.temp_path), exist_ok=True)
+    # Pre-create the part file so chunks can always be written with r+b
+    open(upload.temp_path, 'wb').close()
+
+
+def stage_chunk(upload, offset, stream, length, expected_sha256=None):
+    """
+    Copy length bytes from the request stream into a file of their own next to
+    the part file, CHUNK_SIZE at a time. Runs with no transaction or row lock
+    held, however slowly the client sends. Returns the staged path; if the body
+    is short or the optional per-chunk checksum doesn't match, nothing is kept.
+    """
+    # Unlocked read: only a fast rejection, commit_chunk re-checks under the lock
+    if offset != upload.received_bytes:
+        raise UploadError(f'Expected offset {upload.received_bytes}')
+    if offset + length > upload.total_size:
+        raise UploadError('Chunk exceeds declared file size')
+
+    staged_path = f'{upload.temp_path}.{uuid.uuid4().hex}'
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(staged_path, 'wb') as f:
+            while written < length:
+                data = stream.read(min(CHUNK_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                digest.update(data)
+                written += len(data)
+
+        if written != length:
+            raise UploadError('Incomplete chunk body')
+        if expected_sha256 and digest.hexdigest() != expected_sha256.lower():
+            raise UploadError('Chunk checksum mismatch')
+    except BaseException:
+        os.remove(staged_path)
+        raise
+    return staged_path
+
+
+def commit_chunk(upload, offset, staged_path):
+    """
+    Append a staged chunk to the part file at offset and advance
+    received_bytes. Call with the upload row locked; this is a local file
+    copy, so the lock is held only briefly. The staged file is always removed.
+    """
+    try:
+        if offset != upload.received_bytes:
+            # Another request for the same offset committed first
+            raise UploadError(f'Expected offset {upload.received_bytes}')
+        with open(staged_path, 'rb') as src, open(upload.temp_path, 'r+b') as dst:
+            dst.seek(offset)
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            end = dst.tell()
+            dst.truncate(end)
+        upload.received_bytes = end
+        upload.save(update_fields=['received_bytes', 'updated_at'])
+    finally:
+        os.remove(staged_path)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize_upload(upload):
+    """
+    Verify size and SHA-256, then move the part file into content-addressed
+    storage under that hash (a rename, not a copy; dropped if already stored).
+    """
+    if upload.received_bytes != upload.total_size:
+        raise UploadError(f'Upload incomplete: {upload.received_bytes}/{upload.total_size} bytes')
+
+    if _file_sha256(upload.temp_path) != upload.checksum.lower():
+        # Start over rather than keep bytes we know are wrong
+        open(upload.temp_path, 'wb').close()
+        upload.received_bytes = 0
+        upload.save(update_fields=['received_bytes', 'updated_at'])
+        raise UploadError('Checksum mismatch, upload restarted')
+
+    if upload.purpose == 'payment_screenshot':
+        try:
+            with Image.open(upload.temp_path) as img:
+                img.verify()
+        except Exception:
+            raise UploadError('Payment screenshot is not a valid image')
+
+    ext = os.path.splitext(upload.filename)[1]
+    upload.file_name = content_storage.adopt(upload.temp_path, upload.checksum.lower(), ext, upload.total_size)
+    upload.status = 'complete'
+    upload.save(update_fields=['file_name', 'status', 'updated_at'])
+
+
+def claim_upload(user, upload_id, purpose):
+    """
+    Mark a finalized upload as attached and return its storage name, which
+    can be assigned straight to a FileField. Returns None if not claimable.
+    """
+    try:
+        with transaction.atomic():
+            upload = UploadSession.objects.select_for_update().get(
+                id=upload_id, user=user, purpose=purpose, status='complete'
+            )
+            upload.status = 'consumed'
+            upload.save(update_fields=['status', 'updated_at'])
+    except (UploadSession.DoesNotExist, ValidationError):
+        return None
+    return upload.file_name
@@ -16,6 +16,7 @@ urlpatterns = [
     path('payment-methods/', views.payment_methods, name='payment_methods'),
     path('payment-methods/<int:method_id>/', views.payment_methods, name='delete_payment_method'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/unread-count/', views.unread_notification_count, name='unread_notification_count'),
     path('send-otp/', views.SendOTPView.as_view(), name='send-otp'),
     path('verify-otp/', views.VerifyOTPView.as_view(), name='verify-otp'),
     path('change-password/', views.ChangePasswordView.as_view(), name='change-password'),
@@ -28,6 +29,9 @@ urlpatterns = [
     path('hospital/appointments/', views.hospital_appointments, name='hospital_appointments'),
     path('doctor/appointments/', views.doctor_appointments, name='doctor_appointments'),
     path('appointments/<int:appointment_id>/manage/', views.manage_appointment, name='manage_appointment'),
+    path('emergency/queue/', views.emergency_queue, name='emergency_queue'),
+    path('emergency/next/', views.emergency_next, name='emergency_next'),
+    path('emergency/<int:case_id>/', views.emergency_case_detail, name='emergency_case_detail'),
     
     # Department Management
     path('departments/', views.manage_departments, name='manage_departments'),
@@ -38,8 +42,21 @@ urlpatterns = [
     path('hospital/reports/', views.get_hospital_reports, name='hospital_reports'),
     path('hospital/reports/upload/', views.upload_hospital_report, name='upload_hospital_report'),
     path('hospital/patients/', views.get_all_patients, name='get_all_patients'),
+    path('hospital/broadcast/', views.hospital_broadcast, name='hospital_broadcast'),
+    path('qr/scan/', views.scan_qr_code, name='scan_qr_code'),
     path('patient/<str:patient_id>/reports/', views.get_patient_reports, name='get_patient_reports'),
     path('patients/<str:patient_id>/', views.get_patient_detail, name='get_patient_detail'),
+    path('reports/<int:report_id>/download/', views.download_medical_report, name='download_medical_report'),
+    path('reports/shared/<str:token>/', views.shared_medical_report, name='shared_medical_report'),
+
+    # Resumable uploads
+    path('uploads/', views.upload_init, name='upload_init'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_complete, name='upload_complete'),
+
+    # Media
+    path('files/<str:kind>/<str:object_id>/image/', views.serve_profile_image, name='serve_profile_image'),
+    path('files/<str:kind>/<str:object_id>/image/<slug:variant>.<slug:ext>', views.serve_profile_image, name='serve_profile_image_variant'),
 
     # Emergency Search
     path('recommend-doctors/', views.recommend_doctors, name='recommend_doctors'),
@@ -1,11 +1,11 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes, parser_classes
-from django.db.models import Q, Avg
+from rest_framework.decorators import api_view, permission_classes, parser_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
+from django.db.models import Q, F
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
-from django.core.mail import send_mail, EmailMessage
 from django.conf import settings
 from django.contrib.auth import update_session_auth_hash
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
@@ -14,20 +14,37 @@ from .serializers import (
     HospitalSerializer, DoctorProfileSerializer, PatientProfileSerializer,
     DoctorScheduleSerializer, ChangePasswordSerializer, DepartmentSerializer,
     MedicalReportSerializer, NotificationSerializer, PaymentMethodSerializer,
-    AppointmentSerializer
+    AppointmentSerializer, ReviewSerializer
 )
-from django.db import models
+from django.db import models, transaction
 from .models import (
     Hospital, DoctorProfile, PatientProfile, PaymentMethod, Notification, OTP, 
     DoctorHospitalConnection, DoctorSchedule, Appointment, Department,
-    MedicalReport, Review
+    MedicalReport, Review, UploadSession, EmergencyCase
 )
-from datetime import datetime
+from .notifications import notify, notify_many, mark_all_read
+from .outbox import enqueue_email
+from .pagination import NotificationCursorPagination
+from .media import PassthroughRenderer, serve_field_file
+from .qr import parse_qr_payload
+from .triage import (
+    NoDoctorAvailable, NoWaitingCase, assign_next, assigned_cases, available_doctors, close_case, open_case,
+    parse_severity, triage_entry, waiting_cases,
+)
+from .images import PROFILE_IMAGE_FIELDS, VARIANT_FORMATS, VARIANT_SIZES, ensure_variant, variant_urls
+from .uploads import UploadError, start_upload, stage_chunk, commit_chunk, finalize_upload, claim_upload
+from datetime import datetime, timedelta
 from django.utils import timezone
+import secrets
 import traceback
-from PIL import Image
+from PIL import Image, ImageChops, ImageFilter, ImageOps
 import io
+from django.core import signing
+from django.urls import reverse
 from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+import os
+from django.utils.text import slugify
 def clean_invisible(s: str) -> str:
     if s is None:
         return ""
@@ -39,30 +56,59 @@ def clean_invisible(s: str) -> str:
         .replace("\ufeff", "")  # BOM
     )
 
+# Signature clean-up: longest side after downscaling, padding kept around the
+# ink when cropping, and how much darker than its surroundings a pixel must be
+# to count as ink
+SIGNATURE_MAX_SIDE = 1000
+SIGNATURE_CROP_PADDING = 8
+SIGNATURE_INK_OFFSET = 12
+
 def process_signature(image_file):
     """
-    Cleans a signature image by removing white background and keeping black ink.
-    Provides a fallback if complex OCR is not available.
+    Cleans a signature image by removing the paper background and keeping the ink.
+
+    Works on whole bands with Pillow instead of per pixel: the photo is
+    downscaled first, each pixel is compared against a blurred copy of itself
+    (local background) so shadows and uneven lighting don't turn into ink,
+    and the result is cropped to the ink's bounding box.
     """
     try:
-        img = Image.open(image_file).convert("RGBA")
-        datas = img.getdata()
-        
-        newData = []
-        for item in datas:
-            # If the pixel is very white (e.g., sum of R+G+B > 600 or all > 200), make it transparent
-            # This 'extracts' the black pen signature from the white paper
-            if item[0] > 200 and item[1] > 200 and item[2] > 200:
-                newData.append((255, 255, 255, 0))
-            else:
-                # Keep original color but ensure it's solid
-                newData.append((item[0], item[1], item[2], 255))
-        
-        img.putdata(newData)
-        
+        img = Image.open(image_file)
+        # Let the JPEG decoder skip detail we'd throw away when downscaling
+        img.draft('RGB', (SIGNATURE_MAX_SIDE * 2, SIGNATURE_MAX_SIDE * 2))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Flatten existing transparency onto white so it reads as paper
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            img = img.convert('RGB')
+        img.thumbnail((SIGNATURE_MAX_SIDE, SIGNATURE_MAX_SIDE), Image.Resampling.LANCZOS)
+
+        gray = img.convert('L')
+        # A blur wide enough to wash out pen strokes estimates the local paper tone
+        radius = max(8, min(gray.size) // 8)
+        background = gray.filter(ImageFilter.BoxBlur(radius))
+        darkness = ImageChops.subtract(background, gray)
+        ink = darkness.point(lambda v: 255 if v > SIGNATURE_INK_OFFSET else 0)
+        # Pixels that are near-black are ink even inside large filled areas
+        ink = ImageChops.lighter(ink, gray.point(lambda v: 255 if v < 80 else 0))
+
+        bbox = ink.getbbox()
+        if bbox:
+            left, top, right, bottom = bbox
+            pad = SIGNATURE_CROP_PADDING
+            bbox = (max(left - pad, 0), max(top - pad, 0),
+                    min(right + pad, img.width), min(bottom + pad, img.height))
+            img = img.crop(bbox)
+            ink = ink.crop(bbox)
+
+        img.putalpha(ink)
+
         # Save back to a buffer
         buffer = io.BytesIO()
-        img.save(buffer, format="PNG")
+        img.save(buffer, format="PNG", optimize=True)
         return ContentFile(buffer.getvalue(), name="processed_signature.png")
     except Exception as e:
         print(f"Error processing signature: {e}")
@@ -139,10 +185,9 @@ def dashboard_stats(request):
                     'status': next_appt.status.upper()
                 }
 
-            # 4. Review Stats
-            reviews = Review.objects.filter(doctor=doctor_profile)
-            total_reviews = reviews.count()
-            avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0.0
+            # 4. Review Stats (denormalized on the profile)
+            total_reviews = doctor_profile.rating_count
+            avg_rating = doctor_profile.rating_avg
 
             # 5. Hospital breakdown
             hospital_breakdown = []
@@ -165,6 +210,7 @@ def dashboard_stats(request):
                 'all_time_appointments': all_time_appointments,
                 'avg_rating': round(avg_rating, 1),
                 'total_reviews': total_reviews,
+                'rating_histogram': doctor_profile.rating_histogram,
                 'hospital_breakdown': hospital_breakdown
             })
 
@@ -202,6 +248,10 @@ def dashboard_stats(request):
                 date=today,
                 is_emergency=True
             ).count() 
+            emergency_waiting = EmergencyCase.objects.filter(
+                hospital=hospital_profile,
+                status='waiting'
+            ).count()
 
             return Response({
                 'appointments_today': appointments_today,
@@ -209,7 +259,8 @@ def dashboard_stats(request):
                 'total_patients': total_patients,
                 'active_doctors': active_doctors,
                 'revenue': float(revenue),
-                'emergency_cases': emergency_today
+                'emergency_cases': emergency_today,
+                'emergency_waiting': emergency_waiting
             })
 
         return Response({
@@ -276,17 +327,15 @@ def register(request):
 
             print("Registration successful, returning response")
             
-            # Send Welcome Email
+            # Queue Welcome Email
             try:
-                send_mail(
+                enqueue_email(
                     'Welcome to MediSEWA!',
                     f'Hi {user.username}, thanks for joining us!',
-                    settings.EMAIL_HOST_USER,
-                    [user.email],
-                    fail_silently=True
+                    [user.email]
                 )
             except Exception as e:
-                print(f"Failed to send welcome email: {e}")
+                print(f"Failed to queue welcome email: {e}")
 
             return Response({
                 'user': user_data,
@@ -359,17 +408,15 @@ def login(request):
         
         print("Login successful, returning response")
         
-        # Send Login Notification
+        # Queue Login Notification
         try:
-            send_mail(
+            enqueue_email(
                 'New Login Detected',
                 f'Hi {user.username}, a new login was detected on your account.',
-                settings.EMAIL_HOST_USER,
-                [user.email],
-                fail_silently=True
+                [user.email]
             )
         except Exception as e:
-            print(f"Failed to send login notification: {e}")
+            print(f"Failed to queue login notification: {e}")
 
         return Response({
             'user': user_data,
@@ -399,6 +446,9 @@ def get_hospitals(request):
 def get_doctors(request):
     try:
         doctors = DoctorProfile.objects.all()
+        if request.query_params.get('sort') == 'rating':
+            # Served by doctor_rating_idx
+            doctors = doctors.order_by('-rating_avg', '-rating_count')
         serializer = DoctorProfileSerializer(doctors, many=True)
         return Response(serializer.data)
     except Exception as e:
@@ -748,22 +798,83 @@ def payment_methods(request, method_id=None):
 @permission_classes([IsAuthenticated])
 def notifications(request):
     if request.method == 'GET':
-        notifs = Notification.objects.filter(user=request.user).order_by('-created_at')
-        serializer = NotificationSerializer(notifs, many=True)
-        return Response(serializer.data)
+        notifs = Notification.objects.filter(user=request.user)
+        if request.query_params.get('unread') == 'true':
+            notifs = notifs.filter(is_read=False)
+        paginator = NotificationCursorPagination()
+        page = paginator.paginate_queryset(notifs, request)
+        serializer = NotificationSerializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['unread_count'] = request.user.unread_notification_count
+        return response
     
     elif request.method == 'POST':
         # Used to mark as read or create internal notification
         if 'mark_read' in request.data:
-            Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
-            return Response({'status': 'marked read'})
+            mark_all_read(request.user)
+            return Response({'status': 'marked read', 'unread_count': 0})
             
         serializer = NotificationSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            notification = notify(
+                user=request.user,
+                message=serializer.validated_data['message'],
+                notification_type=serializer.validated_data.get('notification_type', 'info')
+            )
+            return Response(NotificationSerializer(notification).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def hospital_broadcast(request):
+    """Hospital sends one message to all of its patients and/or connected doctors"""
+    if request.user.user_type != 'hospital':
+        return Response({'error': 'Only hospitals can send broadcasts'}, status=status.HTTP_403_FORBIDDEN)
+
+    hospital = request.user.hospital_profile
+    message = (request.data.get('message') or '').strip()
+    audience = request.data.get('audience', 'all')  # 'patients', 'doctors' or 'all'
+    notification_type = request.data.get('notification_type', 'info')
+    send_email = request.data.get('send_email') in (True, 'true')
+
+    if not message:
+        return Response({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if audience not in ('patients', 'doctors', 'all'):
+        return Response({'error': 'Audience must be patients, doctors or all'}, status=status.HTTP_400_BAD_REQUEST)
+    if notification_type not in dict(Notification.NOTIFICATION_TYPES):
+        return Response({'error': 'Invalid notification type'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # One query per audience, user IDs only. order_by() drops Meta.ordering, whose
+    # columns would otherwise join the SELECT DISTINCT and repeat patients
+    recipient_ids = []
+    if audience in ('patients', 'all'):
+        recipient_ids += Appointment.objects.filter(hospital=hospital).order_by().values_list(
+            'patient__user_id', flat=True
+        ).distinct()
+    if audience in ('doctors', 'all'):
+        recipient_ids += DoctorHospitalConnection.objects.filter(hospital=hospital, status='active').order_by().values_list(
+            'doctor__user_id', flat=True
+        ).distinct()
+
+    created = notify_many(
+        recipient_ids,
+        message,
+        notification_type=notification_type,
+        email_subject=f"Message from {hospital.hospital_name}" if send_email else None
+    )
+
+    return Response({
+        'audience': audience,
+        'recipients': len(created),
+        'email_queued': send_email
+    }, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_notification_count(request):
+    """Badge endpoint, reads the counter off the already-authenticated user row"""
+    return Response({'unread_count': request.user.unread_notification_count})
+
 # ... keep all your existing imports and code above unchanged ...
 
 
@@ -777,20 +888,41 @@ class SendOTPView(APIView):
 
         phone_or_email = clean_invisible(phone_or_email)
 
+        # Per-recipient rate limits, all served by otp_recipient_created_idx
+        now = timezone.now()
+        window_start = now - timedelta(seconds=settings.OTP_SEND_WINDOW_SECONDS)
+        OTP.objects.filter(phone_or_email=phone_or_email, created_at__lt=window_start).delete()
+        recent_sends = list(
+            OTP.objects.filter(phone_or_email=phone_or_email)
+            .order_by('-created_at')
+            .values_list('created_at', flat=True)[:settings.OTP_MAX_SENDS_PER_WINDOW]
+        )
+        retry_after = 0
+        if recent_sends:
+            since_last = (now - recent_sends[0]).total_seconds()
+            if since_last < settings.OTP_RESEND_COOLDOWN_SECONDS:
+                retry_after = settings.OTP_RESEND_COOLDOWN_SECONDS - since_last
+        if len(recent_sends) >= settings.OTP_MAX_SENDS_PER_WINDOW:
+            retry_after = max(retry_after, (recent_sends[-1] - window_start).total_seconds())
+        if retry_after > 0:
+            return Response(
+                {"error": "Too many OTP requests. Please try again later.", "retry_after": int(retry_after) + 1},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(int(retry_after) + 1)}
+            )
+
         otp_code = OTP.generate_otp()
-        OTP.objects.create(phone_or_email=phone_or_email, otp_code=otp_code)
+        OTP.objects.create(
+            phone_or_email=phone_or_email,
+            otp_code=otp_code,
+            expires_at=now + timedelta(seconds=settings.OTP_TTL_SECONDS)
+        )
 
         subject = clean_invisible('Verify your email for MediSEWA')
         message = clean_invisible(f"Your verification code is: {otp_code}")
 
         try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [phone_or_email],
-                fail_silently=False
-            )
+            enqueue_email(subject, message, [phone_or_email])
             return Response({"message": "OTP sent successfully"}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -989,26 +1121,46 @@ def patient_appointments(request):
                     'error': 'This time slot is already booked'
                 }, status=400)
 
-        # Create appointment
-        appointment = Appointment.objects.create(
-            patient=patient_profile,
-            doctor=doctor,
-            hospital=hospital,
-            date=date,
-            time_slot=time_slot,
-            consultation_type=consultation_type,
-            symptoms=request.data.get('symptoms', ''),
-            payment_screenshot=request.FILES.get('payment_screenshot'),
-            booking_reference=request.data.get('booking_reference'),
-            is_emergency=is_emergency
-        )
+        # Checked before anything is written; omitted means the default level
+        triage_severity = request.data.get('triage_severity')
+        if is_emergency and triage_severity not in (None, ''):
+            try:
+                triage_severity = parse_severity(triage_severity)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+
+        # The upload is only marked attached if the appointment is created with it
+        with transaction.atomic():
+            # Payment screenshot comes either inline or from a finalized resumable upload
+            payment_screenshot = request.FILES.get('payment_screenshot')
+            if not payment_screenshot and request.data.get('upload_id'):
+                payment_screenshot = claim_upload(request.user, request.data.get('upload_id'), 'payment_screenshot')
+                if not payment_screenshot:
+                    return Response({'error': 'Upload not found or not finalized'}, status=400)
+
+            # Create appointment
+            appointment = Appointment.objects.create(
+                patient=patient_profile,
+                doctor=doctor,
+                hospital=hospital,
+                date=date,
+                time_slot=time_slot,
+                consultation_type=consultation_type,
+                symptoms=request.data.get('symptoms', ''),
+                payment_screenshot=payment_screenshot,
+                booking_reference=request.data.get('booking_reference'),
+                is_emergency=is_emergency
+            )
+            if is_emergency:
+                # Enters the hospital's triage queue (level 1 most severe .. 5)
+                open_case(appointment, triage_severity)
         
-        # Create notification for hospital
-        Notification.objects.create(
-            user=hospital.user,
-            message=f"New appointment request from {request.user.get_full_name()} for {date} at {time_slot}",
-            notification_type='appointment'
-        )
+            # Create notification for hospital
+            notify(
+                user=hospital.user,
+                message=f"New appointment request from {request.user.get_full_name()} for {date} at {time_slot}",
+                notification_type='appointment'
+            )
 
         serializer = AppointmentSerializer(appointment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -1039,7 +1191,7 @@ def manage_appointment(request, appointment_id):
             appointment.save()
 
             # Notify patient
-            Notification.objects.create(
+            notify(
                 user=appointment.patient.user,
                 message=f"Your appointment with {appointment.doctor.user.get_full_name()} on {appointment.date} has been {appointment.status}",
                 notification_type='appointment'
@@ -1069,6 +1221,97 @@ def hospital_appointments(request):
         return Response([], status=200) # Graceful return
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def emergency_queue(request):
+    """Hospital: waiting cases by severity, cases in hand and doctors free to take one. Doctor: their cases."""
+    user = request.user
+    if user.user_type == 'hospital':
+        return Response({
+            'waiting': [triage_entry(c) for c in waiting_cases(user.id)],
+            'assigned': [
+                triage_entry(c) for c in EmergencyCase.objects.filter(hospital_id=user.id, status='assigned')
+                .select_related('appointment__patient__user', 'assigned_doctor__user').order_by('assigned_at')
+            ],
+            'available_doctors': [
+                {'id': d.id, 'name': d.user.get_full_name()}
+                for d in available_doctors(user.id).select_related('user')
+            ],
+        })
+    if user.user_type == 'doctor':
+        doctor = getattr(user, 'doctor_profile', None)
+        if doctor is None:
+            return Response({'error': 'Doctor profile not found'}, status=404)
+        return Response({'assigned': [triage_entry(c) for c in assigned_cases(doctor.id)]})
+    return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def emergency_next(request):
+    """Hospital takes the most urgent waiting case and assigns it to a connected doctor"""
+    if request.user.user_type != 'hospital':
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+    doctor_id = request.data.get('doctor_id')
+    try:
+        case = assign_next(request.user.id, int(doctor_id) if doctor_id else None)
+    except ValueError:
+        return Response({'error': 'Invalid doctor_id'}, status=400)
+    except NoWaitingCase:
+        return Response({'error': 'No emergencies waiting'}, status=404)
+    except NoDoctorAvailable:
+        return Response({'error': 'No connected doctor is available'}, status=status.HTTP_409_CONFLICT)
+
+    notify(
+        user=case.assigned_doctor.user,
+        message=f"Emergency assigned: {case.appointment.patient.user.get_full_name()} (level {case.severity})",
+        notification_type='appointment'
+    )
+    return Response(triage_entry(case))
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def emergency_case_detail(request, case_id):
+    """Hospital re-triages, requeues or closes a case; the assigned doctor can close it"""
+    try:
+        case = EmergencyCase.objects.select_related(
+            'appointment__patient__user', 'assigned_doctor__user'
+        ).get(id=case_id)
+    except EmergencyCase.DoesNotExist:
+        return Response({'error': 'Case not found'}, status=404)
+
+    user = request.user
+    is_hospital = user.user_type == 'hospital' and case.hospital_id == user.id
+    is_assigned = case.assigned_doctor is not None and case.assigned_doctor.user_id == user.id
+    if not (is_hospital or is_assigned):
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Validated before the status change so a bad value changes nothing
+    severity = None
+    if is_hospital and 'severity' in request.data:
+        try:
+            severity = parse_severity(request.data.get('severity'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+    new_status = request.data.get('status')
+    if new_status == 'closed':
+        close_case(case)
+    elif not is_hospital:
+        return Response({'error': 'Only the hospital can re-triage a case'}, status=status.HTTP_403_FORBIDDEN)
+    elif new_status == 'waiting':
+        # Back into the queue, keeping its place by arrival time
+        case.status = 'waiting'
+        case.assigned_doctor = None
+        case.assigned_at = None
+        case.save(update_fields=['status', 'assigned_doctor', 'assigned_at'])
+    elif new_status is not None:
+        return Response({'error': 'Invalid status'}, status=400)
+
+    if severity is not None:
+        case.severity = severity
+        case.save(update_fields=['severity'])
+    return Response(triage_entry(case))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
 def doctor_appointments(request):
     """List appointments for the current doctor"""
     try:
@@ -1109,14 +1352,39 @@ class VerifyOTPView(APIView):
         otp_code = clean_invisible(otp_code)
 
         try:
-            otp = OTP.objects.filter(phone_or_email=phone_or_email).order_by('-created_at').first()
+            otp = OTP.objects.filter(phone_or_email=phone_or_email, is_used=False).order_by('-created_at').first()
 
             if not otp:
                 return Response({"error": "No OTP found for this email"}, status=status.HTTP_400_BAD_REQUEST)
 
-            if otp.otp_code != otp_code:
-                return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
+            if otp.is_expired:
+                return Response({"error": "OTP has expired. Please request a new one."}, status=status.HTTP_400_BAD_REQUEST)
+
+            if otp.verify_attempts >= settings.OTP_MAX_VERIFY_ATTEMPTS:
+                return Response(
+                    {"error": "Too many incorrect attempts. Please request a new OTP."},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
+
+            # Bytes, so non-ASCII input is just a mismatch rather than a TypeError
+            matches = secrets.compare_digest(otp.otp_code.encode(), otp_code.encode())
+
+            # Every attempt claims a slot with a conditional update, so parallel requests can't
+            # get past the cap and only one correct submission can consume the code
+            claimed = OTP.objects.filter(
+                pk=otp.pk, is_used=False, verify_attempts__lt=settings.OTP_MAX_VERIFY_ATTEMPTS
+            ).update(verify_attempts=F('verify_attempts') + 1, is_used=matches)
+            if not claimed:
+                otp.refresh_from_db(fields=['is_used'])
+                if otp.is_used:
+                    return Response({"error": "OTP has already been used"}, status=status.HTTP_400_BAD_REQUEST)
+                return Response(
+                    {"error": "Too many incorrect attempts. Please request a new OTP."},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
 
+            if not matches:
+                return Response({"error": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
             return Response({"message": "OTP Verified Successfully"}, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -1206,17 +1474,27 @@ def upload_medical_report(request):
         except Appointment.DoesNotExist:
              return Response({'error': 'Appointment not found'}, status=404)
         
-        serializer = MedicalReportSerializer(data=data)
+        upload_id = data.get('upload_id')
+        serializer = MedicalReportSerializer(data=data, context={'has_upload': bool(upload_id)})
         if serializer.is_valid():
-            report = serializer.save()
-            
-            # 1. Update Appointment Status to Completed
-            appointment.status = 'completed'
-            appointment.save()
+            # Claiming the upload, saving the report and completing the appointment succeed or fail together
+            with transaction.atomic():
+                if upload_id:
+                    # Attach the already-stored file by name, no second copy
+                    report_file = claim_upload(user, upload_id, 'medical_report')
+                    if not report_file:
+                        return Response({'error': 'Upload not found or not finalized'}, status=400)
+                    report = serializer.save(report_file=report_file)
+                else:
+                    report = serializer.save()
+                
+                # 1. Update Appointment Status to Completed
+                appointment.status = 'completed'
+                appointment.save()
 
             # 2. Send notification to patient (In-app)
             try:
-                Notification.objects.create(
+                notify(
                     user=appointment.patient.user,
                     message=f"New medical report received from Dr. {user.last_name}. A copy has been sent to your email.",
                     notification_type='report'
@@ -1224,26 +1502,15 @@ def upload_medical_report(request):
             except Exception as e:
                 print(f"Notification error: {e}")
 
-            # 3. Send automated email to patient with PDF attached
+            # 3. Queue automated email to patient with PDF attached
             try:
                 patient_email = appointment.patient.user.email
                 if patient_email:
                     subject = f"Your Medical Consultation Report - {appointment.date}"
-                    body = f"Hello {appointment.patient.user.first_name},\n\nPlease find attached your medical consultation report from Dr. {user.last_name} at {appointment.hospital.hospital_name}.\n\nYou can also access this report anytime by logging into your MediSEWA dashboard.\n\nBest regards,\nMediSEWA Team"
-                    
-                    email = EmailMessage(
-                        subject,
-                        body,
-                        settings.EMAIL_HOST_USER,
-                        [patient_email],
-                    )
-                    
-                    # Attach the PDF
-                    if report.report_file:
-                        email.attach(report.report_file.name, report.report_file.read(), 'application/pdf')
-                    
-                    email.send()
-                    print(f"Email sent to patient: {patient_email}")
+                    delivery, attachments = report_email_delivery(request, report)
+                    body = f"Hello {appointment.patient.user.first_name},\n\nYour medical consultation report from Dr. {user.last_name} at {appointment.hospital.hospital_name} is ready.\n\n{delivery}\n\nYou can also access this report anytime by logging into your MediSEWA dashboard.\n\nBest regards,\nMediSEWA Team"
+                    enqueue_email(subject, body, [patient_email], attachments=attachments)
+                    print(f"Email queued for patient: {patient_email}")
 
                 # 4. Notify Hospital Admin via Email
                 hospital_email = appointment.hospital.user.email
@@ -1251,15 +1518,9 @@ def upload_medical_report(request):
                     admin_subject = f"New Report Generated: {report.title}"
                     admin_body = f"A new consultation report has been generated for patient {appointment.patient.user.get_full_name()} by Dr. {user.get_full_name()}.\n\nReport ID: {report.id}\nDate: {timezone.now()}"
                     
-                    send_mail(
-                        admin_subject,
-                        admin_body,
-                        settings.EMAIL_HOST_USER,
-                        [hospital_email],
-                        fail_silently=True,
-                    )
+                    enqueue_email(admin_subject, admin_body, [hospital_email])
             except Exception as e:
-                print(f"Email sending error: {e}")
+                print(f"Email queueing error: {e}")
                 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
@@ -1328,6 +1589,42 @@ def get_patient_detail(request, patient_id):
     
     return Response(data)
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def scan_qr_code(request):
+    """
+    Resolve a scanned check-in QR (or a typed patient/hospital unique id) with
+    a single indexed lookup on the unique id, user joined in the same query.
+    """
+    code = request.data.get('code') if request.method == 'POST' else request.query_params.get('code')
+    kind, unique_id = parse_qr_payload(code)
+    if not unique_id:
+        return Response({'error': 'code is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if kind == 'hospital':
+        hospital = Hospital.objects.select_related('user').filter(hospital_unique_id=unique_id).first()
+        if hospital is None:
+            return Response({'error': 'Hospital not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'kind': 'hospital',
+            'id': hospital.pk,
+            'hospital_unique_id': hospital.hospital_unique_id,
+            'hospital_name': hospital.hospital_name,
+            'address': hospital.address,
+            'city': hospital.city,
+            'contact_number': hospital.contact_number,
+        })
+
+    user = request.user
+    patient = PatientProfile.objects.select_related('user').filter(patient_unique_id=unique_id).first()
+    if patient is None:
+        return Response({'error': 'Patient not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Patients may only resolve their own code
+    if user.user_type == 'patient' and patient.user_id != user.id:
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({'kind': 'patient', **PatientProfileSerializer(patient).data})
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_hospital_reports(request):
@@ -1379,23 +1676,29 @@ def upload_hospital_report(request):
         title = request.data.get('title', 'Lab Report')
         description = request.data.get('description', '')
         report_file = request.FILES.get('report_file')
-        
-        if not report_file:
-            return Response({'error': 'Report file is required'}, status=400)
-        
-        report = MedicalReport.objects.create(
-            patient=target_patient,
-            hospital=hospital,
-            uploaded_by=user,
-            report_type='lab_report',
-            title=title,
-            description=description,
-            report_file=report_file,
-        )
+        # The upload is only marked attached if the report is created with it
+        with transaction.atomic():
+            if not report_file and request.data.get('upload_id'):
+                report_file = claim_upload(user, request.data.get('upload_id'), 'medical_report')
+                if not report_file:
+                    return Response({'error': 'Upload not found or not finalized'}, status=400)
+            
+            if not report_file:
+                return Response({'error': 'Report file is required'}, status=400)
+            
+            report = MedicalReport.objects.create(
+                patient=target_patient,
+                hospital=hospital,
+                uploaded_by=user,
+                report_type='lab_report',
+                title=title,
+                description=description,
+                report_file=report_file,
+            )
         
         # Notify patient
         try:
-            Notification.objects.create(
+            notify(
                 user=target_patient.user,
                 message=f"New lab report '{title}' uploaded by {hospital.hospital_name}.",
                 notification_type='info'
@@ -1403,27 +1706,22 @@ def upload_hospital_report(request):
         except Exception as e:
             print(f"Notification error: {e}")
         
-        # Send email to patient
+        # Queue email to patient
         try:
             patient_email = target_patient.user.email
             if patient_email:
                 subject = f"New Lab Report: {title}"
+                delivery, attachments = report_email_delivery(request, report)
                 body = (
                     f"Hello {target_patient.user.first_name},\n\n"
                     f"A new lab report has been uploaded by {hospital.hospital_name}.\n"
                     f"Report: {title}\n"
                     f"Description: {description}\n\n"
+                    f"{delivery}\n\n"
                     f"You can view this report in your MediSEWA dashboard.\n\n"
                     f"Best regards,\nMediSEWA Team"
                 )
-                email_msg = EmailMessage(
-                    subject, body,
-                    settings.EMAIL_HOST_USER,
-                    [patient_email],
-                )
-                if report.report_file:
-                    email_msg.attach(report.report_file.name, report.report_file.read(), 'application/pdf')
-                email_msg.send(fail_silently=True)
+                enqueue_email(subject, body, [patient_email], attachments=attachments)
         except Exception as e:
             print(f"Email error: {e}")
         
@@ -1504,6 +1802,9 @@ def recommend_doctors(request):
             if relevant_specs:
                 doctors = doctors.filter(specialization__in=relevant_specs)
 
+        # Best rated first
+        doctors = doctors.order_by('-rating_avg', '-rating_count')
+
         # Return data
         # We need a serializer or manual construction
         results = []
@@ -1517,9 +1818,12 @@ def recommend_doctors(request):
                 'specialization': doc.specialization,
                 'qualification': doc.qualification,
                 'experience_years': doc.experience_years,
+                'avg_rating': round(doc.rating_avg, 1),
+                'rating_count': doc.rating_count,
                 'hospital_id': doc.hospital.id if doc.hospital else None,
                 'hospital_name': doc.hospital.hospital_name if doc.hospital else None,
                 'profile_picture': doc.profile_picture.url if doc.profile_picture else None,
+                'profile_picture_variants': variant_urls('doctor', doc, 'profile_picture'),
                 'latitude': doc.hospital.latitude if doc.hospital else None,
                 'longitude': doc.hospital.longitude if doc.hospital else None,
                 'departments': [{'name': d.name, 'id': d.id} for d in (doc.hospital.departments.all() if doc.hospital else [])]
@@ -1562,6 +1866,7 @@ def nearby_hospitals(request):
                 'latitude': hosp.latitude,
                 'longitude': hosp.longitude,
                 'logo': hosp.logo.url if hosp.logo else None,
+                'logo_variants': variant_urls('hospital', hosp, 'logo'),
                 'opening_hours': hosp.opening_hours,
                 'departments': [{'name': d.name, 'id': d.id} for d in hosp.departments.all()]
             })
@@ -1606,7 +1911,9 @@ def manage_reviews(request, doctor_id=None):
         
         serializer = ReviewSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                review = serializer.save()
+                doctor.record_rating(review.rating)
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
@@ -1644,3 +1951,238 @@ def get_doctor_patients(request):
         data.append(p_data)
         
     return Response(data)
+
+def treats_patient(user, patient_id):
+    """A doctor or hospital with an appointment for the patient"""
+    if user.user_type == 'doctor':
+        doctor = getattr(user, 'doctor_profile', None)
+        return doctor is not None and Appointment.objects.filter(doctor=doctor, patient_id=patient_id).exists()
+    if user.user_type == 'hospital':
+        # Hospital primary key is the user ID
+        return Appointment.objects.filter(hospital_id=user.id, patient_id=patient_id).exists()
+    return False
+
+def can_access_report(user, report):
+    """Patient owner, the report's doctor/hospital/uploader, or a doctor/hospital treating the patient"""
+    if report.uploaded_by_id == user.id:
+        return True
+    if user.user_type == 'patient':
+        return report.patient.user_id == user.id
+    if user.user_type == 'doctor':
+        doctor = getattr(user, 'doctor_profile', None)
+        return doctor is not None and (report.doctor_id == doctor.id or treats_patient(user, report.patient_id))
+    if user.user_type == 'hospital':
+        return report.hospital_id == user.id or treats_patient(user, report.patient_id)
+    return user.is_staff
+
+REPORT_LINK_SALT = 'authentication.report-link'
+
+def report_share_link(request, report):
+    """
+    Absolute, signed URL that downloads report without logging in, until it expires.
+    Whoever holds the link can use it, so it only names the report.
+    """
+    token = signing.dumps({'r': report.pk}, salt=REPORT_LINK_SALT, compress=True)
+    path = reverse('shared_medical_report', args=[token])
+    if settings.PUBLIC_BASE_URL:
+        return settings.PUBLIC_BASE_URL.rstrip('/') + path
+    return request.build_absolute_uri(path)
+
+def report_email_delivery(request, report):
+    """
+    (sentence for the email body, outbox attachments) for a report email.
+    Sends a signed link unless REPORT_EMAIL_DELIVERY is "attachment".
+    """
+    if not report.report_file:
+        return "", []
+    if settings.REPORT_EMAIL_DELIVERY == 'attachment':
+        # The PDF is read from storage by the outbox worker, not here
+        return "The report is attached to this email.", [(report.report_file.name, 'application/pdf')]
+
+    expires = timezone.now() + timedelta(seconds=settings.REPORT_LINK_MAX_AGE_SECONDS)
+    link = report_share_link(request, report)
+    return f"Download the report (link valid until {expires:%Y-%m-%d %H:%M} UTC):\n{link}", []
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def download_medical_report(request, report_id):
+    """Stream a report file with Range/ETag support instead of exposing MEDIA_URL"""
+    try:
+        report = MedicalReport.objects.select_related('patient').get(pk=report_id)
+    except MedicalReport.DoesNotExist:
+        return Response({'error': 'Report not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if not can_access_report(request.user, report):
+        return Response({'error': 'Unauthorized to view this report'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Stored under its content hash, so name the download after the report
+    ext = os.path.splitext(report.report_file.name)[1]
+    filename = (slugify(report.title) or 'report') + ext
+    return serve_field_file(request, report.report_file, private=True, filename=filename)
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def shared_medical_report(request, token):
+    """Download through a signed email link; the signature and its age are the only credentials"""
+    try:
+        payload = signing.loads(token, salt=REPORT_LINK_SALT, max_age=settings.REPORT_LINK_MAX_AGE_SECONDS)
+    except signing.SignatureExpired:
+        return Response({'error': 'This link has expired. Log in to MediSEWA to download the report.'},
+                        status=status.HTTP_410_GONE)
+    except signing.BadSignature:
+        return Response({'error': 'Invalid link'}, status=status.HTTP_404_NOT_FOUND)
+
+    report = MedicalReport.objects.filter(pk=payload.get('r')).only('pk', 'title', 'report_file').first()
+    if report is None:
+        return Response({'error': 'Report not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    ext = os.path.splitext(report.report_file.name)[1]
+    filename = (slugify(report.title) or 'report') + ext
+    return serve_field_file(request, report.report_file, private=True, filename=filename)
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, PassthroughRenderer])
+def serve_profile_image(request, kind, object_id, variant=None, ext=None):
+    """
+    Doctor photos and hospital logos are public, patient photos need an authenticated owner or care provider.
+    With variant/ext, serves a downscaled WebP/JPEG copy, rendered on first request if it isn't there yet.
+    """
+    if kind not in PROFILE_IMAGE_FIELDS:
+        return Response({'error': 'Unknown image type'}, status=status.HTTP_404_NOT_FOUND)
+    if variant is not None and (variant not in VARIANT_SIZES or ext not in VARIANT_FORMATS):
+        return Response({'error': 'Unknown image variant'}, status=status.HTTP_404_NOT_FOUND)
+
+    model, field, public = PROFILE_IMAGE_FIELDS[kind]
+    try:
+        obj = model.objects.get(pk=object_id)
+    except (model.DoesNotExist, ValueError):
+        return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if not public:
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+        # Same rule as medical reports: the patient, or a doctor/hospital treating them
+        if obj.user_id != user.id and not (treats_patient(user, obj.pk) or user.is_staff):
+            return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+    field_file = getattr(obj, field)
+    if variant is not None and field_file:
+        try:
+            name = ensure_variant(field_file, variant, ext)
+        except (OSError, Image.DecompressionBombError) as e:
+            print(f"Error rendering {variant}.{ext} for {kind} {object_id}: {e}")
+            return Response({'error': 'Image could not be processed'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        field_file = FieldFile(obj, field_file.field, name)
+
+    return serve_field_file(request, field_file, private=not public)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_init(request):
+    """
+    Start a resumable upload.
+    Body: {"filename", "size", "sha256", "purpose": "medical_report" | "payment_screenshot"}
+    """
+    purpose = request.data.get('purpose')
+    filename = (request.data.get('filename') or '').strip()
+    checksum = (request.data.get('sha256') or '').strip().lower()
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return Response({'error': 'size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if purpose not in dict(UploadSession.PURPOSE_CHOICES):
+        return Response({'error': 'Invalid purpose'}, status=status.HTTP_400_BAD_REQUEST)
+    if not filename or len(checksum) != 64:
+        return Response({'error': 'filename and a hex sha256 are required'}, status=status.HTTP_400_BAD_REQUEST)
+    if size <= 0 or size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        return Response({'error': f'size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes'}, status=status.HTTP_400_BAD_REQUEST)
+
+    upload = UploadSession.objects.create(
+        user=request.user,
+        purpose=purpose,
+        filename=filename,
+        total_size=size,
+        checksum=checksum
+    )
+    start_upload(upload)
+    return Response({
+        'upload_id': str(upload.id),
+        'received_bytes': 0,
+        'max_chunk_size': settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, upload_id):
+    """
+    GET returns the resume offset. PUT appends the raw request body at the
+    offset given in the Upload-Offset header, optionally checked against
+    X-Chunk-SHA256.
+    """
+    if request.method == 'GET':
+        try:
+            upload = UploadSession.objects.get(id=upload_id, user=request.user)
+        except UploadSession.DoesNotExist:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'upload_id': str(upload.id),
+            'received_bytes': upload.received_bytes,
+            'total_size': upload.total_size,
+            'status': upload.status
+        })
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        return Response({'error': 'Upload-Offset and Content-Length headers are required'}, status=status.HTTP_400_BAD_REQUEST)
+    if length <= 0 or length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        return Response({'error': f'Chunk must be between 1 and {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} bytes'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        upload = UploadSession.objects.get(id=upload_id, user=request.user, status='active')
+    except UploadSession.DoesNotExist:
+        return Response({'error': 'Upload not found or already finalized'}, status=status.HTTP_404_NOT_FOUND)
+
+    # The body is read from the network with no transaction open...
+    try:
+        staged_path = stage_chunk(upload, offset, request.stream, length, request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return Response({'error': str(e), 'received_bytes': upload.received_bytes}, status=status.HTTP_409_CONFLICT)
+
+    # ...and only appended under the row lock, which serializes chunks for the same upload
+    with transaction.atomic():
+        try:
+            upload = UploadSession.objects.select_for_update().get(id=upload_id, user=request.user, status='active')
+        except UploadSession.DoesNotExist:
+            os.remove(staged_path)
+            return Response({'error': 'Upload not found or already finalized'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            commit_chunk(upload, offset, staged_path)
+        except UploadError as e:
+            return Response({'error': str(e), 'received_bytes': upload.received_bytes}, status=status.HTTP_409_CONFLICT)
+
+    return Response({'received_bytes': upload.received_bytes, 'total_size': upload.total_size})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_complete(request, upload_id):
+    """Verify the whole-file checksum and make the upload attachable via upload_id"""
+    with transaction.atomic():
+        try:
+            upload = UploadSession.objects.select_for_update().get(id=upload_id, user=request.user, status='active')
+        except UploadSession.DoesNotExist:
+            return Response({'error': 'Upload not found or already finalized'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            finalize_upload(upload)
+        except UploadError as e:
+            return Response({'error': str(e), 'received_bytes': upload.received_bytes}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({'upload_id': str(upload.id), 'status': upload.status, 'file': upload.file_name})
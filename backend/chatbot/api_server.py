@@ -3,11 +3,12 @@ Flask API Server for Medical AI Assistant
 Provides REST endpoints for the React frontend
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from doctor_chatbot_backend import MedicalAIAssistant
 from patient_chatbot_backend import PatientAIAssistant
 import os
+import json
 from dotenv import load_dotenv
 from typing import Dict, List
 import logging
@@ -40,6 +41,62 @@ except Exception as e:
     patient_assistant = None
 
 
+def wants_stream(data: Dict) -> bool:
+    """Streaming is asked for with "stream": true or an Accept: text/event-stream header"""
+    return bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def public_error(response: str, detail: str = None) -> Dict:
+    """Error body for clients: the exception text is only included in debug mode"""
+    return {
+        "error": "Internal server error",
+        "response": response,
+        "details": detail if app.debug else None
+    }
+
+
+def public_result(result: Dict) -> Dict:
+    """A chat result as sent to clients; failed turns lose their raw exception text"""
+    if "error" not in result:
+        return result
+    logger.error(f"Error generating chat response: {result['error']}")
+    return public_error(result["response"], result["error"])
+
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events, on_done=None) -> Response:
+    """
+    Server-sent events from an assistant's chat_stream: one `token` event per
+    chunk of the answer ({"text": ...}) and a final `done` event carrying the
+    same JSON the blocking endpoint returns (sources, suggestions, timestamp).
+    A failed turn ends with an `error` event instead of `done`.
+    """
+    def generate():
+        try:
+            for event, data in events:
+                if event == "token":
+                    yield sse_event("token", {"text": data})
+                elif "error" in data:
+                    yield sse_event("error", public_result(data))
+                else:
+                    if on_done:
+                        on_done(data)
+                    yield sse_event("done", data)
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}")
+            yield sse_event("error", public_error(
+                "I apologize, but I encountered an error processing your request. Please try again.", str(e)
+            ))
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # don't let a proxy hold tokens back
+    })
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -47,7 +104,12 @@ def health_check():
         "status": "healthy",
         "service": "MediSEWA AI Assistant API",
         "doctor_assistant_ready": medical_assistant is not None,
-        "patient_assistant_ready": patient_assistant is not None
+        "patient_assistant_ready": patient_assistant is not None,
+        "response_cache": {
+            name: assistant.response_cache.stats()
+            for name, assistant in (("doctor", medical_assistant), ("patient", patient_assistant))
+            if assistant is not None and assistant.response_cache is not None
+        }
     }), 200
 
 
@@ -63,7 +125,8 @@ def chat():
         "context": [
             {"sender": "user", "text": "previous message", "timestamp": "..."},
             {"sender": "ai", "text": "previous response", "timestamp": "..."}
-        ]
+        ],
+        "stream": false
     }
     
     Returns:
@@ -73,6 +136,9 @@ def chat():
         "sources": [...],
         "suggestions": [...]
     }
+    
+    With "stream": true (or Accept: text/event-stream) the answer is sent as
+    server-sent `token` events followed by a `done` event with the above.
     """
     if not medical_assistant:
         return jsonify({
@@ -105,6 +171,12 @@ def chat():
         # Log the request
         logger.info(f"Processing request from doctor {doctor_id}: {message[:100]}...")
         
+        if wants_stream(data):
+            return sse_response(
+                medical_assistant.chat_stream(message, chat_history, {"doctor_id": doctor_id}),
+                on_done=lambda result: logger.info(f"Response streamed for doctor {doctor_id}")
+            )
+        
         # Get AI response
         result = medical_assistant.chat(
             user_message=message,
@@ -115,7 +187,7 @@ def chat():
         # Log success
         logger.info(f"Response generated successfully for doctor {doctor_id}")
         
-        return jsonify(result), 200
+        return jsonify(public_result(result)), 200
     
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
@@ -135,8 +207,11 @@ def patient_chat():
     {
         "message": "What is MediSEWA?",
         "patientId": "patient_123",
-        "context": [...]
+        "context": [...],
+        "stream": false
     }
+    
+    Streams like /api/doctor-chatbot when "stream" is true.
     """
     if not patient_assistant:
         return jsonify({
@@ -166,6 +241,12 @@ def patient_chat():
         
         logger.info(f"Processing patient request from {patient_id}: {message[:100]}...")
         
+        if wants_stream(data):
+            return sse_response(
+                patient_assistant.chat_stream(message, chat_history, {"patient_id": patient_id}),
+                on_done=lambda result: logger.info(f"Response streamed for patient {patient_id}")
+            )
+        
         result = patient_assistant.chat(
             user_message=message,
             chat_history=chat_history,
@@ -173,7 +254,7 @@ def patient_chat():
         )
         
         logger.info(f"Response generated for patient {patient_id}")
-        return jsonify(result), 200
+        return jsonify(public_result(result)), 200
     
     except Exception as e:
         logger.error(f"Error processing patient chat: {str(e)}")
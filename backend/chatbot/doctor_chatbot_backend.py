@@ -4,14 +4,15 @@ Provides doctors with intelligent assistance for medical queries, drug interacti
 prescriptions, and patient care recommendations.
 """
 
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 from datetime import datetime
 import os
 import json
+import time
 from dotenv import load_dotenv
 
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_community.vectorstores import FAISS
@@ -19,10 +20,15 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.documents import Document
 
+from knowledge_store import cached_embeddings, load_or_build_index
+from response_cache import CACHE_ENABLED, ResponseCache, normalize_question
+
 # Load environment variables
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+
 # ============================================================================
 # RAG KNOWLEDGE BASE SETUP
 # ============================================================================
@@ -35,11 +41,10 @@ class MedicalKnowledgeBase:
     
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
-            google_api_key=api_key
-        )
+        # Chunk embeddings come from the on-disk cache when the text was embedded before
+        self.embeddings = cached_embeddings(EMBEDDING_MODEL, api_key)
         self.vectorstore = None
+        self.version = None  # fingerprint of the indexed chunks
         self.initialize_knowledge_base()
     
     def initialize_knowledge_base(self):
@@ -191,8 +196,8 @@ class MedicalKnowledgeBase:
         
         splits = text_splitter.split_documents(medical_documents)
         
-        # Create vector store
-        self.vectorstore = FAISS.from_documents(splits, self.embeddings)
+        # Load the saved index, or embed and save it if the documents changed
+        self.vectorstore, self.version = load_or_build_index("medical", splits, self.embeddings, EMBEDDING_MODEL)
         print(f"✓ Knowledge base initialized with {len(splits)} document chunks")
     
     def _generate_additional_medical_knowledge(self) -> List[Document]:
@@ -240,12 +245,29 @@ class MedicalKnowledgeBase:
             ),
         ]
     
-    def retrieve_relevant_knowledge(self, query: str, k: int = 4) -> List[Document]:
-        """Retrieve relevant medical knowledge for a query"""
+    def embed_question(self, query: str) -> List[float]:
+        """Embedding of the normalized question; keys the response cache and drives retrieval"""
+        return self.embeddings.embed_query(normalize_question(query))
+
+    def retrieve_relevant_knowledge(self, query: str, k: int = 4, vector: List[float] = None) -> List[Document]:
+        """Retrieve relevant medical knowledge for a query, or for its already computed embedding"""
         if not self.vectorstore:
             return []
+        if vector is not None:
+            return self.vectorstore.similarity_search_by_vector(vector, k=k)
         return self.vectorstore.similarity_search(query, k=k)
 
+    def retrieve_with_scores(self, query: str, k: int = 4, vector: List[float] = None) -> List[Tuple[Document, float]]:
+        """
+        Retrieve (document, distance) pairs, closest first. The index is flat L2,
+        so distance is the squared euclidean distance between embeddings.
+        """
+        if not self.vectorstore:
+            return []
+        if vector is not None:
+            return self.vectorstore.similarity_search_with_score_by_vector(vector, k=k)
+        return self.vectorstore.similarity_search_with_score(query, k=k)
+
 
 # ============================================================================
 # MEDICAL AI ASSISTANT
@@ -269,6 +291,9 @@ class MedicalAIAssistant:
         
         # Initialize knowledge base
         self.knowledge_base = MedicalKnowledgeBase(api_key)
+        # Answers to first questions, reused only for the same question: clinical questions
+        # that differ in one word (adult vs paediatric dosing) are too similar to match by embedding
+        self.response_cache = ResponseCache(exact=True) if CACHE_ENABLED else None
         
         # System prompt for medical context
         self.system_prompt = """You are a specialized medical AI assistant EXCLUSIVELY for healthcare professionals.
@@ -358,18 +383,21 @@ Provide your response based on the above knowledge and your medical training. Re
             ("human", "{question}")
         ])
         
-        # Create the chain
-        self.chain = (
-            {
-                "context": lambda x: self._format_retrieved_docs(
-                    self.knowledge_base.retrieve_relevant_knowledge(x["question"])
-                ),
-                "question": lambda x: x["question"],
-                "chat_history": lambda x: x["chat_history"]
-            }
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
+        # Create the chain: retrieve once, then answer from the retrieved docs.
+        # The output keeps the scored docs so they can be reported as sources.
+        self.chain = RunnablePassthrough.assign(
+            docs=lambda x: self.knowledge_base.retrieve_with_scores(x["question"], vector=x.get("query_vector"))
+        ).assign(
+            response=(
+                {
+                    "context": lambda x: self._format_retrieved_docs([doc for doc, _ in x["docs"]]),
+                    "question": lambda x: x["question"],
+                    "chat_history": lambda x: x["chat_history"]
+                }
+                | self.prompt
+                | self.llm
+                | StrOutputParser()
+            )
         )
     
     def _format_retrieved_docs(self, docs: List[Document]) -> str:
@@ -384,6 +412,18 @@ Provide your response based on the above knowledge and your medical training. Re
         
         return "\n".join(formatted)
     
+    def _format_sources(self, scored_docs: List[Tuple[Document, float]]) -> List[Dict[str, Any]]:
+        """The docs the answer was grounded on, with their retrieval scores"""
+        return [
+            {
+                "category": doc.metadata.get("category", "general"),
+                "distance": round(float(distance), 4),
+                # Embeddings are unit length, so cosine similarity = 1 - squared distance / 2
+                "relevance_score": round(max(0.0, 1 - float(distance) / 2), 4)
+            }
+            for doc, distance in scored_docs
+        ]
+    
     def chat(self, 
              user_message: str, 
              chat_history: List[Dict[str, str]] = None,
@@ -399,6 +439,19 @@ Provide your response based on the above knowledge and your medical training. Re
         Returns:
             Dict with response and metadata
         """
+        for event, data in self.chat_stream(user_message, chat_history, doctor_context):
+            if event == "done":
+                return data
+    
+    def chat_stream(self,
+                    user_message: str,
+                    chat_history: List[Dict[str, str]] = None,
+                    doctor_context: Dict[str, Any] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Same as chat, but yields ("token", text) as the answer is generated and
+        then ("done", result) with the dict chat would return. A cached answer
+        arrives as a single token.
+        """
         if chat_history is None:
             chat_history = []
         
@@ -412,30 +465,43 @@ Provide your response based on the above knowledge and your medical training. Re
         
         # Get response from the chain
         try:
-            response = self.chain.invoke({
+            # Before the doctor's first turn (the history is at most the greeting) the answer
+            # depends only on the question, so it can come from the cache
+            first_question = not any(msg["role"] == "user" for msg in chat_history)
+            if self.response_cache is not None and first_question:
+                cached = self.response_cache.lookup(None, self.knowledge_base.version, question=user_message)
+                if cached is not None:
+                    yield "token", cached["response"]
+                    yield "done", cached
+                    return
+
+            started = time.perf_counter()
+            docs, parts = [], []
+            for chunk in self.chain.stream({
                 "question": user_message,
                 "chat_history": lc_chat_history
-            })
-            
-            # Retrieve relevant docs for metadata
-            relevant_docs = self.knowledge_base.retrieve_relevant_knowledge(user_message, k=3)
+            }):
+                if "docs" in chunk:
+                    docs = chunk["docs"]
+                if chunk.get("response"):
+                    parts.append(chunk["response"])
+                    yield "token", chunk["response"]
+            response = "".join(parts)
             
-            return {
+            result = {
                 "response": response,
                 "timestamp": datetime.now().isoformat(),
-                "sources": [
-                    {
-                        "category": doc.metadata.get("category", "general"),
-                        "relevance_score": "high"  # Could add actual scoring
-                    }
-                    for doc in relevant_docs
-                ],
+                "sources": self._format_sources(docs),
                 "suggestions": self._generate_suggestions(user_message, response)
             }
+            if self.response_cache is not None and first_question:
+                self.response_cache.store(None, self.knowledge_base.version, result, time.perf_counter() - started,
+                                          question=user_message)
+            yield "done", result
         
         except Exception as e:
-            return {
-                "response": f"I apologize, but I encountered an error processing your request. Please try rephrasing your question or contact support if the issue persists. Error: {str(e)}",
+            yield "done", {
+                "response": "I apologize, but I encountered an error processing your request. Please try rephrasing your question or contact support if the issue persists.",
                 "timestamp": datetime.now().isoformat(),
                 "error": str(e)
             }
@@ -0,0 +1,142 @@
+"""
+On-disk FAISS indexes for the chatbot knowledge bases.
+
+Building an index means embedding every chunk through the Gemini API, so it is
+done once and saved next to a fingerprint of the chunks it was built from.
+Later starts memory-map the saved index and only rebuild when the chunks
+(or the embedding model) change. Chunk embeddings are cached by content, so a
+rebuild only pays for chunks that are new or edited.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import List
+
+import faiss
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+INDEX_DIR = os.getenv("CHATBOT_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".kb_index"))
+EMBEDDING_CACHE_DIR = os.getenv("CHATBOT_EMBEDDING_CACHE_DIR", os.path.join(INDEX_DIR, "embeddings"))
+# Most texts the Gemini batchEmbedContents endpoint takes in one request
+EMBED_BATCH_SIZE = 100
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.json"
+FINGERPRINT_FILE = "fingerprint"
+
+
+def cached_embeddings(model: str, api_key: str) -> CacheBackedEmbeddings:
+    """
+    Gemini embeddings behind a persistent cache keyed by (model, hash of the
+    chunk text). Only texts missing from the cache reach the API, in batches of
+    EMBED_BATCH_SIZE. Queries are not cached and always go to the API.
+    """
+    return CacheBackedEmbeddings.from_bytes_store(
+        GoogleGenerativeAIEmbeddings(model=model, google_api_key=api_key),
+        LocalFileStore(EMBEDDING_CACHE_DIR),
+        namespace=model,
+        batch_size=EMBED_BATCH_SIZE,
+    )
+
+
+def fingerprint(chunks: List[Document], model: str) -> str:
+    """SHA-256 over the embedding model and every chunk's text and metadata, in order"""
+    digest = hashlib.sha256(model.encode())
+    for chunk in chunks:
+        digest.update(b"\0")
+        digest.update(chunk.page_content.encode())
+        digest.update(json.dumps(chunk.metadata, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_index(vectorstore: FAISS, path: str, version: str):
+    """
+    Write index, docstore and fingerprint. The old fingerprint is removed first
+    and the new one written last, so while the other two files are being
+    replaced (or after a crash in between) no fingerprint matches them.
+    """
+    os.makedirs(path, exist_ok=True)
+    try:
+        os.remove(os.path.join(path, FINGERPRINT_FILE))
+    except FileNotFoundError:
+        pass
+    _write_atomic(os.path.join(path, INDEX_FILE), faiss.serialize_index(vectorstore.index).tobytes())
+    documents = [
+        {"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}
+        for doc_id, doc in vectorstore.docstore._dict.items()
+    ]
+    _write_atomic(os.path.join(path, DOCSTORE_FILE), json.dumps({
+        "documents": documents,
+        "index_to_docstore_id": [vectorstore.index_to_docstore_id[i] for i in range(len(vectorstore.index_to_docstore_id))],
+    }).encode())
+    _write_atomic(os.path.join(path, FINGERPRINT_FILE), version.encode())
+
+
+def _read_fingerprint(path: str) -> str:
+    with open(os.path.join(path, FINGERPRINT_FILE)) as f:
+        return f.read().strip()
+
+
+def load_index(path: str, embeddings, version: str):
+    """The saved FAISS store if its fingerprint is version, else None"""
+    try:
+        if _read_fingerprint(path) != version:
+            return None
+        # Memory-mapped: pages are shared between workers and loaded on demand
+        index = faiss.read_index(os.path.join(path, INDEX_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        with open(os.path.join(path, DOCSTORE_FILE)) as f:
+            saved = json.load(f)
+        # A rebuild that started while we read would have removed the fingerprint
+        if _read_fingerprint(path) != version:
+            return None
+        docstore = InMemoryDocstore({
+            d["id"]: Document(page_content=d["page_content"], metadata=d["metadata"]) for d in saved["documents"]
+        })
+        index_to_docstore_id = dict(enumerate(saved["index_to_docstore_id"]))
+    except (OSError, ValueError, RuntimeError, KeyError, TypeError):
+        return None
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def load_or_build_index(name: str, chunks: List[Document], embeddings, model: str):
+    """
+    Returns (vectorstore, fingerprint). Loads INDEX_DIR/<name> when it was built
+    from exactly these chunks, otherwise embeds them and saves the new index.
+    """
+    version = fingerprint(chunks, model)
+    path = os.path.join(INDEX_DIR, name)
+    vectorstore = load_index(path, embeddings, version)
+    if vectorstore is not None:
+        print(f"✓ Loaded {name} index from disk ({vectorstore.index.ntotal} chunks)")
+        return vectorstore, version
+
+    vectorstore = FAISS.from_documents(chunks, embeddings)
+    try:
+        save_index(vectorstore, path, version)
+    except OSError as e:
+        print(f"Could not save {name} index: {e}")
+    return vectorstore, version
@@ -4,24 +4,30 @@ Provides patients with easy-to-understand health information, appointment bookin
 and emergency guidance.
 """
 
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 from datetime import datetime
 import os
 import json
+import time
 from dotenv import load_dotenv
 
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from knowledge_store import cached_embeddings, load_or_build_index
+from response_cache import CACHE_ENABLED, ResponseCache, normalize_question
+
 # Load environment variables
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+
 class PatientKnowledgeBase:
     """
     Manages the patient-facing knowledge base.
@@ -30,11 +36,10 @@ class PatientKnowledgeBase:
     
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
-            google_api_key=api_key
-        )
+        # Chunk embeddings come from the on-disk cache when the text was embedded before
+        self.embeddings = cached_embeddings(EMBEDDING_MODEL, api_key)
         self.vectorstore = None
+        self.version = None  # fingerprint of the indexed chunks
         self.initialize_knowledge_base()
     
     def initialize_knowledge_base(self):
@@ -180,12 +185,17 @@ class PatientKnowledgeBase:
             chunk_overlap=100
         )
         splits = text_splitter.split_documents(patient_documents)
-        self.vectorstore = FAISS.from_documents(splits, self.embeddings)
+        self.vectorstore, self.version = load_or_build_index("patient", splits, self.embeddings, EMBEDDING_MODEL)
         print(f"✓ Patient knowledge base initialized with {len(splits)} chunks")
 
-    def retrieve_relevant_knowledge(self, query: str, k: int = 3) -> List[Document]:
+    def embed_question(self, query: str) -> List[float]:
+        return self.embeddings.embed_query(normalize_question(query))
+
+    def retrieve_relevant_knowledge(self, query: str, k: int = 3, vector: List[float] = None) -> List[Document]:
         if not self.vectorstore:
             return []
+        if vector is not None:
+            return self.vectorstore.similarity_search_by_vector(vector, k=k)
         return self.vectorstore.similarity_search(query, k=k)
 
 class PatientAIAssistant:
@@ -203,6 +213,8 @@ class PatientAIAssistant:
             max_output_tokens=1024,
         )
         self.knowledge_base = PatientKnowledgeBase(api_key)
+        # Answers to first questions, reused for near-identical ones
+        self.response_cache = ResponseCache() if CACHE_ENABLED else None
         
         self.system_prompt = """You are MediSEWA's friendly AI Health Assistant for patients.
         
@@ -239,7 +251,7 @@ class PatientAIAssistant:
         self.chain = (
             {
                 "context": lambda x: self._format_docs(
-                    self.knowledge_base.retrieve_relevant_knowledge(x["question"])
+                    self.knowledge_base.retrieve_relevant_knowledge(x["question"], vector=x.get("query_vector"))
                 ),
                 "question": lambda x: x["question"],
                 "chat_history": lambda x: x["chat_history"]
@@ -253,6 +265,12 @@ class PatientAIAssistant:
         return "\n\n".join([d.page_content for d in docs]) if docs else "No specific knowledge found."
 
     def chat(self, user_message: str, chat_history: List[Dict[str, str]] = None, patient_context: Dict = None) -> Dict[str, Any]:
+        for event, data in self.chat_stream(user_message, chat_history, patient_context):
+            if event == "done":
+                return data
+
+    def chat_stream(self, user_message: str, chat_history: List[Dict[str, str]] = None, patient_context: Dict = None) -> Iterator[Tuple[str, Any]]:
+        """Yields ("token", text) while the answer is generated, then ("done", the chat result)"""
         if chat_history is None:
             chat_history = []
         
@@ -265,18 +283,38 @@ class PatientAIAssistant:
                 lc_history.append(AIMessage(content=msg["content"]))
         
         try:
-            response = self.chain.invoke({
+            # Only a first question is cached (the history is at most the greeting):
+            # after a user turn the answer depends on the conversation
+            query_vector = None
+            if self.response_cache is not None and not any(msg["role"] == "user" for msg in chat_history):
+                query_vector = self.knowledge_base.embed_question(user_message)
+                cached = self.response_cache.lookup(query_vector, self.knowledge_base.version)
+                if cached is not None:
+                    yield "token", cached["response"]
+                    yield "done", cached
+                    return
+
+            started = time.perf_counter()
+            parts = []
+            for token in self.chain.stream({
                 "question": user_message,
-                "chat_history": lc_history
-            })
+                "chat_history": lc_history,
+                "query_vector": query_vector
+            }):
+                if token:
+                    parts.append(token)
+                    yield "token", token
             
-            return {
-                "response": response,
+            result = {
+                "response": "".join(parts),
                 "timestamp": datetime.now().isoformat(),
                 "suggestions": self._generate_suggestions(user_message)
             }
+            if query_vector is not None:
+                self.response_cache.store(query_vector, self.knowledge_base.version, result, time.perf_counter() - started)
+            yield "done", result
         except Exception as e:
-            return {
+            yield "done", {
                 "response": "I'm having trouble connecting right now. Please try again later. 😓",
                 "error": str(e)
             }
@@ -0,0 +1,141 @@
+"""
+Semantic cache of chatbot answers.
+
+A first question in a conversation is embedded once; if an earlier question
+from the same knowledge-base version is at least THRESHOLD cosine-similar and
+younger than TTL, its answer is returned without retrieval or an LLM call.
+An exact cache instead matches only the same normalized question text, for
+answers where one changed word matters (adult vs paediatric dosing embeds well
+above THRESHOLD). Questions asked after an earlier user turn are never cached:
+the answer depends on the conversation.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+CACHE_ENABLED = os.getenv("CHATBOT_RESPONSE_CACHE", "1") == "1"
+CACHE_THRESHOLD = float(os.getenv("CHATBOT_CACHE_THRESHOLD", "0.95"))
+CACHE_TTL_SECONDS = int(os.getenv("CHATBOT_CACHE_TTL_SECONDS", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CHATBOT_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize_question(text: str) -> str:
+    """Case, spacing and trailing punctuation don't change the question"""
+    return re.sub(r"\s+", " ", text.strip().lower()).rstrip(" ?!.")
+
+
+class ResponseCache:
+    """
+    Fixed-size, thread-safe store of (unit question vector, answer). Vectors sit
+    in one preallocated matrix so a lookup is a single matrix-vector product;
+    slots are reused least-recently-used first. With exact=True entries are
+    keyed by normalized question text and no vectors are kept.
+    """
+
+    def __init__(self, threshold: float = CACHE_THRESHOLD, ttl: int = CACHE_TTL_SECONDS,
+                 max_entries: int = CACHE_MAX_ENTRIES, exact: bool = False):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.exact = exact
+        self._lock = threading.Lock()
+        self._vectors = None              # (max_entries, dim) float32, allocated on first store
+        self._slots = OrderedDict()       # slot -> entry dict, oldest use first
+        self._by_question = {}            # normalized question -> slot, exact mode only
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _drop(self, slot: int):
+        entry = self._slots.pop(slot)
+        if self.exact:
+            del self._by_question[entry["question"]]
+        else:
+            self._vectors[slot] = 0
+        self._free.append(slot)
+
+    def lookup(self, vector: Optional[List[float]], version: str, question: str = None) -> Optional[Dict[str, Any]]:
+        """
+        A copy of the cached answer for a near-identical question, or None.
+        An exact cache looks up question and ignores vector.
+        """
+        with self._lock:
+            if not self._slots:
+                self.misses += 1
+                return None
+            now = time.time()
+            for slot in [s for s, e in self._slots.items() if e["version"] != version or now - e["created"] > self.ttl]:
+                self._drop(slot)
+
+            best, score = None, self.threshold
+            if self.exact:
+                best, score = self._by_question.get(normalize_question(question)), 1.0
+            elif self._slots:
+                scores = self._vectors @ self._unit(vector)
+                for slot in self._slots:
+                    if scores[slot] >= score:
+                        best, score = slot, scores[slot]
+            if best is None:
+                self.misses += 1
+                return None
+
+            entry = self._slots[best]
+            self._slots.move_to_end(best)
+            self.hits += 1
+            self.saved_seconds += entry["elapsed"]
+
+        result = dict(entry["result"], timestamp=datetime.now().isoformat(), cached=True)
+        result["cache_similarity"] = round(float(score), 4)
+        return result
+
+    def store(self, vector: Optional[List[float]], version: str, result: Dict[str, Any], elapsed: float,
+              question: str = None):
+        """Remember a freshly generated answer and how long it took"""
+        if "error" in result:
+            return
+        key = normalize_question(question) if self.exact else None
+        unit = None if self.exact else self._unit(vector)
+        with self._lock:
+            if self.exact:
+                if key in self._by_question:
+                    self._drop(self._by_question[key])
+            elif self._vectors is None or self._vectors.shape[1] != unit.shape[0]:
+                self._vectors = np.zeros((self.max_entries, unit.shape[0]), dtype=np.float32)
+                self._slots.clear()
+                self._free = list(range(self.max_entries - 1, -1, -1))
+            if not self._free:
+                self._drop(next(iter(self._slots)))
+            slot = self._free.pop()
+            if self.exact:
+                self._by_question[key] = slot
+            else:
+                self._vectors[slot] = unit
+            self._slots[slot] = {
+                "result": result, "version": version, "created": time.time(), "elapsed": elapsed, "question": key,
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._slots),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "latency_saved_seconds": round(self.saved_seconds, 3),
+                "avg_latency_saved_ms": round(1000 * self.saved_seconds / self.hits, 1) if self.hits else 0.0,
+            }
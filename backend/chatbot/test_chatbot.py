@@ -0,0 +1,384 @@
+"""
+Tests for the chatbot service. Gemini embeddings and chat are replaced by
+deterministic fakes, so they run offline:
+
+    cd backend/chatbot && python -m unittest
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from contextlib import ExitStack
+from typing import *  # noqa: F401,F403 - resolves the fake chat model's forward references
+from unittest import mock
+
+INDEX_ROOT = tempfile.mkdtemp()
+os.environ["CHATBOT_INDEX_DIR"] = INDEX_ROOT
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.caches import BaseCache  # noqa: E402,F401
+from langchain_core.callbacks import Callbacks  # noqa: E402,F401
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.embeddings import DeterministicFakeEmbedding  # noqa: E402
+from langchain_core.language_models.fake_chat_models import FakeListChatModel  # noqa: E402
+
+import doctor_chatbot_backend  # noqa: E402
+import knowledge_store  # noqa: E402
+import patient_chatbot_backend  # noqa: E402
+from response_cache import ResponseCache, normalize_question  # noqa: E402
+
+# What reached the fake Gemini APIs: texts embedded per kind, and LLM calls
+CALLS = Counter()
+ANSWER = "Amoxicillin 500 mg every 8 hours."
+
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    def __init__(self, model=None, google_api_key=None, **kwargs):
+        super().__init__(size=64)
+
+    def embed_documents(self, texts):
+        CALLS["documents"] += len(texts)
+        CALLS["batches"] += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        CALLS["query"] += 1
+        return super().embed_query(text)
+
+
+class FakeChatModel(FakeListChatModel):
+    def _stream(self, *args, **kwargs):
+        CALLS["llm"] += 1
+        yield from super()._stream(*args, **kwargs)
+
+
+FakeChatModel.model_rebuild()
+
+
+def fake_gemini():
+    """Patches both backends to use the fakes; assistants built inside keep them"""
+    stack = ExitStack()
+    stack.enter_context(mock.patch.object(knowledge_store, "GoogleGenerativeAIEmbeddings", FakeEmbeddings))
+    for backend in (doctor_chatbot_backend, patient_chatbot_backend):
+        stack.enter_context(mock.patch.object(
+            backend, "ChatGoogleGenerativeAI", lambda **kwargs: FakeChatModel(responses=[ANSWER])
+        ))
+    return stack
+
+
+with fake_gemini():
+    import api_server  # noqa: E402
+
+
+def tearDownModule():
+    shutil.rmtree(INDEX_ROOT, ignore_errors=True)
+
+
+def chunks(*texts):
+    return [Document(page_content=text, metadata={"category": "drugs"}) for text in texts]
+
+
+class IndexPersistenceTests(unittest.TestCase):
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp(dir=INDEX_ROOT)
+        patcher = mock.patch.object(knowledge_store, "INDEX_DIR", self.index_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.embeddings = FakeEmbeddings()
+        CALLS.clear()
+
+    def build(self, docs, model="embedding-001"):
+        return knowledge_store.load_or_build_index("drugs", docs, self.embeddings, model)
+
+    def test_saved_index_is_reused_for_the_same_chunks(self):
+        built, version = self.build(chunks("Amoxicillin", "Warfarin"))
+        self.assertEqual(CALLS["documents"], 2)
+
+        loaded, again = self.build(chunks("Amoxicillin", "Warfarin"))
+        self.assertEqual(again, version)
+        self.assertEqual(CALLS["documents"], 2)
+        self.assertEqual(loaded.index.ntotal, 2)
+        self.assertEqual(
+            [doc.page_content for doc in loaded.similarity_search("Warfarin", k=2)],
+            [doc.page_content for doc in built.similarity_search("Warfarin", k=2)],
+        )
+
+    def test_changed_chunks_or_model_rebuild(self):
+        _, version = self.build(chunks("Amoxicillin", "Warfarin"))
+        _, edited = self.build(chunks("Amoxicillin", "Warfarin 5 mg"))
+        _, other_model = self.build(chunks("Amoxicillin", "Warfarin 5 mg"), model="embedding-002")
+
+        self.assertEqual(len({version, edited, other_model}), 3)
+        self.assertEqual(CALLS["documents"], 6)
+
+    def test_failed_save_leaves_no_fingerprint(self):
+        self.build(chunks("Amoxicillin"))
+        path = os.path.join(self.index_dir, "drugs")
+        real_write = knowledge_store._write_atomic
+
+        def fail_on_docstore(target, data):
+            if target.endswith(knowledge_store.DOCSTORE_FILE):
+                raise OSError("disk full")
+            real_write(target, data)
+
+        with mock.patch.object(knowledge_store, "_write_atomic", fail_on_docstore):
+            self.build(chunks("Amoxicillin", "Warfarin"))
+        self.assertFalse(os.path.exists(os.path.join(path, knowledge_store.FINGERPRINT_FILE)))
+
+        # The half-written index is never loaded, for either set of chunks
+        CALLS.clear()
+        self.build(chunks("Amoxicillin"))
+        self.assertEqual(CALLS["documents"], 1)
+
+
+class EmbeddingCacheTests(unittest.TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp(dir=INDEX_ROOT)
+        stack = fake_gemini()
+        stack.enter_context(mock.patch.object(knowledge_store, "INDEX_DIR", os.path.join(root, "index")))
+        stack.enter_context(mock.patch.object(knowledge_store, "EMBEDDING_CACHE_DIR", os.path.join(root, "cache")))
+        self.addCleanup(stack.close)
+        self.embeddings = knowledge_store.cached_embeddings("embedding-001", "test")
+        CALLS.clear()
+
+    def build(self, *texts):
+        return knowledge_store.load_or_build_index("drugs", chunks(*texts), self.embeddings, "embedding-001")
+
+    def test_rebuild_only_embeds_new_chunks(self):
+        self.build("Amoxicillin", "Warfarin", "Metformin")
+        self.assertEqual(CALLS["documents"], 3)
+
+        self.build("Amoxicillin", "Warfarin 5 mg", "Metformin")
+        self.assertEqual(CALLS["documents"], 4)
+
+        # Same chunks as the first build: the index is rebuilt, every embedding is cached
+        self.build("Amoxicillin", "Warfarin", "Metformin")
+        self.assertEqual(CALLS["documents"], 4)
+
+    def test_missing_chunks_are_embedded_in_batches(self):
+        self.build(*[f"chunk {n}" for n in range(250)])
+        self.assertEqual((CALLS["documents"], CALLS["batches"]), (250, 3))
+
+    def test_queries_are_not_cached(self):
+        self.embeddings.embed_query("amoxicillin dosing")
+        self.embeddings.embed_query("amoxicillin dosing")
+        self.assertEqual(CALLS["query"], 2)
+
+
+class ResponseCacheTests(unittest.TestCase):
+    answer = {"response": "Take with food."}
+
+    def test_similar_question_hits_above_threshold_only(self):
+        cache = ResponseCache(threshold=0.95)
+        cache.store([1, 0, 0], "v1", self.answer, elapsed=2.0)
+
+        hit = cache.lookup([1, 0.29, 0], "v1")  # cosine 0.96
+        self.assertEqual(hit["response"], "Take with food.")
+        self.assertTrue(hit["cached"])
+        self.assertGreaterEqual(hit["cache_similarity"], 0.95)
+        self.assertIsNone(cache.lookup([1, 0.5, 0], "v1"))  # cosine 0.89
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["latency_saved_seconds"], 2.0)
+
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(ttl=60)
+        with mock.patch("response_cache.time.time", return_value=1000.0):
+            cache.store([1, 0], "v1", self.answer, elapsed=1.0)
+        with mock.patch("response_cache.time.time", return_value=1059.0):
+            self.assertIsNotNone(cache.lookup([1, 0], "v1"))
+        with mock.patch("response_cache.time.time", return_value=1061.0):
+            self.assertIsNone(cache.lookup([1, 0], "v1"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_knowledge_base_change_invalidates(self):
+        cache = ResponseCache()
+        cache.store([1, 0], "v1", self.answer, elapsed=1.0)
+
+        self.assertIsNone(cache.lookup([1, 0], "v2"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_least_recently_used_slot_is_reused(self):
+        cache = ResponseCache(max_entries=2)
+        cache.store([1, 0, 0], "v1", {"response": "a"}, elapsed=1.0)
+        cache.store([0, 1, 0], "v1", {"response": "b"}, elapsed=1.0)
+        cache.lookup([1, 0, 0], "v1")  # a is now the most recently used
+        cache.store([0, 0, 1], "v1", {"response": "c"}, elapsed=1.0)
+
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(cache.lookup([1, 0, 0], "v1")["response"], "a")
+        self.assertIsNone(cache.lookup([0, 1, 0], "v1"))
+        self.assertEqual(cache.lookup([0, 0, 1], "v1")["response"], "c")
+
+    def test_errors_are_not_cached(self):
+        cache = ResponseCache()
+        cache.store([1, 0], "v1", {"response": "Sorry", "error": "quota"}, elapsed=1.0)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_exact_cache_matches_the_normalized_question_only(self):
+        cache = ResponseCache(exact=True, max_entries=2)
+        cache.store(None, "v1", self.answer, elapsed=1.0, question="Amoxicillin dosing for adults?")
+        cache.store(None, "v1", self.answer, elapsed=1.0, question="amoxicillin dosing for adults")
+
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertIsNotNone(cache.lookup(None, "v1", question="  AMOXICILLIN dosing   for adults. "))
+        self.assertIsNone(cache.lookup(None, "v1", question="Amoxicillin dosing for children?"))
+        self.assertEqual(normalize_question("  AMOXICILLIN dosing   for adults. "), "amoxicillin dosing for adults")
+
+
+class ChatCacheTests(unittest.TestCase):
+    greeting = {"sender": "ai", "text": "Hello Dr. Sharma! How may I assist you today?"}
+
+    def setUp(self):
+        api_server.medical_assistant.response_cache = ResponseCache(exact=True)
+        api_server.patient_assistant.response_cache = ResponseCache()
+        self.client = api_server.app.test_client()
+        CALLS.clear()
+
+    def ask(self, message, context=(), path="/api/doctor-chatbot"):
+        response = self.client.post(path, json={"message": message, "context": list(context)})
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_repeated_first_question_is_answered_from_cache(self):
+        first = self.ask("Amoxicillin dosing?", [self.greeting])
+        again = self.ask("amoxicillin   dosing", [self.greeting])
+
+        self.assertNotIn("cached", first)
+        self.assertTrue(again["cached"])
+        self.assertEqual(again["response"], first["response"])
+        self.assertEqual(CALLS["llm"], 1)
+        health = self.client.get("/health").get_json()
+        self.assertEqual(health["response_cache"]["doctor"]["hits"], 1)
+
+    def test_similar_clinical_question_is_not_reused(self):
+        self.ask("Amoxicillin dosing for adults?")
+        other = self.ask("Amoxicillin dosing for children?")
+
+        self.assertNotIn("cached", other)
+        self.assertEqual(CALLS["llm"], 2)
+
+    def test_follow_up_question_bypasses_cache(self):
+        self.ask("Amoxicillin dosing?")
+        follow_up = self.ask("Amoxicillin dosing?", [
+            {"sender": "user", "text": "My patient has a penicillin allergy"},
+            {"sender": "ai", "text": "Noted."},
+        ])
+
+        self.assertNotIn("cached", follow_up)
+        self.assertEqual(CALLS["llm"], 2)
+
+    def test_patient_cache_matches_by_embedding(self):
+        self.ask("How do I book an appointment?", path="/api/patient-chatbot")
+        again = self.ask("how do i book an appointment", path="/api/patient-chatbot")
+
+        self.assertTrue(again["cached"])
+        self.assertEqual(again["cache_similarity"], 1.0)
+        self.assertEqual(CALLS["llm"], 1)
+
+
+class DoctorRetrievalTests(unittest.TestCase):
+    def setUp(self):
+        self.assistant = api_server.medical_assistant
+        self.addCleanup(setattr, self.assistant, "response_cache", self.assistant.response_cache)
+        self.assistant.response_cache = None
+        CALLS.clear()
+
+    def test_each_turn_retrieves_once_and_reports_scores(self):
+        knowledge_base = self.assistant.knowledge_base
+        with mock.patch.object(knowledge_base, "retrieve_with_scores", wraps=knowledge_base.retrieve_with_scores) as retrieve:
+            result = self.assistant.chat("Amoxicillin dosing?", [{"role": "assistant", "content": "Hello Doctor!"}])
+
+        self.assertEqual(result["response"], ANSWER)
+        self.assertEqual(retrieve.call_count, 1)
+        self.assertEqual((CALLS["query"], CALLS["llm"]), (1, 1))
+
+        sources = result["sources"]
+        self.assertEqual(len(sources), 4)
+        distances = [source["distance"] for source in sources]
+        self.assertEqual(distances, sorted(distances))
+        for source in sources:
+            self.assertEqual(source["relevance_score"], round(max(0.0, 1 - source["distance"] / 2), 4))
+            self.assertIn("category", source)
+
+
+def sse_events(response):
+    """[(event, data), ...] from a text/event-stream response body"""
+    events = []
+    for frame in response.get_data(as_text=True).split("\n\n"):
+        if frame:
+            event, data = frame.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class ChatStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.assistant = api_server.medical_assistant
+        self.addCleanup(setattr, self.assistant, "response_cache", self.assistant.response_cache)
+        self.assistant.response_cache = None
+        self.client = api_server.app.test_client()
+
+    def stream(self, message="Amoxicillin dosing?"):
+        response = self.client.post("/api/doctor-chatbot", json={"message": message, "stream": True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        return sse_events(response)
+
+    def fail_chain(self):
+        chain = mock.Mock()
+        chain.stream.side_effect = RuntimeError("quota exceeded for key AIza-secret")
+        return mock.patch.object(self.assistant, "chain", chain)
+
+    def test_tokens_then_done(self):
+        events = self.stream()
+        names = [event for event, _ in events]
+
+        self.assertGreater(names.count("token"), 1)
+        self.assertEqual(names, ["token"] * (len(names) - 1) + ["done"])
+        done = events[-1][1]
+        self.assertEqual("".join(data["text"] for _, data in events[:-1]), done["response"])
+        self.assertEqual(done["response"], ANSWER)
+        self.assertEqual(len(done["sources"]), 4)
+
+    def test_failed_turn_ends_with_an_error_event(self):
+        with self.fail_chain():
+            events = self.stream()
+
+        self.assertEqual([event for event, _ in events], ["error"])
+        error = events[0][1]
+        self.assertEqual(error["error"], "Internal server error")
+        self.assertIsNone(error["details"])
+        self.assertNotIn("AIza-secret", json.dumps(events))
+
+    def test_exception_text_is_only_sent_in_debug_mode(self):
+        with self.fail_chain(), mock.patch.dict(api_server.app.config, {"DEBUG": True}):
+            events = self.stream()
+        self.assertIn("AIza-secret", events[-1][1]["details"])
+
+    def test_exception_mid_stream_ends_with_an_error_event(self):
+        def chat_stream(*args):
+            yield "token", "Amoxicillin"
+            raise RuntimeError("connection reset by AIza-secret")
+
+        with mock.patch.object(self.assistant, "chat_stream", chat_stream):
+            events = self.stream()
+
+        self.assertEqual([event for event, _ in events], ["token", "error"])
+        self.assertNotIn("AIza-secret", json.dumps(events))
+
+    def test_blocking_response_hides_the_exception(self):
+        with self.fail_chain():
+            response = self.client.post("/api/doctor-chatbot", json={"message": "Amoxicillin dosing?"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["error"], "Internal server error")
+        self.assertNotIn("AIza-secret", response.get_data(as_text=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
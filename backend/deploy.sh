@@ -19,3 +19,25 @@ gcloud run deploy $SERVICE_NAME \
   --region $REGION \
   --allow-unauthenticated \
   --update-env-vars "DEBUG=False,SECRET_KEY=change-this-in-production-console"
+
+# Queued emails are delivered by a Cloud Run job from the same image, not by the
+# web service: Cloud Run throttles CPU between requests and doesn't restart a
+# background process that dies. The job needs the service's DATABASE_URL and
+# EMAIL_* variables. Cloud Scheduler runs it every minute.
+JOB_NAME="$SERVICE_NAME-emails"
+PROJECT_NUMBER=$(gcloud projects describe $PROJECT_ID --format='value(projectNumber)')
+
+gcloud run jobs deploy $JOB_NAME \
+  --image gcr.io/$PROJECT_ID/$SERVICE_NAME \
+  --region $REGION \
+  --args send-emails \
+  --max-retries 0 \
+  --task-timeout 10m
+
+gcloud scheduler jobs describe $JOB_NAME-every-minute --location $REGION >/dev/null 2>&1 || \
+gcloud scheduler jobs create http $JOB_NAME-every-minute \
+  --location $REGION \
+  --schedule "* * * * *" \
+  --http-method POST \
+  --uri "https://run.googleapis.com/v2/projects/$PROJECT_ID/locations/$REGION/jobs/$JOB_NAME:run" \
+  --oauth-service-account-email "$PROJECT_NUMBER-compute@developer.gserviceaccount.com"
@@ -1,12 +1,35 @@
 #!/bin/sh
 set -e
 
-echo "Running migrations..."
-python manage.py migrate --noinput
+# One image, three roles, picked by the first argument:
+#   web (default)  migrate, then serve ASGI with Daphne
+#   send-emails    deliver queued emails until the outbox is empty, then exit;
+#                  run as a Cloud Run job on a Cloud Scheduler trigger (see deploy.sh)
+#   email-worker   deliver queued emails forever, for hosts that supervise and
+#                  restart long-running processes (docker --restart, systemd)
+ROLE=${1:-web}
 
-echo "Ensuring admin user exists..."
-python create_admin.py
+case "$ROLE" in
+  web)
+    echo "Running migrations..."
+    python manage.py migrate --noinput
 
-echo "Starting Daphne (ASGI)..."
-exec daphne -b 0.0.0.0 -p ${PORT:-8080} healthcare_platform.asgi:application
+    echo "Ensuring admin user exists..."
+    python create_admin.py
 
+    echo "Starting Daphne (ASGI)..."
+    exec daphne -b 0.0.0.0 -p ${PORT:-8080} healthcare_platform.asgi:application
+    ;;
+  send-emails)
+    echo "Sending queued emails..."
+    exec python manage.py send_queued_emails
+    ;;
+  email-worker)
+    echo "Starting email outbox worker..."
+    exec python manage.py send_queued_emails --loop
+    ;;
+  *)
+    echo "Unknown role: $ROLE (expected web, send-emails or email-worker)" >&2
+    exit 64
+    ;;
+esac
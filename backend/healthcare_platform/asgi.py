@@ -9,17 +9,24 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare_platform.settings')
+
+# Initialize Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from authentication.middleware import JWTAuthMiddleware
 import authentication.routing
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare_platform.settings')
-
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            authentication.routing.websocket_urlpatterns
+        JWTAuthMiddleware(
+            URLRouter(
+                authentication.routing.websocket_urlpatterns
+            )
         )
     ),
-})
\ No newline at end of file
+})
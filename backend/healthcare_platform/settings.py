@@ -74,11 +74,45 @@ WSGI_APPLICATION = "healthcare_platform.wsgi.application"
 ASGI_APPLICATION = "healthcare_platform.asgi.application"
 
 # Channels Configuration
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
-}
+# "memory" only reaches sockets held by the same process. Run more than one
+# daphne worker with "sqlite" (one host: a shared SQLite file plus Unix-socket
+# wakeups) or "redis" (any number of hosts, needs REDIS_URL).
+CHANNEL_LAYER_BACKEND = config("CHANNEL_LAYER_BACKEND", default="memory")
+
+if CHANNEL_LAYER_BACKEND == "redis":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [config("REDIS_URL", default="redis://127.0.0.1:6379/0")],
+            },
+        },
+    }
+elif CHANNEL_LAYER_BACKEND == "sqlite":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "authentication.channel_layers.SQLiteChannelLayer",
+            "CONFIG": {
+                "path": config("CHANNEL_LAYER_SQLITE_PATH", default="/tmp/medisewa-channels.sqlite3"),
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# Video call signaling: the doctor and patient hold one seat each; hospital
+# staff of the appointment may watch presence as observers, up to this many.
+SIGNALING_MAX_OBSERVERS = config("SIGNALING_MAX_OBSERVERS", default=2, cast=int)
+# Coalesce trickled ICE candidates arriving within this many ms into one relay (0 = off)
+SIGNALING_ICE_COALESCE_MS = config("SIGNALING_ICE_COALESCE_MS", default=0, cast=int)
+# A doctor's waiting-room socket refreshes its triage presence this often; presence
+# not refreshed for TRIAGE_PRESENCE_TTL_SECONDS (e.g. its worker crashed) is ignored.
+TRIAGE_HEARTBEAT_SECONDS = config("TRIAGE_HEARTBEAT_SECONDS", default=30, cast=int)
+TRIAGE_PRESENCE_TTL_SECONDS = config("TRIAGE_PRESENCE_TTL_SECONDS", default=90, cast=int)
 
 # -----------------------------------------------------------------------------
 # Database
@@ -144,6 +178,22 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Authenticated file views stream from Django by default. Behind a front server
+# set MEDIA_OFFLOAD to "nginx" (X-Accel-Redirect to an internal location that
+# aliases MEDIA_ROOT at MEDIA_ACCEL_REDIRECT_PREFIX) or "sendfile" (X-Sendfile).
+MEDIA_OFFLOAD = config("MEDIA_OFFLOAD", default="")
+MEDIA_ACCEL_REDIRECT_PREFIX = config("MEDIA_ACCEL_REDIRECT_PREFIX", default="/protected-media/")
+
+# Resumable uploads (reports, payment screenshots)
+CHUNKED_UPLOAD_MAX_SIZE = config("CHUNKED_UPLOAD_MAX_SIZE", default=50 * 1024 * 1024, cast=int)
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = config("CHUNKED_UPLOAD_MAX_CHUNK_SIZE", default=8 * 1024 * 1024, cast=int)
+
+# Report emails carry a signed, expiring download link ("link") or the PDF itself ("attachment").
+# Links are built on PUBLIC_BASE_URL when set, otherwise on the host of the uploading request.
+REPORT_EMAIL_DELIVERY = config("REPORT_EMAIL_DELIVERY", default="link")
+REPORT_LINK_MAX_AGE_SECONDS = config("REPORT_LINK_MAX_AGE_SECONDS", default=7 * 24 * 3600, cast=int)
+PUBLIC_BASE_URL = config("PUBLIC_BASE_URL", default="")
+
 # -----------------------------------------------------------------------------
 # Auth / DRF / JWT
 # -----------------------------------------------------------------------------
@@ -178,6 +228,22 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_ALL_ORIGINS = config("CORS_ALLOW_ALL_ORIGINS", default=False, cast=bool)
 CORS_ALLOW_CREDENTIALS = True
 
+# -----------------------------------------------------------------------------
+# Notifications
+# -----------------------------------------------------------------------------
+# Read notifications older than this are removed by `manage.py prune_notifications`
+NOTIFICATION_RETENTION_DAYS = config("NOTIFICATION_RETENTION_DAYS", default=90, cast=int)
+
+# -----------------------------------------------------------------------------
+# OTP
+# -----------------------------------------------------------------------------
+OTP_TTL_SECONDS = config("OTP_TTL_SECONDS", default=300, cast=int)
+OTP_RESEND_COOLDOWN_SECONDS = config("OTP_RESEND_COOLDOWN_SECONDS", default=60, cast=int)
+# At most OTP_MAX_SENDS_PER_WINDOW codes per recipient every OTP_SEND_WINDOW_SECONDS
+OTP_MAX_SENDS_PER_WINDOW = config("OTP_MAX_SENDS_PER_WINDOW", default=5, cast=int)
+OTP_SEND_WINDOW_SECONDS = config("OTP_SEND_WINDOW_SECONDS", default=900, cast=int)
+OTP_MAX_VERIFY_ATTEMPTS = config("OTP_MAX_VERIFY_ATTEMPTS", default=5, cast=int)
+
 # -----------------------------------------------------------------------------
 # Password validators
 # -----------------------------------------------------------------------------
@@ -194,7 +260,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Email (optional)
 # -----------------------------------------------------------------------------
 DEFAULT_CHARSET = "utf-8"
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# Emails are queued in OutboundEmail and delivered by `manage.py send_queued_emails`.
+# Set EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend for local development.
+EMAIL_BACKEND = config("EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend")
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
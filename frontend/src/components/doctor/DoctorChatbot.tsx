@@ -11,7 +11,7 @@ interface Message {
     text: string;
     sender: 'user' | 'ai';
     timestamp: Date;
-    sources?: Array<{ category: string; relevance_score: string }>;
+    sources?: Array<{ category: string; relevance_score: number; distance: number }>;
     suggestions?: string[];
 }
 
@@ -41,6 +41,8 @@ export const DoctorChatbot: React.FC<DoctorChatbotProps> = ({ doctor, onClose })
     ]);
     const [inputText, setInputText] = useState('');
     const [isTyping, setIsTyping] = useState(false);
+    // Id of the AI message whose tokens are still arriving
+    const [streamingId, setStreamingId] = useState<string | null>(null);
     const [connectionStatus, setConnectionStatus] = useState<'online' | 'offline' | 'connecting'>('connecting');
     const messagesEndRef = useRef<HTMLDivElement>(null);
 
@@ -86,23 +88,26 @@ export const DoctorChatbot: React.FC<DoctorChatbotProps> = ({ doctor, onClose })
         setIsTyping(true);
 
         try {
-            // Prepare context (last 10 messages for API efficiency)
-            const context = messages.slice(-10).map(msg => ({
+            // Prepare context (last 10 messages for API efficiency); the greeting is not
+            // part of the conversation, and leaving it out lets a first question be answered from cache
+            const context = messages.filter(msg => msg.id !== '1').slice(-10).map(msg => ({
                 sender: msg.sender,
                 text: msg.text,
                 timestamp: msg.timestamp.toISOString()
             }));
 
-            // Call the actual API
+            // Call the actual API; the answer streams in as server-sent events
             const response = await fetch(`${API_BASE_URL}/api/doctor-chatbot`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream',
                 },
                 body: JSON.stringify({
                     message: inputText,
                     doctorId: doctor.id,
-                    context: context
+                    context: context,
+                    stream: true
                 })
             });
 
@@ -110,18 +115,46 @@ export const DoctorChatbot: React.FC<DoctorChatbotProps> = ({ doctor, onClose })
                 throw new Error(`API Error: ${response.status}`);
             }
 
-            const data = await response.json();
-
-            const aiMessage: Message = {
-                id: (Date.now() + 1).toString(),
-                text: data.response,
-                sender: 'ai',
-                timestamp: new Date(data.timestamp),
-                sources: data.sources,
-                suggestions: data.suggestions
+            const aiId = (Date.now() + 1).toString();
+            const finish = (data: { response: string; timestamp?: string; sources?: Message['sources']; suggestions?: string[] }) => {
+                const aiMessage: Message = {
+                    id: aiId,
+                    text: data.response,
+                    sender: 'ai',
+                    timestamp: new Date(data.timestamp || Date.now()),
+                    sources: data.sources,
+                    suggestions: data.suggestions
+                };
+                setMessages((prev) => [...prev.filter(m => m.id !== aiId), aiMessage]);
             };
 
-            setMessages((prev) => [...prev, aiMessage]);
+            if (!response.body || !response.headers.get('Content-Type')?.includes('text/event-stream')) {
+                finish(await response.json());
+            } else {
+                setMessages((prev) => [...prev, { id: aiId, text: '', sender: 'ai', timestamp: new Date() }]);
+                setStreamingId(aiId);
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop() || '';
+                    for (const raw of events) {
+                        const event = raw.match(/^event: (.*)$/m)?.[1];
+                        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+                        if (event === 'token') {
+                            setMessages((prev) => prev.map(m => m.id === aiId ? { ...m, text: m.text + data.text } : m));
+                        } else if (event === 'done' || event === 'error') {
+                            // error carries an apology in response instead of an answer
+                            finish(data);
+                        }
+                    }
+                }
+            }
+
             setConnectionStatus('online');
         } catch (error) {
             console.error('Error calling chatbot API:', error);
@@ -137,6 +170,7 @@ export const DoctorChatbot: React.FC<DoctorChatbotProps> = ({ doctor, onClose })
             setConnectionStatus('offline');
         } finally {
             setIsTyping(false);
+            setStreamingId(null);
         }
     };
 
@@ -239,6 +273,7 @@ export const DoctorChatbot: React.FC<DoctorChatbotProps> = ({ doctor, onClose })
                                                 {message.sources.map((source, idx) => (
                                                     <span
                                                         key={idx}
+                                                        title={`Relevance ${Math.round(source.relevance_score * 100)}%`}
                                                         className="inline-flex items-center gap-1 px-2 py-1 bg-blue-50 text-blue-700 rounded-md text-xs font-medium"
                                                     >
                                                         <CategoryIcon category={source.category} />
@@ -283,7 +318,7 @@ export const DoctorChatbot: React.FC<DoctorChatbotProps> = ({ doctor, onClose })
                         </div>
                     ))}
 
-                    {isTyping && (
+                    {isTyping && !streamingId && (
                         <div className="flex items-start">
                             <div className="w-8 h-8 bg-gradient-to-br from-blue-100 to-cyan-100 rounded-lg flex items-center justify-center flex-shrink-0 mr-2 shadow-sm">
                                 <Activity size={16} className="text-blue-600" strokeWidth={2.5} />
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useLocation, useNavigate } from 'react-router-dom';
 import { Card } from '../ui/Card';
 import { Button } from '../ui/Button';
@@ -9,6 +9,7 @@ import { PatientConsultation } from './PatientConsultation';
 import { DoctorChatbot } from './DoctorChatbot';
 import { DashboardHeader } from '../common/DashboardHeader';
 import { adminAPI, appointmentsAPI } from '../../services/api';
+import { applyQueueChange, subscribeToQueue } from '../../services/queueSocket';
 
 import {
   Users,
@@ -88,6 +89,10 @@ export const DoctorDashboard: React.FC<DoctorDashboardProps> = ({ doctor: initia
   const [loading, setLoading] = useState(true);
   console.log('Appointments loading:', loading);
 
+  // Read by the socket handler, which is set up once
+  const appointmentsRef = useRef(appointments);
+  appointmentsRef.current = appointments;
+
   useEffect(() => {
     const fetchAppointments = async () => {
       try {
@@ -101,6 +106,14 @@ export const DoctorDashboard: React.FC<DoctorDashboardProps> = ({ doctor: initia
       }
     };
     fetchAppointments();
+
+    // Today's queue changes arrive over ws/queue/; this socket also keeps the doctor on shift for triage
+    return subscribeToQueue((message) => {
+      if (message.type !== 'queue' || !message.entry) return;
+      const next = applyQueueChange(appointmentsRef.current, message.entry);
+      if (next) setAppointments(next);
+      else fetchAppointments();
+    }, fetchAppointments);
   }, []);
   const [activeConsultation, setActiveConsultation] = useState<any>(null);
   const [showAddHospitalModal, setShowAddHospitalModal] = useState(false);
@@ -4,7 +4,7 @@ import autoTable from 'jspdf-autotable';
 import { Card } from '../ui/Card';
 import { Button } from '../ui/Button';
 import { Appointment, Doctor, Medication, Patient } from '../../types';
-import { appointmentsAPI } from '../../services/api';
+import { appointmentsAPI, getToken } from '../../services/api';
 import medicinesData from '../../data/medicines.json';
 import {
     Plus,
@@ -190,6 +190,8 @@ export const PatientConsultation: React.FC<PatientConsultationProps> = ({
 
     // [Keep video call states - no changes]
     const [showVideo, setShowVideo] = useState(false);
+    // From the signaling room's presence frames: has the patient's socket joined, or left again?
+    const [patientPresence, setPatientPresence] = useState<'waiting' | 'joined' | 'left'>('waiting');
     const [micOn, setMicOn] = useState(true);
     const [cameraOn, setCameraOn] = useState(true);
     const [isRecording, setIsRecording] = useState(false);
@@ -570,14 +572,18 @@ export const PatientConsultation: React.FC<PatientConsultationProps> = ({
             if (localVideoRef.current) localVideoRef.current.srcObject = stream;
 
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const signalingUrl = `${protocol}//${window.location.host}/ws/signaling/${appointment?.id}/`;
+            const signalingUrl = `${protocol}//${window.location.host}/ws/signaling/${appointment?.id}/?token=${getToken()}&batch=1`;
             socket.current = new WebSocket(signalingUrl);
 
             socket.current.onmessage = async (e) => {
                 const data = JSON.parse(e.data);
-                if (data.type === 'offer') await handleOffer(data.offer);
-                else if (data.type === 'answer') await handleAnswer(data.answer);
-                else if (data.type === 'candidate') await handleCandidate(data.candidate);
+                // batch=1: coalesced ICE candidates arrive together as one frame
+                for (const msg of data.type === 'batch' ? data.frames : [data]) {
+                    if (msg.type === 'offer') await handleOffer(msg.offer);
+                    else if (msg.type === 'answer') await handleAnswer(msg.answer);
+                    else if (msg.type === 'candidate') await handleCandidate(msg.candidate);
+                    else if (msg.type === 'presence') handlePresence(msg);
+                }
             };
 
             setupPeerConnection();
@@ -590,6 +596,14 @@ export const PatientConsultation: React.FC<PatientConsultationProps> = ({
         }
     };
 
+    const handlePresence = (msg: { event: string; role?: string; peers?: { role: string }[] }) => {
+        if (msg.event === 'snapshot') {
+            setPatientPresence(msg.peers?.some(peer => peer.role === 'patient') ? 'joined' : 'waiting');
+        } else if (msg.role === 'patient') {
+            setPatientPresence(msg.event === 'join' ? 'joined' : 'left');
+        }
+    };
+
     const setupPeerConnection = () => {
         const configuration = { iceServers: [{ urls: 'stun:stun.l.google.com:19302' }] };
         peerConnection.current = new RTCPeerConnection(configuration);
@@ -629,6 +643,7 @@ export const PatientConsultation: React.FC<PatientConsultationProps> = ({
         peerConnection.current = null;
         socket.current = null;
         localStream.current = null;
+        setPatientPresence('waiting');
     };
 
     useEffect(() => {
@@ -825,7 +840,13 @@ export const PatientConsultation: React.FC<PatientConsultationProps> = ({
                         <video ref={remoteVideoRef} autoPlay playsInline className="w-full h-full object-cover" />
                         <div className="absolute top-4 left-4 flex gap-2">
                             <span className="bg-black/50 text-white text-[10px] px-2 py-1 rounded-lg backdrop-blur-md uppercase tracking-wider font-bold">Patient Link</span>
-                            <span className="bg-green-500 text-white text-[10px] px-2 py-1 rounded-lg uppercase tracking-wider font-bold">Live</span>
+                            {patientPresence === 'joined' ? (
+                                <span className="bg-green-500 text-white text-[10px] px-2 py-1 rounded-lg uppercase tracking-wider font-bold">Live</span>
+                            ) : (
+                                <span className="bg-amber-500 text-white text-[10px] px-2 py-1 rounded-lg uppercase tracking-wider font-bold">
+                                    {patientPresence === 'left' ? 'Patient left' : 'Waiting for patient'}
+                                </span>
+                            )}
                         </div>
                     </div>
                     <div className="relative aspect-video bg-indigo-900 rounded-3xl overflow-hidden shadow-2xl border-4 border-blue-400/20">
@@ -1,124 +1,197 @@
-import React, { useState, useEffect, useRef } from 'react';
-import { Bell, CheckCircle, Info, XCircle, AlertTriangle } from 'lucide-react';
-import { adminAPI } from '../../services/api';
-
-export const NotificationsDropdown: React.FC = () => {
-    const [isOpen, setIsOpen] = useState(false);
-    const [notifications, setNotifications] = useState<any[]>([]);
-    const dropdownRef = useRef<HTMLDivElement>(null);
-
-    useEffect(() => {
-        fetchNotifications();
-        // Setup polling or websocket here ideally
-        const interval = setInterval(fetchNotifications, 30000); // Poll every 30s
-        return () => clearInterval(interval);
-    }, []);
-
-    useEffect(() => {
-        const handleClickOutside = (event: MouseEvent) => {
-            if (dropdownRef.current && !dropdownRef.current.contains(event.target as Node)) {
-                setIsOpen(false);
-            }
-        };
-        document.addEventListener('mousedown', handleClickOutside);
-        return () => document.removeEventListener('mousedown', handleClickOutside);
-    }, []);
-
-    const fetchNotifications = async () => {
-        try {
-            const data = await adminAPI.getNotifications();
-            setNotifications(data);
-        } catch (error) {
-            console.error("Failed to fetch notifications", error);
-        }
-    };
-
-    const handleMarkAsRead = async () => {
-        try {
-            await adminAPI.markNotificationsRead();
-            fetchNotifications();
-        } catch (error) {
-            console.error("Failed to mark notifications as read", error);
-        }
-    };
-
-    const toggleDropdown = () => {
-        setIsOpen(!isOpen);
-        if (!isOpen) {
-            // Mark read when opening? Or explicitly with a button?
-            // Usually simpler to just show them first.
-        }
-    };
-
-    const unreadCount = notifications.filter(n => !n.is_read).length;
-
-    const getIcon = (type: string) => {
-        switch (type) {
-            case 'success': return <CheckCircle className="h-5 w-5 text-green-500" />;
-            case 'warning': return <AlertTriangle className="h-5 w-5 text-yellow-500" />;
-            case 'error': return <XCircle className="h-5 w-5 text-red-500" />;
-            default: return <Info className="h-5 w-5 text-blue-500" />;
-        }
-    };
-
-    return (
-        <div className="relative" ref={dropdownRef}>
-            <button
-                onClick={toggleDropdown}
-                className="p-2 rounded-full hover:bg-gray-100 relative transition-colors"
-            >
-                <Bell className="h-6 w-6 text-gray-600" />
-                {unreadCount > 0 && (
-                    <span className="absolute top-1 right-1 h-2.5 w-2.5 bg-red-500 rounded-full border-2 border-white animate-pulse"></span>
-                )}
-            </button>
-
-            {isOpen && (
-                <div className="absolute right-0 mt-3 w-80 bg-white rounded-xl shadow-2xl border border-gray-100 overflow-hidden z-50 animate-in fade-in slide-in-from-top-2 duration-200">
-                    <div className="p-4 border-b border-gray-100 flex justify-between items-center bg-gray-50/50">
-                        <h3 className="font-semibold text-gray-900">Notifications</h3>
-                        {unreadCount > 0 && (
-                            <button
-                                onClick={handleMarkAsRead}
-                                className="text-xs text-indigo-600 hover:text-indigo-700 font-medium"
-                            >
-                                Mark all read
-                            </button>
-                        )}
-                    </div>
-
-                    <div className="max-h-[400px] overflow-y-auto custom-scrollbar">
-                        {notifications.length === 0 ? (
-                            <div className="p-8 text-center text-gray-500">
-                                <Bell className="h-8 w-8 mx-auto mb-2 text-gray-300" />
-                                <p className="text-sm">No notifications yet</p>
-                            </div>
-                        ) : (
-                            <div className="divide-y divide-gray-50">
-                                {notifications.map((notif) => (
-                                    <div
-                                        key={notif.id}
-                                        className={`p-4 hover:bg-gray-50 transition-colors flex gap-3 ${!notif.is_read ? 'bg-indigo-50/30' : ''}`}
-                                    >
-                                        <div className="mt-1 flex-shrink-0">
-                                            {getIcon(notif.notification_type)}
-                                        </div>
-                                        <div className="flex-1">
-                                            <p className="text-sm text-gray-800 leading-snug">{notif.message}</p>
-                                            <span className="text-xs text-gray-400 mt-1 block">
-                                                {new Date(notif.created_at).toLocaleString()}
-                                            </span>
-                                        </div>
-                                        {!notif.is_read && (
-                                            <div className="mt-2 h-2 w-2 rounded-full bg-indigo-500 flex-shrink-0"></div>
-                                        )}
-                                    </div>
-                                ))}
-                            </div>
-                        )}
-                    </div>
-                </div>
-            )}
-        </div>
-    );
-};
+import React, { useState, useEffect, useRef } from 'react';
+import { Bell, CheckCircle, Info, XCircle, AlertTriangle } from 'lucide-react';
+import { adminAPI, getToken } from '../../services/api';
+
+// Only polled while the notification socket is down
+const FALLBACK_POLL_MS = 120000;
+const RECONNECT_MS = 10000;
+
+export const NotificationsDropdown: React.FC = () => {
+    const [isOpen, setIsOpen] = useState(false);
+    const [notifications, setNotifications] = useState<any[]>([]);
+    // Server-side total; the list only holds the first page
+    const [unreadCount, setUnreadCount] = useState(0);
+    // Cursor of the next (older) page, null once the end is reached
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const dropdownRef = useRef<HTMLDivElement>(null);
+
+    useEffect(() => {
+        fetchNotifications();
+
+        // New notifications are pushed over ws/notifications/
+        let socket: WebSocket | null = null;
+        let fallback: ReturnType<typeof setInterval> | null = null;
+        let reconnect: ReturnType<typeof setTimeout> | null = null;
+        let unmounted = false;
+
+        const connect = () => {
+            const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+            socket = new WebSocket(`${protocol}//${window.location.host}/ws/notifications/?token=${getToken()}`);
+            socket.onopen = () => {
+                if (fallback) {
+                    // Back from an outage: catch up once, then rely on pushes again
+                    clearInterval(fallback);
+                    fallback = null;
+                    fetchNotifications();
+                }
+            };
+            socket.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                if (data.type === 'notification') {
+                    setNotifications((prev) => [data.notification, ...prev.filter((n) => n.id !== data.notification.id)]);
+                    if (!data.notification.is_read) setUnreadCount((count) => count + 1);
+                }
+            };
+            socket.onclose = () => {
+                if (unmounted) return;
+                if (!fallback) fallback = setInterval(fetchNotifications, FALLBACK_POLL_MS);
+                reconnect = setTimeout(connect, RECONNECT_MS);
+            };
+        };
+        connect();
+
+        return () => {
+            unmounted = true;
+            if (fallback) clearInterval(fallback);
+            if (reconnect) clearTimeout(reconnect);
+            socket?.close();
+        };
+    }, []);
+
+    useEffect(() => {
+        const handleClickOutside = (event: MouseEvent) => {
+            if (dropdownRef.current && !dropdownRef.current.contains(event.target as Node)) {
+                setIsOpen(false);
+            }
+        };
+        document.addEventListener('mousedown', handleClickOutside);
+        return () => document.removeEventListener('mousedown', handleClickOutside);
+    }, []);
+
+    const fetchNotifications = async () => {
+        try {
+            const [page, count] = await Promise.all([
+                adminAPI.getNotifications(),
+                adminAPI.getUnreadNotificationCount(),
+            ]);
+            setNotifications(page.results);
+            setNextCursor(page.next);
+            setUnreadCount(count.unread_count);
+        } catch (error) {
+            console.error("Failed to fetch notifications", error);
+        }
+    };
+
+    const loadMore = async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await adminAPI.getNotifications(nextCursor);
+            // A notification pushed meanwhile may already be listed
+            setNotifications((prev) => [...prev, ...page.results.filter((n: any) => !prev.some((p) => p.id === n.id))]);
+            setNextCursor(page.next);
+        } catch (error) {
+            console.error("Failed to load older notifications", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
+    const handleMarkAsRead = async () => {
+        try {
+            await adminAPI.markNotificationsRead();
+            setUnreadCount(0);
+            fetchNotifications();
+        } catch (error) {
+            console.error("Failed to mark notifications as read", error);
+        }
+    };
+
+    const toggleDropdown = () => {
+        setIsOpen(!isOpen);
+        if (!isOpen) {
+            // Mark read when opening? Or explicitly with a button?
+            // Usually simpler to just show them first.
+        }
+    };
+
+    const getIcon = (type: string) => {
+        switch (type) {
+            case 'success': return <CheckCircle className="h-5 w-5 text-green-500" />;
+            case 'warning': return <AlertTriangle className="h-5 w-5 text-yellow-500" />;
+            case 'error': return <XCircle className="h-5 w-5 text-red-500" />;
+            default: return <Info className="h-5 w-5 text-blue-500" />;
+        }
+    };
+
+    return (
+        <div className="relative" ref={dropdownRef}>
+            <button
+                onClick={toggleDropdown}
+                className="p-2 rounded-full hover:bg-gray-100 relative transition-colors"
+            >
+                <Bell className="h-6 w-6 text-gray-600" />
+                {unreadCount > 0 && (
+                    <span className="absolute top-1 right-1 h-2.5 w-2.5 bg-red-500 rounded-full border-2 border-white animate-pulse"></span>
+                )}
+            </button>
+
+            {isOpen && (
+                <div className="absolute right-0 mt-3 w-80 bg-white rounded-xl shadow-2xl border border-gray-100 overflow-hidden z-50 animate-in fade-in slide-in-from-top-2 duration-200">
+                    <div className="p-4 border-b border-gray-100 flex justify-between items-center bg-gray-50/50">
+                        <h3 className="font-semibold text-gray-900">Notifications</h3>
+                        {unreadCount > 0 && (
+                            <button
+                                onClick={handleMarkAsRead}
+                                className="text-xs text-indigo-600 hover:text-indigo-700 font-medium"
+                            >
+                                Mark all read
+                            </button>
+                        )}
+                    </div>
+
+                    <div className="max-h-[400px] overflow-y-auto custom-scrollbar">
+                        {notifications.length === 0 ? (
+                            <div className="p-8 text-center text-gray-500">
+                                <Bell className="h-8 w-8 mx-auto mb-2 text-gray-300" />
+                                <p className="text-sm">No notifications yet</p>
+                            </div>
+                        ) : (
+                            <div className="divide-y divide-gray-50">
+                                {notifications.map((notif) => (
+                                    <div
+                                        key={notif.id}
+                                        className={`p-4 hover:bg-gray-50 transition-colors flex gap-3 ${!notif.is_read ? 'bg-indigo-50/30' : ''}`}
+                                    >
+                                        <div className="mt-1 flex-shrink-0">
+                                            {getIcon(notif.notification_type)}
+                                        </div>
+                                        <div className="flex-1">
+                                            <p className="text-sm text-gray-800 leading-snug">{notif.message}</p>
+                                            <span className="text-xs text-gray-400 mt-1 block">
+                                                {new Date(notif.created_at).toLocaleString()}
+                                            </span>
+                                        </div>
+                                        {!notif.is_read && (
+                                            <div className="mt-2 h-2 w-2 rounded-full bg-indigo-500 flex-shrink-0"></div>
+                                        )}
+                                    </div>
+                                ))}
+                                {nextCursor && (
+                                    <button
+                                        onClick={loadMore}
+                                        disabled={loadingMore}
+                                        className="w-full p-3 text-xs text-indigo-600 hover:text-indigo-700 hover:bg-gray-50 font-medium disabled:text-gray-400"
+                                    >
+                                        {loadingMore ? 'Loading...' : 'Load older notifications'}
+                                    </button>
+                                )}
+                            </div>
+                        )}
+                    </div>
+                </div>
+            )}
+        </div>
+    );
+};
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { Mic, Video, PhoneOff, VideoOff, MicOff } from 'lucide-react';
+import { getToken } from '../../services/api';
 
 interface PatientMeetingProps {
     appointmentId: string;
@@ -11,6 +12,8 @@ export const PatientMeeting: React.FC<PatientMeetingProps> = ({ appointmentId, d
     const [micOn, setMicOn] = useState(true);
     const [cameraOn, setCameraOn] = useState(true);
     const [connected, setConnected] = useState(false);
+    // From the signaling room's presence frames: has the doctor's socket joined, or left again?
+    const [doctorPresence, setDoctorPresence] = useState<'waiting' | 'joined' | 'left'>('waiting');
 
     const localVideoRef = useRef<HTMLVideoElement>(null);
     const remoteVideoRef = useRef<HTMLVideoElement>(null);
@@ -30,17 +33,22 @@ export const PatientMeeting: React.FC<PatientMeetingProps> = ({ appointmentId, d
             if (localVideoRef.current) localVideoRef.current.srcObject = stream;
 
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const signalingUrl = `${protocol}//${window.location.host}/ws/signaling/${appointmentId}/`;
+            const signalingUrl = `${protocol}//${window.location.host}/ws/signaling/${appointmentId}/?token=${getToken()}&batch=1`;
             socket.current = new WebSocket(signalingUrl);
 
             socket.current.onmessage = async (e) => {
                 const data = JSON.parse(e.data);
-                if (data.type === 'offer') {
-                    await handleOffer(data.offer);
-                } else if (data.type === 'answer') {
-                    await handleAnswer(data.answer);
-                } else if (data.type === 'candidate') {
-                    await handleCandidate(data.candidate);
+                // batch=1: coalesced ICE candidates arrive together as one frame
+                for (const msg of data.type === 'batch' ? data.frames : [data]) {
+                    if (msg.type === 'offer') {
+                        await handleOffer(msg.offer);
+                    } else if (msg.type === 'answer') {
+                        await handleAnswer(msg.answer);
+                    } else if (msg.type === 'candidate') {
+                        await handleCandidate(msg.candidate);
+                    } else if (msg.type === 'presence') {
+                        handlePresence(msg);
+                    }
                 }
             };
 
@@ -51,6 +59,16 @@ export const PatientMeeting: React.FC<PatientMeetingProps> = ({ appointmentId, d
         }
     };
 
+    const handlePresence = (msg: { event: string; role?: string; peers?: { role: string }[] }) => {
+        if (msg.event === 'snapshot') {
+            if (msg.peers?.some(peer => peer.role === 'doctor')) setDoctorPresence('joined');
+        } else if (msg.role === 'doctor') {
+            setDoctorPresence(msg.event === 'join' ? 'joined' : 'left');
+            // The doctor's stream ended with their socket; show the overlay again until they're back
+            if (msg.event === 'leave') setConnected(false);
+        }
+    };
+
     const setupPeerConnection = () => {
         const configuration = {
             iceServers: [{ urls: 'stun:stun.l.google.com:19302' }]
@@ -105,7 +123,11 @@ export const PatientMeeting: React.FC<PatientMeetingProps> = ({ appointmentId, d
                     {!connected && (
                         <div className="absolute inset-0 flex flex-col items-center justify-center text-white bg-gray-900/50 backdrop-blur-sm">
                             <div className="w-16 h-16 border-4 border-blue-500 border-t-transparent rounded-full animate-spin mb-4" />
-                            <p className="font-bold">Waiting for Dr. {doctorName}...</p>
+                            <p className="font-bold">
+                                {doctorPresence === 'joined' ? `Dr. ${doctorName} has joined, connecting...`
+                                    : doctorPresence === 'left' ? `Dr. ${doctorName} left the call. Waiting for them to rejoin...`
+                                        : `Waiting for Dr. ${doctorName}...`}
+                            </p>
                         </div>
                     )}
                 </div>
@@ -262,8 +262,16 @@ export const adminAPI = {
     });
   },
 
-  getNotifications: async () => {
-    return apiRequest('/auth/notifications/');
+  getNotifications: async (cursor?: string | null) => {
+    // Cursor-paginated: { next, previous, results, unread_count }; next is a full URL,
+    // only its cursor is kept so the page after can be asked for through apiRequest
+    const data = await apiRequest(`/auth/notifications/${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`);
+    const next: string | null = data.next ? new URL(data.next).searchParams.get('cursor') : null;
+    return { results: data.results ?? data, next };
+  },
+
+  getUnreadNotificationCount: async () => {
+    return apiRequest('/auth/notifications/unread-count/');
   },
 
   markNotificationsRead: async () => {
@@ -0,0 +1,77 @@
+import { getToken } from './api';
+
+// Today's waiting appointment as pushed by the backend QueueConsumer (ws/queue/)
+export interface QueueEntry {
+  id: number;
+  date: string;
+  time_slot: string;
+  status: string;
+  consultation_type?: string;
+  is_emergency: boolean;
+  patient_name?: string;
+  doctor?: number;
+  doctor_name?: string;
+  created_at: string;
+}
+
+// A snapshot of the whole queue on connect, then one positioned delta per change
+export interface QueueMessage {
+  type: 'queue' | 'triage';
+  event: 'snapshot' | 'insert' | 'update' | 'remove';
+  entries?: QueueEntry[];
+  entry?: QueueEntry;
+  position?: number;
+  from?: number;
+  to?: number;
+}
+
+const RECONNECT_MS = 10000;
+
+/**
+ * Open ws/queue/ for the logged-in hospital or doctor and keep it open,
+ * reconnecting every 10s after a drop. onReconnect runs when a dropped
+ * socket comes back, so the screen can catch up on what it missed.
+ * Returns the unsubscribe function for a useEffect cleanup.
+ */
+export const subscribeToQueue = (onMessage: (message: QueueMessage) => void, onReconnect?: () => void) => {
+  let socket: WebSocket | null = null;
+  let reconnect: ReturnType<typeof setTimeout> | null = null;
+  let dropped = false;
+  let closed = false;
+
+  const connect = () => {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    socket = new WebSocket(`${protocol}//${window.location.host}/ws/queue/?token=${getToken()}`);
+    socket.onopen = () => {
+      if (dropped) {
+        dropped = false;
+        onReconnect?.();
+      }
+    };
+    socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+    socket.onclose = () => {
+      if (closed) return;
+      dropped = true;
+      reconnect = setTimeout(connect, RECONNECT_MS);
+    };
+  };
+  connect();
+
+  return () => {
+    closed = true;
+    if (reconnect) clearTimeout(reconnect);
+    socket?.close();
+  };
+};
+
+/**
+ * Apply a pushed change to an appointment list loaded over REST. Known rows
+ * take the new status, slot and emergency flag; returns null for an
+ * appointment the list doesn't have yet, which needs a refetch for its details.
+ */
+export const applyQueueChange = <T extends { id: number }>(list: T[], entry: QueueEntry): T[] | null => {
+  if (entry.status === 'deleted') return list.filter((apt) => apt.id !== entry.id);
+  if (!list.some((apt) => apt.id === entry.id)) return null;
+  const { status, date, time_slot, is_emergency } = entry;
+  return list.map((apt) => (apt.id === entry.id ? { ...apt, status, date, time_slot, is_emergency } : apt));
+};